@@ -0,0 +1,86 @@
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def percentile(values, pct):
+    """Return the pct-th percentile (0-100) of values, interpolating linearly"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def latency_summary(samples_ms):
+    """Summarize a list of latencies in milliseconds"""
+    if not samples_ms:
+        return {"count": 0}
+    return {
+        "count": len(samples_ms),
+        "mean": round(sum(samples_ms) / len(samples_ms), 3),
+        "p50": round(percentile(samples_ms, 50), 3),
+        "p90": round(percentile(samples_ms, 90), 3),
+        "p99": round(percentile(samples_ms, 99), 3),
+        "max": round(max(samples_ms), 3),
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, if available"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+def run_metadata():
+    """Describe the code and machine a benchmark ran on"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+def write_results(name, params, results, output=None):
+    """
+    Print benchmark results as JSON and optionally save them to a file
+
+    The file format is stable so results from different releases can be
+    compared with a plain JSON diff.
+    """
+    report = {
+        "benchmark": name,
+        "meta": run_metadata(),
+        "params": params,
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return report
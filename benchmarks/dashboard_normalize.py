@@ -0,0 +1,134 @@
+"""
+Cost of normalising dashboard rows per row vs per distinct value
+
+Builds a synthetic survey_responses frame where school, class and teacher
+names repeat the way they do in production (a few hundred raw school
+spellings, a few dozen classes, names shared by several responses) and
+normalises it twice: row by row with Series.apply, as the dashboard used to,
+and with dashboard_queries.normalize_responses(), which factorises each
+column and cleans every distinct value once.
+
+Usage:
+    python -m benchmarks.dashboard_normalize --rows 1000000
+"""
+
+import argparse
+import random
+import time
+
+import pandas as pd
+
+from bot.khmer import normalize_text
+from bot.schools import C, SchoolResolver, resolve_school
+from benchmarks.common import peak_rss_mb, write_results
+from benchmarks.khmer_normalize import variant
+from dashboard_queries import clean_class_name, map_distinct, normalize_responses
+
+CLASSES = [f"{grade} {room}" for grade in range(7, 13) for room in "កខគឃង"]
+KHMER_CLASSES = [f"{'៧៨៩'[i % 3]} {room}" for i, room in enumerate("កខគឃង")]
+
+
+def synthetic_frame(args, rng):
+    canonical = list(C.values())
+    spellings = sorted(
+        {variant(rng.choice(canonical), rng) for _ in range(args.spellings)}
+    )
+    # Typed with a trailing zero-width space, as Khmer keyboards do
+    names = [f"គ្រូ {i}\u200b" for i in range(args.rows // 4)]
+    rows = args.rows
+    schools = rng.choices(spellings, k=rows)
+    # Most rows were resolved by the bot at ingestion
+    resolved = [rng.random() < args.resolved_share for _ in range(rows)]
+    return pd.DataFrame(
+        {
+            "id": range(1, rows + 1),
+            "full_name": rng.choices(names, k=rows),
+            "school_name": schools,
+            "school_id": ["x" if ok else None for ok in resolved],
+            "school_canonical": [canonical[0] if ok else None for ok in resolved],
+            "class_name": rng.choices(CLASSES + KHMER_CLASSES, k=rows),
+        }
+    )
+
+
+def per_row(df, resolver):
+    """The old path: every cleaning function called once per row"""
+    df = df.copy()
+    df["school_raw"] = df["school_name"]
+    pending = df["school_id"].isna()
+    df["school_name"] = df["school_canonical"].where(
+        ~pending,
+        df["school_name"].apply(
+            lambda raw: resolve_school(raw, resolver.fast_lookup, resolver.alias_map)
+        ),
+    )
+    df["full_name"] = df["full_name"].apply(normalize_text)
+    df["class_name"] = df["class_name"].apply(clean_class_name)
+    return df
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def run_benchmark(args):
+    rng = random.Random(args.seed)
+    df = synthetic_frame(args, rng)
+
+    resolver = SchoolResolver()
+    resolver.is_resolved("")  # load the alias table outside the timings
+    baseline, per_row_s = timed(per_row, df, resolver)
+    result, distinct_s = timed(normalize_responses, df, resolver)
+    _, warm_s = timed(normalize_responses, df, resolver)
+
+    # School names alone: few distinct values, the common case on refresh
+    schools = df["school_name"]
+    _, school_per_row_s = timed(
+        schools.apply,
+        lambda raw: resolve_school(raw, resolver.fast_lookup, resolver.alias_map),
+    )
+    _, school_distinct_s = timed(map_distinct, schools, SchoolResolver().canonical)
+
+    columns = ["school_name", "full_name", "class_name"]
+    return {
+        "rows": len(df),
+        "distinct_schools": df["school_name"].nunique(),
+        "distinct_names": df["full_name"].nunique(),
+        "distinct_classes": df["class_name"].nunique(),
+        "per_row_s": round(per_row_s, 3),
+        "per_distinct_s": round(distinct_s, 3),
+        "per_distinct_warm_s": round(warm_s, 3),
+        "speedup": round(per_row_s / distinct_s, 1),
+        "school_per_row_s": round(school_per_row_s, 3),
+        "school_per_distinct_s": round(school_distinct_s, 3),
+        "school_speedup": round(school_per_row_s / school_distinct_s, 1),
+        "same_result": bool(
+            (baseline[columns].astype(object) == result[columns].astype(object))
+            .all()
+            .all()
+        ),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--spellings", type=int, default=400)
+    parser.add_argument("--resolved-share", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_benchmark(args)
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+    write_results("dashboard_normalize", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Cost of the dashboard's response search: regex scans vs the n-gram index
+
+Builds the synthetic table of benchmarks.dashboard_normalize, normalises it
+as the dashboard does, and runs the same queries (fragments of names,
+schools and classes, some typed as variants) two ways: four
+Series.str.contains scans over every row, as the search box used to, and
+dashboard_search.SearchIndex. Also times building the index and adding a
+refresh worth of new rows to it.
+
+Usage:
+    python -m benchmarks.dashboard_search --rows 1000000
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+import numpy as np
+
+from benchmarks.common import peak_rss_mb, write_results
+from benchmarks.dashboard_normalize import synthetic_frame
+from benchmarks.khmer_normalize import variant
+from bot.schools import SchoolResolver
+from dashboard_queries import normalize_responses
+from dashboard_search import SEARCH_COLUMNS, SearchIndex
+
+
+def make_queries(df, args, rng):
+    queries = []
+    for _ in range(args.queries):
+        column = rng.choice(SEARCH_COLUMNS[:2] + SEARCH_COLUMNS[3:])
+        value = str(rng.choice(df[column].dropna().unique().tolist()))
+        start = rng.randrange(max(len(value) - 3, 1))
+        fragment = value[start : start + rng.randint(3, 12)]
+        # Some searches typed the way teachers type, not as stored
+        queries.append(variant(fragment, rng) if rng.random() < 0.3 else fragment)
+    return queries
+
+
+def scan(df, query):
+    """The old path: a case-insensitive regex scan of every row, per column"""
+    hit = np.zeros(len(df), dtype=bool)
+    for column in SEARCH_COLUMNS:
+        hit |= df[column].str.contains(query, case=False, na=False).to_numpy()
+    return df["id"].to_numpy()[hit]
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def run_benchmark(args):
+    rng = random.Random(args.seed)
+    df = normalize_responses(synthetic_frame(args, rng), SchoolResolver())
+    queries = make_queries(df, args, rng)
+
+    # Everything but the last refresh, then the refresh on its own
+    new_rows = max(len(df) // 100, 1)
+    index = SearchIndex()
+    _, build_s = timed(index.add, df.iloc[new_rows:])
+    _, add_s = timed(index.add, df.iloc[:new_rows])
+
+    scan_s, index_s, covered = [], [], 0
+    for query in queries:
+        try:
+            expected, seconds = timed(scan, df, query)
+        except Exception:
+            # Some fragments are not valid regexes, another cost of the old path
+            expected, seconds = np.empty(0, dtype=np.int64), float("nan")
+        scan_s.append(seconds)
+        found, seconds = timed(index.search, query)
+        index_s.append(seconds)
+        covered += found is None or bool(np.isin(expected, found).all())
+
+    scan_s = [seconds for seconds in scan_s if seconds == seconds]
+    return {
+        "rows": len(df),
+        "queries": len(queries),
+        "distinct_values": len(index.keys),
+        "index_build_s": round(build_s, 3),
+        "index_add_s": round(add_s, 4),
+        "index_add_rows": new_rows,
+        "scan_mean_ms": round(statistics.mean(scan_s) * 1000, 2),
+        "index_median_ms": round(statistics.median(index_s) * 1000, 3),
+        "index_mean_ms": round(statistics.mean(index_s) * 1000, 3),
+        "index_p95_ms": round(statistics.quantiles(index_s, n=20)[-1] * 1000, 3),
+        "speedup": round(statistics.mean(scan_s) / statistics.mean(index_s), 1),
+        "scan_hits_found": f"{covered}/{len(queries)}",
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--spellings", type=int, default=400)
+    parser.add_argument("--resolved-share", type=float, default=0.8)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_benchmark(args)
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+    write_results("dashboard_search", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Write-path benchmark for bot.database
+
+Measures Database.save_survey_response (one row per commit) and
+Database.save_survey_responses (batched) across pool sizes and numbers
+of concurrent callers. Runs against the local MySQL from docker-compose,
+writing to a scratch copy of survey_responses, or against a SQLite file
+when no MySQL is available.
+
+Usage:
+    python -m benchmarks.db_write --backend sqlite
+    python -m benchmarks.db_write --backend mysql --rows 5000 \
+        --pool-sizes 1,5,10 --callers 1,8,32 --batch-sizes 10,100
+"""
+
+import argparse
+import logging
+import os
+import queue
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bot.database import RESPONSE_COLUMNS, Database
+from bot.questions import COMPUTER_USAGE_QUESTION, QUESTIONS
+from benchmarks.common import latency_summary, peak_rss_mb, write_results
+
+BENCH_TABLE = "survey_responses_bench"
+
+
+class WriteStats:
+    """Thread-safe timing samples for one scenario"""
+
+    def __init__(self):
+        self.pool_wait_ms = []
+        self.commit_ms = []
+        self.call_ms = []
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def add(self, samples, value):
+        with self._lock:
+            samples.append(value)
+
+
+class TimedConnection:
+    """Connection proxy that times commit() and returns to its pool on close()"""
+
+    def __init__(self, connection, stats, release=None):
+        self._connection = connection
+        self._stats = stats
+        self._release = release
+
+    def commit(self):
+        start = time.perf_counter()
+        self._connection.commit()
+        self._stats.add(self._stats.commit_ms, (time.perf_counter() - start) * 1000)
+
+    def close(self):
+        if self._release:
+            self._release(self._connection)
+        else:
+            self._connection.close()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class BenchMySQLDatabase(Database):
+    """Database writing to a scratch table, with pool wait and commit timing"""
+
+    TABLE = BENCH_TABLE
+
+    def __init__(self, pool_size, stats):
+        super().__init__(pool_size=pool_size, pool_name=f"bench_pool_{pool_size}")
+        self.stats = stats
+
+    def get_connection(self, timeout=None):
+        start = time.perf_counter()
+        connection = super().get_connection(timeout=timeout)
+        self.stats.add(self.stats.pool_wait_ms, (time.perf_counter() - start) * 1000)
+        return TimedConnection(connection, self.stats)
+
+    def close(self):
+        self.pool._remove_connections()
+
+
+class BenchSQLiteDatabase(Database):
+    """SQLite stand-in with a fixed-size connection pool like MySQL's"""
+
+    TABLE = BENCH_TABLE
+
+    def __init__(self, path, pool_size, stats):
+        self.stats = stats
+        self._pool = queue.Queue()
+        for _ in range(pool_size):
+            connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._pool.put(connection)
+
+    @property
+    def insert_query(self):
+        return super().insert_query.replace("%s", "?")
+
+    def get_connection(self, timeout=None):
+        start = time.perf_counter()
+        connection = self._pool.get(timeout=timeout)
+        self.stats.add(self.stats.pool_wait_ms, (time.perf_counter() - start) * 1000)
+        return TimedConnection(connection, self.stats, release=self._pool.put)
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get().close()
+
+
+def create_mysql_table():
+    database = Database(pool_size=1, pool_name="bench_setup")
+    connection = database.get_connection()
+    cursor = connection.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    cursor.execute(f"CREATE TABLE {BENCH_TABLE} LIKE {Database.TABLE}")
+    connection.commit()
+    cursor.close()
+    connection.close()
+    return database
+
+
+def drop_mysql_table(database):
+    connection = database.get_connection()
+    cursor = connection.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+
+def create_sqlite_table(path):
+    columns = ", ".join(f"{column} TEXT" for column in RESPONSE_COLUMNS)
+    connection = sqlite3.connect(path)
+    connection.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    connection.execute(
+        f"CREATE TABLE {BENCH_TABLE} (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        f"{columns}, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    )
+    connection.commit()
+    connection.close()
+
+
+def sample_rows(count, seed):
+    """Realistic survey rows with Khmer answers"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        row = {
+            "full_name": f"គ្រូ {i}",
+            "school_name": "វិទ្យាល័យព្រែកលៀប",
+            "class_name": f"{rng.randint(1, 12)} ខ",
+            "computer_usage": COMPUTER_USAGE_QUESTION["choices"][0],
+            "telegram_username": f"teacher{i}",
+            "telegram_user_id": 30_000_000 + i,
+        }
+        for q in range(1, 10):
+            row[f"question_{q}"] = rng.choice(QUESTIONS[q]["choices"])
+        row["question_10"] = "សូមអរគុណ"
+        rows.append(row)
+    return rows
+
+
+def run_scenario(database, stats, rows, callers, batch_size):
+    """Write rows from `callers` threads, one row or one batch per call"""
+    if batch_size > 1:
+        work = [rows[i : i + batch_size] for i in range(0, len(rows), batch_size)]
+        write = database.save_survey_responses
+    else:
+        work = rows
+        write = database.save_survey_response
+
+    def call(item):
+        start = time.perf_counter()
+        try:
+            ok = write(item)
+        except Exception:
+            # The SQLite stand-in raises instead of returning False
+            ok = False
+        stats.add(stats.call_ms, (time.perf_counter() - start) * 1000)
+        if not ok:
+            with stats._lock:
+                stats.failures += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as executor:
+        list(executor.map(call, work))
+    return time.perf_counter() - started
+
+
+def run_benchmark(args):
+    results = []
+    rows = sample_rows(args.rows, args.seed)
+    tmpdir = tempfile.mkdtemp(prefix="db_write_")
+    setup = None
+    if args.backend == "mysql":
+        setup = create_mysql_table()
+
+    try:
+        for pool_size in args.pool_sizes:
+            for callers in args.callers:
+                for batch_size in [1] + args.batch_sizes:
+                    stats = WriteStats()
+                    if args.backend == "mysql":
+                        database = BenchMySQLDatabase(pool_size, stats)
+                    else:
+                        path = os.path.join(tmpdir, "bench.sqlite3")
+                        create_sqlite_table(path)
+                        database = BenchSQLiteDatabase(path, pool_size, stats)
+
+                    elapsed = run_scenario(database, stats, rows, callers, batch_size)
+                    database.close()
+
+                    saved = len(rows) - stats.failures * batch_size
+                    results.append(
+                        {
+                            "pool_size": pool_size,
+                            "callers": callers,
+                            "batch_size": batch_size,
+                            "rows": len(rows),
+                            "failed_calls": stats.failures,
+                            "elapsed_s": round(elapsed, 3),
+                            "rows_per_sec": round(saved / elapsed, 1),
+                            "call_latency_ms": latency_summary(stats.call_ms),
+                            "commit_latency_ms": latency_summary(stats.commit_ms),
+                            "pool_wait_ms": latency_summary(stats.pool_wait_ms),
+                        }
+                    )
+                    print(
+                        f"pool={pool_size} callers={callers} batch={batch_size}: "
+                        f"{results[-1]['rows_per_sec']} rows/s",
+                        flush=True,
+                    )
+    finally:
+        if setup is not None and not args.keep_table:
+            drop_mysql_table(setup)
+
+    return {"scenarios": results, "peak_rss_mb": peak_rss_mb()}
+
+
+def int_list(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--backend", choices=["mysql", "sqlite"], default="sqlite")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--pool-sizes", type=int_list, default=[1, 5])
+    parser.add_argument("--callers", type=int_list, default=[1, 8])
+    parser.add_argument(
+        "--batch-sizes",
+        type=int_list,
+        default=[20, 100],
+        help="batch sizes for save_survey_responses (single inserts always run)",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--keep-table", action="store_true", help=f"keep {BENCH_TABLE} afterwards"
+    )
+    parser.add_argument("--output", help="write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Per-row INFO logs from Database would dominate the measurement
+    logging.getLogger("bot.database").setLevel(logging.WARNING)
+    results = run_benchmark(args)
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+    write_results("db_write", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
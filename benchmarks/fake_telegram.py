@@ -0,0 +1,359 @@
+"""
+Local fake Telegram Bot API server for full-stack load tests
+
+Serves getUpdates from a scripted population of simulated teachers and
+records every sendMessage. Each teacher sends their next answer only after
+the bot has replied to the previous one, so the report shows real
+end-to-end reply latency through polling, handlers, MySQL and the HTTP
+client. Latency and 429 responses can be injected to exercise retry and
+rate-limiting code paths.
+
+Usage:
+    python -m benchmarks.fake_telegram --teachers 500 --arrival-rate 20
+
+    # in another shell, point the real bot at it
+    TELEGRAM_BASE_URL=http://127.0.0.1:8081/bot python -m bot.main
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from benchmarks.common import latency_summary, write_results
+from benchmarks.handler_throughput import teacher_script
+
+# Telegram's documented limits, enforced with --enforce-limits
+GLOBAL_LIMIT_PER_SECOND = 30
+GROUP_LIMIT_PER_MINUTE = 20
+
+# Parameters the bot sends JSON encoded inside the form body
+JSON_FIELDS = {"offset", "limit", "timeout", "allowed_updates", "reply_markup"}
+
+
+class TrafficScript:
+    """Scripted teachers plus everything the server has observed"""
+
+    def __init__(self, args):
+        self.args = args
+        rng = random.Random(args.seed)
+        self.scripts = {
+            args.first_user_id + i: deque(teacher_script(rng, args.no_computer_ratio))
+            for i in range(args.teachers)
+        }
+        self.lock = threading.Condition()
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        # (due_time, sequence, user_id, text) of messages not yet delivered
+        self.pending = []
+        # user_id -> time the message awaiting a reply became available
+        self.awaiting_reply = {}
+        self.reply_latencies = []
+        self.counters = Counter()
+        self.recent_sends = deque()
+        self.recent_group_sends = {}
+        self.started = None
+        self.finished = None
+
+        # Staggered arrival of teachers
+        now = time.monotonic()
+        with self.lock:
+            for i, user_id in enumerate(self.scripts):
+                self._schedule(user_id, now + i / args.arrival_rate)
+
+    def _schedule(self, user_id, due):
+        script = self.scripts[user_id]
+        if not script:
+            self.counters["surveys_completed"] += 1
+            if self.counters["surveys_completed"] == len(self.scripts):
+                self.finished = time.monotonic()
+            return
+        text = script.popleft()
+        heapq.heappush(self.pending, (due, next(self.update_ids), user_id, text))
+        self.lock.notify_all()
+
+    def take_updates(self, limit, timeout):
+        """Block up to timeout seconds for due updates (long polling)"""
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            while True:
+                now = time.monotonic()
+                due = []
+                while self.pending and self.pending[0][0] <= now and len(due) < limit:
+                    due.append(heapq.heappop(self.pending))
+                if due or now >= deadline:
+                    break
+                wait = deadline - now
+                if self.pending:
+                    wait = min(wait, self.pending[0][0] - now)
+                self.lock.wait(max(wait, 0.001))
+
+            if due and self.started is None:
+                self.started = now
+            updates = []
+            for available_at, update_id, user_id, text in due:
+                self.awaiting_reply[user_id] = available_at
+                self.counters["updates_delivered"] += 1
+                updates.append(make_update(update_id, user_id, text))
+            return updates
+
+    def check_limits(self, chat_id):
+        """Return a retry_after if this send breaks Telegram's limits"""
+        now = time.monotonic()
+        if self.args.rate_429 and random.random() < self.args.rate_429:
+            self.counters["injected_429"] += 1
+            return self.args.retry_after
+        if not self.args.enforce_limits:
+            return None
+
+        while self.recent_sends and now - self.recent_sends[0] > 1:
+            self.recent_sends.popleft()
+        if len(self.recent_sends) >= GLOBAL_LIMIT_PER_SECOND:
+            self.counters["enforced_429"] += 1
+            return 1
+        if not isinstance(chat_id, int) or chat_id < 0:
+            sends = self.recent_group_sends.setdefault(chat_id, deque())
+            while sends and now - sends[0] > 60:
+                sends.popleft()
+            if len(sends) >= GROUP_LIMIT_PER_MINUTE:
+                self.counters["enforced_429"] += 1
+                return int(60 - (now - sends[0])) + 1
+            sends.append(now)
+        self.recent_sends.append(now)
+        return None
+
+    def record_send(self, chat_id):
+        """Record a delivered sendMessage and release the teacher's next step"""
+        with self.lock:
+            now = time.monotonic()
+            if chat_id in self.scripts:
+                self.counters["replies"] += 1
+                available_at = self.awaiting_reply.pop(chat_id, None)
+                if available_at is not None:
+                    self.reply_latencies.append((now - available_at) * 1000)
+                    self._schedule(chat_id, now + self.args.think_ms / 1000)
+            else:
+                self.counters["channel_posts"] += 1
+            return next(self.message_ids)
+
+    def report(self):
+        with self.lock:
+            end = self.finished or time.monotonic()
+            elapsed = end - self.started if self.started else 0
+            return {
+                "teachers": len(self.scripts),
+                "elapsed_s": round(elapsed, 3),
+                "replies_per_sec": (
+                    round(self.counters["replies"] / elapsed, 1) if elapsed else None
+                ),
+                "reply_latency_ms": latency_summary(self.reply_latencies),
+                "counters": dict(self.counters),
+            }
+
+
+def make_update(update_id, user_id, text):
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"Teacher{user_id}"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [
+            {"type": "bot_command", "offset": 0, "length": len(text.split()[0])}
+        ]
+    return {"update_id": update_id, "message": message}
+
+
+def parse_params(body, content_type):
+    """Decode the form or JSON body of a Bot API request"""
+    if not body:
+        return {}
+    if content_type.startswith("application/json"):
+        return json.loads(body)
+
+    params = {}
+    for key, values in parse_qs(body.decode("utf-8")).items():
+        value = values[0]
+        if key in JSON_FIELDS or key == "chat_id":
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        params[key] = value
+    return params
+
+
+def make_handler(script):
+    args = script.args
+
+    class BotAPIHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; without this Nagle's
+        # algorithm adds ~40 ms to every keep-alive response.
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *log_args):
+            if args.verbose:
+                super().log_message(format, *log_args)
+
+        def do_GET(self):
+            self.do_POST()
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            params = parse_params(body, self.headers.get("Content-Type", ""))
+            endpoint = self.path.rstrip("/").rsplit("/", 1)[-1]
+            with script.lock:
+                script.counters[f"calls.{endpoint}"] += 1
+
+            if endpoint == "getUpdates":
+                updates = script.take_updates(
+                    int(params.get("limit") or 100), float(params.get("timeout") or 0)
+                )
+                self._reply(200, {"ok": True, "result": updates})
+            elif endpoint == "sendMessage":
+                self._send_message(params)
+            elif endpoint == "getMe":
+                self._reply(
+                    200,
+                    {
+                        "ok": True,
+                        "result": {
+                            "id": 1,
+                            "is_bot": True,
+                            "first_name": "Load Test",
+                            "username": "load_test_bot",
+                        },
+                    },
+                )
+            else:
+                self._reply(200, {"ok": True, "result": True})
+
+        def _send_message(self, params):
+            if args.latency_ms:
+                jitter = random.uniform(0, args.latency_jitter_ms)
+                time.sleep((args.latency_ms + jitter) / 1000)
+
+            chat_id = params.get("chat_id")
+            with script.lock:
+                retry_after = script.check_limits(chat_id)
+            if retry_after is not None:
+                self._reply(
+                    429,
+                    {
+                        "ok": False,
+                        "error_code": 429,
+                        "description": (
+                            f"Too Many Requests: retry after {retry_after}"
+                        ),
+                        "parameters": {"retry_after": retry_after},
+                    },
+                )
+                return
+
+            message_id = script.record_send(chat_id)
+            if isinstance(chat_id, int) and chat_id > 0:
+                chat = {"id": chat_id, "type": "private"}
+            else:
+                chat = {"id": -1001, "type": "channel", "title": str(chat_id)}
+            self._reply(
+                200,
+                {
+                    "ok": True,
+                    "result": {
+                        "message_id": message_id,
+                        "date": int(time.time()),
+                        "chat": chat,
+                        "text": params.get("text", ""),
+                    },
+                },
+            )
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return BotAPIHandler
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--teachers", type=int, default=500)
+    parser.add_argument(
+        "--arrival-rate", type=float, default=20, help="new teachers per second"
+    )
+    parser.add_argument(
+        "--think-ms", type=float, default=200, help="pause before each answer"
+    )
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0)
+    parser.add_argument(
+        "--rate-429",
+        type=float,
+        default=0.0,
+        help="fraction of sendMessage calls answered with 429",
+    )
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument(
+        "--enforce-limits",
+        action="store_true",
+        help="answer 429 above 30 msg/s globally or 20 msg/min per channel",
+    )
+    parser.add_argument("--no-computer-ratio", type=float, default=0.2)
+    parser.add_argument("--first-user-id", type=int, default=20_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--duration", type=float, help="stop after this many seconds of traffic"
+    )
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    script = TrafficScript(args)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(script))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(
+        f"Fake Bot API listening on http://{args.host}:{args.port}/bot "
+        f"with {args.teachers} teachers",
+        flush=True,
+    )
+
+    try:
+        while script.finished is None:
+            time.sleep(0.2)
+            if (
+                args.duration
+                and script.started
+                and time.monotonic() - script.started >= args.duration
+            ):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+    params = {key: value for key, value in vars(args).items() if key not in ("output",)}
+    write_results("fake_telegram", params, script.report(), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+In-process throughput benchmark for the survey conversation
+
+Drives the real ConversationHandler from bot.main with synthetic updates
+for many simulated teachers. The Bot API is replaced by an in-memory fake,
+so the numbers measure handler, PTB dispatch and database cost only.
+Completed surveys go through the bot's write-behind outbox, which is
+drained at the end and timed separately.
+
+Usage:
+    python -m benchmarks.handler_throughput --teachers 2000 --concurrency 200
+    python -m benchmarks.handler_throughput --db local --output results.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+import tracemalloc
+from collections import Counter
+
+from telegram import Update
+from telegram.ext import Application
+from telegram.request import BaseRequest
+
+from bot import handlers
+from bot.main import build_conversation_handler
+from bot.notifications import NotificationSender
+from bot.questions import COMPUTER_USAGE_QUESTION, QUESTIONS
+from benchmarks.common import latency_summary, peak_rss_mb, write_results
+
+BENCH_TOKEN = "123456:BENCHMARK"
+BENCH_CHANNEL = "@bench_channel"
+
+# Label of each step of a full survey, in the order teachers send them
+STEPS = ["start", "full_name", "school_name", "class_name", "computer_usage"] + [
+    f"question_{i}" for i in range(1, 11)
+]
+
+
+class FakeBotAPI(BaseRequest):
+    """Bot API stand-in that answers every request from memory"""
+
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000
+        self.calls = Counter()
+        self._message_id = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, *args, **kwargs):
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        params = request_data.parameters if request_data else {}
+        if endpoint == "getMe":
+            result = {
+                "id": 1,
+                "is_bot": True,
+                "first_name": "Benchmark",
+                "username": "benchmark_bot",
+            }
+        elif endpoint == "sendMessage":
+            self._message_id += 1
+            chat_id = params.get("chat_id")
+            result = {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {
+                    "id": chat_id if isinstance(chat_id, int) else -1,
+                    "type": "private",
+                },
+                "text": params.get("text", ""),
+            }
+        else:
+            result = True
+
+        body = json.dumps({"ok": True, "result": result}).encode("utf-8")
+        return 200, body
+
+
+class FakeDatabase:
+    """In-memory Database stand-in with optional blocking latency"""
+
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000
+        self.rows = []
+
+    def save_survey_response(self, user_data):
+        if self.latency:
+            # The real driver blocks the event loop, so block here too
+            time.sleep(self.latency)
+        self.rows.append(dict(user_data))
+        return True
+
+    def save_survey_responses(self, rows):
+        if self.latency:
+            time.sleep(self.latency)
+        self.rows.extend(dict(row) for row in rows)
+        return True
+
+    def test_connection(self):
+        return True
+
+
+def teacher_script(rng, no_computer_ratio):
+    """Messages one simulated teacher sends to finish the survey"""
+    messages = ["/start", "សុខ សុភា", "វិទ្យាល័យព្រែកលៀប", "6 ខ"]
+    if rng.random() < no_computer_ratio:
+        return messages + [COMPUTER_USAGE_QUESTION["choices"][1]]
+
+    messages.append(COMPUTER_USAGE_QUESTION["choices"][0])
+    for i in range(1, 10):
+        messages.append(rng.choice(QUESTIONS[i]["choices"]))
+    messages.append("សូមអរគុណ")
+    return messages
+
+
+def make_update(bot, update_id, user_id, text):
+    """Build a private-chat text Update from a simulated teacher"""
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"Teacher{user_id}"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [
+            {"type": "bot_command", "offset": 0, "length": len(text.split()[0])}
+        ]
+    return Update.de_json({"update_id": update_id, "message": message}, bot)
+
+
+async def run_benchmark(args):
+    api = FakeBotAPI(latency_ms=args.api_latency_ms)
+    application = (
+        Application.builder()
+        .token(BENCH_TOKEN)
+        .request(api)
+        .get_updates_request(FakeBotAPI())
+        .updater(None)
+        .build()
+    )
+    application.add_handler(build_conversation_handler())
+
+    if args.db == "local":
+        from bot.database import Database
+
+        database = Database()
+    else:
+        database = FakeDatabase(latency_ms=args.db_latency_ms)
+
+    notifier = NotificationSender(bot=application.bot)
+    notifier.channel_id = BENCH_CHANNEL
+    outbox = handlers.initialize_services(
+        database=database, notification_sender=notifier
+    )
+
+    rng = random.Random(args.seed)
+    scripts = [
+        teacher_script(rng, args.no_computer_ratio) for _ in range(args.teachers)
+    ]
+    latencies = []
+    step_latencies = {step: [] for step in STEPS}
+    next_update_id = iter(range(1, 10**9))
+    active = asyncio.Semaphore(args.concurrency)
+
+    async def simulate_teacher(index, script):
+        user_id = 10_000_000 + index
+        async with active:
+            for step, text in zip(STEPS, script):
+                update = make_update(
+                    application.bot, next(next_update_id), user_id, text
+                )
+                start = time.perf_counter()
+                await application.process_update(update)
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                latencies.append(elapsed_ms)
+                step_latencies[step].append(elapsed_ms)
+                # Yield so teachers interleave like real concurrent traffic
+                await asyncio.sleep(0)
+
+    if args.trace_memory:
+        tracemalloc.start()
+
+    async with application:
+        await outbox.start()
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(simulate_teacher(i, script) for i, script in enumerate(scripts))
+        )
+        elapsed = time.perf_counter() - started
+        # Saves and channel posts happen behind the replies; time the flush
+        drain_started = time.perf_counter()
+        outbox_stats = await outbox.drain()
+        drain_s = time.perf_counter() - drain_started
+
+    traced_peak = None
+    if args.trace_memory:
+        traced_peak = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+        tracemalloc.stop()
+
+    saved = len(database.rows) if isinstance(database, FakeDatabase) else None
+    return {
+        "updates": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_sec": round(len(latencies) / elapsed, 1),
+        "surveys_per_sec": round(args.teachers / elapsed, 1),
+        "surveys_saved": saved,
+        "outbox_drain_s": round(drain_s, 3),
+        "outbox": outbox_stats,
+        "latency_ms": latency_summary(latencies),
+        "latency_ms_by_step": {
+            step: latency_summary(samples)
+            for step, samples in step_latencies.items()
+            if samples
+        },
+        "bot_api_calls": dict(api.calls),
+        "peak_rss_mb": peak_rss_mb(),
+        "tracemalloc_peak_mb": traced_peak,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--teachers", type=int, default=2000)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=200,
+        help="teachers in the middle of a survey at the same time",
+    )
+    parser.add_argument("--db", choices=["fake", "local"], default="fake")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    parser.add_argument("--api-latency-ms", type=float, default=0.0)
+    parser.add_argument("--no-computer-ratio", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="also report tracemalloc peak (slows the run down)",
+    )
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep bot INFO logs")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.verbose:
+        # Per-survey INFO logs would dominate the measurement
+        logging.getLogger().setLevel(logging.WARNING)
+    results = asyncio.run(run_benchmark(args))
+    params = dict(vars(args))
+    params.pop("output")
+    params.pop("verbose")
+    write_results("handler_throughput", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+School-name resolution rate and cost with bot.khmer normalisation
+
+Generates rows of canonical school names typed the ways teachers type them
+(zero-width spaces, stray spaces, Latin digits, "វិ." prefixes, vowels
+before subscripts, trailing "។") and resolves every row, reporting how many
+resolve to a known school and the per-row cost with the key cache.
+
+Usage:
+    python -m benchmarks.khmer_normalize --rows 200000
+"""
+
+import argparse
+import random
+import time
+
+from bot.schools import (
+    C,
+    build_fast_lookup,
+    get_all_aliases,
+    normalize_key,
+    resolve_school,
+)
+from benchmarks.common import peak_rss_mb, write_results
+
+PREFIXES = {"វិទ្យាល័យ": "វិ.", "អនុវិទ្យាល័យ": "អនុ. "}
+
+
+def variant(name, rng):
+    action = rng.choice(["zwsp", "space", "digits", "prefix", "order", "khan", "none"])
+    i = rng.randrange(1, len(name))
+    if action == "zwsp":
+        return name[:i] + "\u200b" + name[i:]
+    if action == "space":
+        return name[:i] + " " + name[i:]
+    if action == "digits":
+        return name.replace("១", "1")
+    if action == "prefix":
+        for prefix, short in sorted(PREFIXES.items(), key=lambda p: -len(p[0])):
+            if name.startswith(prefix):
+                return short + name[len(prefix) :]
+    if action == "order":
+        # Vowel typed before the subscript, nikahit before the vowel
+        return name.replace("ុំ", "ំុ").replace("្យា", "ា្យ")
+    if action == "khan":
+        return name + "។"
+    return name
+
+
+def run_benchmark(args):
+    rng = random.Random(args.seed)
+    canonical = list(C.values())
+    rows = [variant(rng.choice(canonical), rng) for _ in range(args.rows)]
+
+    alias_map = get_all_aliases()
+    fast_lookup = build_fast_lookup(alias_map)
+    known = set(alias_map.values()) | set(canonical)
+
+    started = time.perf_counter()
+    resolved = [resolve_school(raw, fast_lookup, alias_map) for raw in rows]
+    elapsed = time.perf_counter() - started
+
+    cache = normalize_key.cache_info()
+    return {
+        "rows": len(rows),
+        "distinct_raw": len(set(rows)),
+        "resolved_rate": round(sum(name in known for name in resolved) / len(rows), 4),
+        "elapsed_s": round(elapsed, 3),
+        "us_per_row": round(elapsed / len(rows) * 1e6, 2),
+        "key_cache_hits": cache.hits,
+        "key_cache_misses": cache.misses,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_benchmark(args)
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+    write_results("khmer_normalize", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Lookup latency of the school-name n-gram index
+
+Indexes the real alias table plus thousands of synthetic Khmer school
+names, then times SchoolResolver-style suggestions for misspelled and
+partial queries.
+
+Usage:
+    python -m benchmarks.school_index --schools 5000 --queries 2000
+"""
+
+import argparse
+import random
+import time
+
+from bot.schools import SCHOOL_ALIASES_BUILTIN, SUGGESTION_MIN_SCORE, normalize_key
+from bot.textindex import NgramIndex
+from benchmarks.common import latency_summary, peak_rss_mb, write_results
+
+PREFIXES = ["វិទ្យាល័យ", "អនុវិទ្យាល័យ", "សាលាបឋមសិក្សា", "អនុ.", "វិ."]
+SYLLABLES = [
+    "ព្រែក",
+    "លៀប",
+    "ដំបង",
+    "ខ្សាច់",
+    "សុខ",
+    "អាន",
+    "ទន្លាប់",
+    "ត្រាំ",
+    "ខ្នារ",
+    "ព្រៃ",
+    "សណ្តែក",
+    "ដូង",
+    "ខ្ពស់",
+    "ជីកង",
+    "ល្វេ",
+    "គោក",
+    "ព្រីង",
+    "វត្ត",
+    "បូព៌",
+    "ចតុមុខ",
+]
+
+
+def synthetic_names(count, rng):
+    names = set()
+    while len(names) < count:
+        parts = rng.sample(SYLLABLES, rng.randint(2, 4))
+        names.add(rng.choice(PREFIXES[:3]) + "".join(parts))
+    return sorted(names)
+
+
+def misspell(name, rng):
+    """Drop, duplicate or swap a character, add a space, or cut the prefix"""
+    chars = list(name)
+    action = rng.choice(["drop", "double", "swap", "space", "partial"])
+    i = rng.randrange(1, len(chars) - 1)
+    if action == "drop":
+        del chars[i]
+    elif action == "double":
+        chars.insert(i, chars[i])
+    elif action == "swap":
+        chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    elif action == "space":
+        chars.insert(i, " ")
+    else:
+        for prefix in PREFIXES:
+            if name.startswith(prefix):
+                return name[len(prefix) :]
+    return "".join(chars)
+
+
+def run_benchmark(args):
+    rng = random.Random(args.seed)
+    names = synthetic_names(args.schools, rng)
+
+    started = time.perf_counter()
+    index = NgramIndex(key=normalize_key)
+    for alias, canonical in SCHOOL_ALIASES_BUILTIN.items():
+        index.add(alias, canonical)
+    for name in names:
+        index.add(name)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    latencies = []
+    hits = 0
+    for _ in range(args.queries):
+        target = rng.choice(names)
+        query = misspell(target, rng)
+        start = time.perf_counter()
+        results = index.search(query, limit=3, min_score=SUGGESTION_MIN_SCORE)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += any(value == target for value, _ in results)
+
+    return {
+        "entries": len(index),
+        "build_ms": round(build_ms, 1),
+        "lookup_ms": latency_summary(latencies),
+        "target_in_top3": round(hits / args.queries, 3),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--schools", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_benchmark(args)
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+    write_results("school_index", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
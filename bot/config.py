@@ -5,10 +5,30 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+def _parse_id_list(value):
+    """Parse a comma separated list of Telegram user IDs"""
+    if not value:
+        return set()
+    return {int(item) for item in value.split(",") if item.strip()}
+
+
 class Config:
     # Telegram Bot
     API_TOKEN = os.getenv("API_TOKEN")
     CHANNEL_ID = os.getenv("CHANNEL_ID")
+    ADMIN_USER_IDS = _parse_id_list(os.getenv("ADMIN_USER_IDS"))
+    # Point at a local fake Bot API server for load tests
+    TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL", "https://api.telegram.org/bot")
+    TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", 256))
+    # Outbound rate limiting (Telegram allows ~30 msg/s overall, ~1 msg/s per
+    # private chat and 20 msg/min per group or channel)
+    TELEGRAM_RATE_LIMIT = os.getenv("TELEGRAM_RATE_LIMIT", "true").lower() == "true"
+    TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 30))
+    TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", 1))
+    TELEGRAM_GROUP_RATE_PER_MINUTE = float(
+        os.getenv("TELEGRAM_GROUP_RATE_PER_MINUTE", 20)
+    )
+    TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", 3))
 
     # MySQL Database
     MYSQL_HOST = os.getenv("MYSQL_HOST", "localhost")
@@ -16,6 +36,25 @@ class Config:
     MYSQL_DATABASE = os.getenv("MYSQL_DATABASE")
     MYSQL_USER = os.getenv("MYSQL_USER")
     MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
+    MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", 5))
+    # Seconds to wait for a free pooled connection before failing
+    MYSQL_POOL_TIMEOUT = float(os.getenv("MYSQL_POOL_TIMEOUT", 5))
+
+    # Write-behind batching of completed surveys and graceful shutdown
+    WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", 50))
+    WRITE_BATCH_DELAY_MS = int(os.getenv("WRITE_BATCH_DELAY_MS", 200))
+    # Keep below docker stop's 10 second grace period
+    SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", 8))
+    SPOOL_DIR = os.getenv("SPOOL_DIR", "logs/spool")
+
+    # Custom school aliases, edited from the dashboard's School Mapping tab
+    SCHOOL_ALIAS_FILE = os.getenv("SCHOOL_ALIAS_FILE", "school_aliases_custom.json")
+
+    # Handler profiling (opt-in)
+    PROFILE_HANDLERS = os.getenv("PROFILE_HANDLERS", "false").lower() == "true"
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.01))
+    SLOW_HANDLER_MS = int(os.getenv("SLOW_HANDLER_MS", 1000))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "logs/profiles")
 
     @classmethod
     def validate(cls):
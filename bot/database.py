@@ -1,18 +1,52 @@
+import threading
+import time
 import mysql.connector
 from mysql.connector import pooling
+from mysql.connector.errors import PoolError
 from bot.config import Config
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Process-wide Database shared by handlers and startup checks
+_shared_database = None
+_shared_lock = threading.Lock()
+
+# Columns written for every completed survey, in INSERT order
+RESPONSE_COLUMNS = [
+    "full_name",
+    "school_name",
+    "school_id",
+    "school_canonical",
+    "class_name",
+    "computer_usage",
+    "telegram_username",
+    "telegram_user_id",
+    "question_1",
+    "question_2",
+    "question_3",
+    "question_4",
+    "question_5",
+    "question_6",
+    "question_7",
+    "question_8",
+    "question_9",
+    "question_10",
+]
+# Errors caused by the rows being saved (bad values), not by the server or
+# the connection; retrying the same rows fails the same way
+ROW_ERRORS = (mysql.connector.errors.DataError, mysql.connector.errors.IntegrityError)
+
 
 class Database:
-    def __init__(self):
+    TABLE = "survey_responses"
+
+    def __init__(self, pool_size=None, pool_name="survey_pool"):
         """Initialize database connection pool"""
         try:
             self.pool = pooling.MySQLConnectionPool(
-                pool_name="survey_pool",
-                pool_size=5,
+                pool_name=pool_name,
+                pool_size=pool_size or Config.MYSQL_POOL_SIZE,
                 host=Config.MYSQL_HOST,
                 port=Config.MYSQL_PORT,
                 database=Config.MYSQL_DATABASE,
@@ -26,9 +60,44 @@ class Database:
             logger.error(f"Error creating connection pool: {err}")
             raise
 
-    def get_connection(self):
-        """Get a connection from the pool"""
-        return self.pool.get_connection()
+    @property
+    def insert_query(self):
+        """INSERT statement for one survey response"""
+        placeholders = ", ".join(["%s"] * len(RESPONSE_COLUMNS))
+        return (
+            f"INSERT INTO {self.TABLE} ({', '.join(RESPONSE_COLUMNS)}) "
+            f"VALUES ({placeholders})"
+        )
+
+    def get_connection(self, timeout=None):
+        """
+        Get a connection from the pool
+
+        The pool raises immediately when all connections are in use, so
+        retry until `timeout` seconds (MYSQL_POOL_TIMEOUT by default) pass.
+        """
+        timeout = Config.MYSQL_POOL_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        delay = 0.001
+        while True:
+            try:
+                return self.pool.get_connection()
+            except PoolError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, 0.05)
+
+    @staticmethod
+    def _row_values(user_data):
+        """Map a survey dict to INSERT values in RESPONSE_COLUMNS order"""
+        values = dict(user_data)
+        values.setdefault("telegram_username", "N/A")
+        # Rows queued before school resolution existed; `bot.schools backfill`
+        # fills these in later
+        values.setdefault("school_id", None)
+        values.setdefault("school_canonical", None)
+        return tuple(values[column] for column in RESPONSE_COLUMNS)
 
     def save_survey_response(self, user_data):
         """
@@ -52,34 +121,7 @@ class Database:
             connection = self.get_connection()
             cursor = connection.cursor()
 
-            query = """
-                INSERT INTO survey_responses 
-                (full_name, school_name, class_name, computer_usage, telegram_username, telegram_user_id,
-                question_1, question_2, question_3, question_4, question_5,
-                question_6, question_7, question_8, question_9, question_10)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-
-            values = (
-                user_data["full_name"],
-                user_data["school_name"],
-                user_data["class_name"],
-                user_data["computer_usage"],
-                user_data.get("telegram_username", "N/A"),
-                user_data["telegram_user_id"],
-                user_data["question_1"],
-                user_data["question_2"],
-                user_data["question_3"],
-                user_data["question_4"],
-                user_data["question_5"],
-                user_data["question_6"],
-                user_data["question_7"],
-                user_data["question_8"],
-                user_data["question_9"],
-                user_data["question_10"],
-            )
-
-            cursor.execute(query, values)
+            cursor.execute(self.insert_query, self._row_values(user_data))
             connection.commit()
 
             logger.info(f"Survey response saved for user: {user_data['full_name']}")
@@ -97,6 +139,138 @@ class Database:
             if connection:
                 connection.close()
 
+    def save_survey_responses(self, rows):
+        """
+        Save several completed survey responses in one transaction
+
+        Args:
+            rows (list): user_data dicts as accepted by save_survey_response
+
+        Returns:
+            bool: True if all rows were saved, False if the database failed
+                (none are saved)
+
+        Raises:
+            ROW_ERRORS: If MySQL rejected a row's values (none are saved)
+            KeyError: If a row lacks a column
+        """
+        if not rows:
+            return True
+
+        connection = None
+        cursor = None
+
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+
+            # mysql-connector rewrites this into one multi-row INSERT
+            cursor.executemany(
+                self.insert_query, [self._row_values(row) for row in rows]
+            )
+            connection.commit()
+
+            logger.info(f"Saved batch of {len(rows)} survey responses")
+            return True
+
+        except mysql.connector.Error as err:
+            logger.error(f"Database error saving batch of {len(rows)}: {err}")
+            if connection:
+                try:
+                    connection.rollback()
+                except mysql.connector.Error as rollback_err:
+                    # Dead connection: nothing was committed anyway
+                    logger.error(f"Rollback failed: {rollback_err}")
+            if isinstance(err, ROW_ERRORS):
+                raise
+            return False
+
+        finally:
+            if cursor:
+                cursor.close()
+            if connection:
+                connection.close()
+
+    def missing_columns(self):
+        """
+        RESPONSE_COLUMNS the table does not have, i.e. a migration in
+        sql/migrations has not been applied
+
+        Returns:
+            list: Column names, in INSERT order
+        """
+        connection = self.get_connection()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"SHOW COLUMNS FROM {self.TABLE}")
+            present = {row[0] for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+            connection.close()
+        return [column for column in RESPONSE_COLUMNS if column not in present]
+
+    def get_school_names(self, unresolved_only=True):
+        """
+        Distinct raw school names, compared byte for byte
+
+        Args:
+            unresolved_only (bool): Only names of rows without a school_id
+
+        Returns:
+            list: Raw school_name values
+        """
+        where = "WHERE school_id IS NULL" if unresolved_only else ""
+        connection = self.get_connection()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                f"SELECT school_name FROM {self.TABLE} {where} "
+                f"GROUP BY school_name COLLATE utf8mb4_bin"
+            )
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            connection.close()
+
+    def update_school_resolution(self, updates):
+        """
+        Store the resolved school for every row with a given raw name
+
+        Args:
+            updates (list): (school_name, school_id, school_canonical) tuples
+
+        Returns:
+            int: Number of rows changed
+        """
+        if not updates:
+            return 0
+
+        connection = None
+        cursor = None
+
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            cursor.executemany(
+                f"UPDATE {self.TABLE} SET school_id = %s, school_canonical = %s "
+                f"WHERE school_name = %s COLLATE utf8mb4_bin",
+                [(school_id, canonical, raw) for raw, school_id, canonical in updates],
+            )
+            connection.commit()
+            return cursor.rowcount
+
+        except mysql.connector.Error as err:
+            logger.error(f"Database error updating school resolution: {err}")
+            if connection:
+                connection.rollback()
+            return 0
+
+        finally:
+            if cursor:
+                cursor.close()
+            if connection:
+                connection.close()
+
     def test_connection(self):
         """Test database connection"""
         try:
@@ -110,3 +284,13 @@ class Database:
         except Exception as e:
             logger.error(f"Database connection test failed: {e}")
             return False
+
+
+def get_database():
+    """Return the shared Database, creating its connection pool on first use"""
+    global _shared_database
+    if _shared_database is None:
+        with _shared_lock:
+            if _shared_database is None:
+                _shared_database = Database()
+    return _shared_database
@@ -6,11 +6,16 @@ from bot.questions import (
     WELCOME_MESSAGE,
     THANK_YOU_MESSAGE,
     ASK_SCHOOL_MESSAGE,
+    ASK_SCHOOL_CONFIRM_MESSAGE,
+    KEEP_TYPED_SCHOOL,
     ASK_CLASS_MESSAGE,
     COMPUTER_USAGE_QUESTION,
 )
-from bot.database import Database
+from bot.database import get_database
+from bot.khmer import fold_digits, normalize_text
 from bot.notifications import NotificationSender
+from bot.outbox import SurveyOutbox
+from bot.schools import get_school_resolver
 
 logger = logging.getLogger(__name__)
 
@@ -30,20 +35,60 @@ logger = logging.getLogger(__name__)
     QUESTION_8,
     QUESTION_9,
     QUESTION_10,
-) = range(14)
+    SCHOOL_CONFIRM,
+) = range(15)
+
+# Known schools offered when a typed school name is not recognised
+SCHOOL_SUGGESTIONS = 3
+
+# Readable state labels for logs and profiles
+STATE_NAMES = {
+    FULL_NAME: "FULL_NAME",
+    SCHOOL_NAME: "SCHOOL_NAME",
+    CLASS_NAME: "CLASS_NAME",
+    COMPUTER_USAGE: "COMPUTER_USAGE",
+    QUESTION_1: "QUESTION_1",
+    QUESTION_2: "QUESTION_2",
+    QUESTION_3: "QUESTION_3",
+    QUESTION_4: "QUESTION_4",
+    QUESTION_5: "QUESTION_5",
+    QUESTION_6: "QUESTION_6",
+    QUESTION_7: "QUESTION_7",
+    QUESTION_8: "QUESTION_8",
+    QUESTION_9: "QUESTION_9",
+    QUESTION_10: "QUESTION_10",
+    SCHOOL_CONFIRM: "SCHOOL_CONFIRM",
+}
 
 # These will be initialized later
 db = None
 notifier = None
+outbox = None
 
 
-def initialize_services():
-    """Initialize database and notifier after config is loaded"""
-    global db, notifier
+def initialize_services(database=None, notification_sender=None):
+    """
+    Initialize database, notifier and outbox after config is loaded
+
+    Args:
+        database: Optional Database (or compatible) instance to use
+        notification_sender: Optional NotificationSender (or compatible) instance
+
+    Returns:
+        SurveyOutbox: The outbox; call start() on it inside the event loop
+    """
+    global db, notifier, outbox
+    if database is not None:
+        db = database
+    if notification_sender is not None:
+        notifier = notification_sender
     if db is None:
-        db = Database()
+        db = get_database()
     if notifier is None:
         notifier = NotificationSender()
+    if outbox is None:
+        outbox = SurveyOutbox(db, notifier)
+    return outbox
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -63,7 +108,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def receive_full_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Receive full name and ask for school name"""
-    full_name = update.message.text.strip()
+    full_name = normalize_text(update.message.text)
 
     if not full_name:
         await update.message.reply_text("សូមបញ្ចូលឈ្មោះពេញរបស់អ្នក：")
@@ -79,15 +124,35 @@ async def receive_full_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def receive_school_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Receive school name and ask for class"""
+    """Receive school name, offer known schools if it is not recognised"""
     school_name = update.message.text.strip()
 
     if not school_name:
         await update.message.reply_text("សូមបញ្ចូលឈ្មោះសាលារបស់អ្នក：")
         return SCHOOL_NAME
 
-    # Save school name
+    # Save school name as typed, plus the school it resolves to
+    resolver = get_school_resolver()
     context.user_data["school_name"] = school_name
+    school_id, school_canonical = resolver.resolve(school_name)
+    context.user_data["school_id"] = school_id
+    context.user_data["school_canonical"] = school_canonical
+
+    if not resolver.is_resolved(school_canonical):
+        suggestions = [
+            name for name, _ in resolver.suggest(school_name, SCHOOL_SUGGESTIONS)
+        ]
+        if suggestions:
+            # Offer one-tap buttons instead of storing another spelling
+            context.user_data["school_suggestions"] = suggestions
+            keyboard = [[name] for name in suggestions] + [[KEEP_TYPED_SCHOOL]]
+            reply_markup = ReplyKeyboardMarkup(
+                keyboard, one_time_keyboard=True, resize_keyboard=True
+            )
+            await update.message.reply_text(
+                ASK_SCHOOL_CONFIRM_MESSAGE, reply_markup=reply_markup
+            )
+            return SCHOOL_CONFIRM
 
     # Ask for class
     await update.message.reply_text(ASK_CLASS_MESSAGE)
@@ -95,6 +160,28 @@ async def receive_school_name(update: Update, context: ContextTypes.DEFAULT_TYPE
     return CLASS_NAME
 
 
+async def receive_school_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Receive a suggested school, keep the typed name, or retry with new text"""
+    choice = update.message.text.strip()
+    suggestions = context.user_data.pop("school_suggestions", [])
+
+    if choice in suggestions:
+        school_id, school_canonical = get_school_resolver().resolve(choice)
+        context.user_data["school_name"] = choice
+        context.user_data["school_id"] = school_id
+        context.user_data["school_canonical"] = school_canonical
+    elif choice != KEEP_TYPED_SCHOOL:
+        # Teacher typed the name again instead of tapping a button
+        return await receive_school_name(update, context)
+
+    # Ask for class
+    await update.message.reply_text(
+        ASK_CLASS_MESSAGE, reply_markup=ReplyKeyboardRemove()
+    )
+
+    return CLASS_NAME
+
+
 # async def receive_class_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
 #     """Receive class name and show Question 1"""
 #     class_name = update.message.text.strip()
@@ -119,7 +206,8 @@ async def receive_school_name(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 async def receive_class_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Receive class name and show Computer Usage question"""
-    class_name = update.message.text.strip()
+    # Khmer and Latin digits name the same class ("១២ខ" == "12ខ")
+    class_name = fold_digits(normalize_text(update.message.text))
 
     if not class_name:
         await update.message.reply_text("សូមបញ្ចូលថ្នាក់ដែលអ្នកបង្រៀន៖")
@@ -153,17 +241,11 @@ async def receive_computer_usage(update: Update, context: ContextTypes.DEFAULT_T
         for i in range(1, 11):
             context.user_data[f"question_{i}"] = "N/A"
 
-        # Save to database
-        success = db.save_survey_response(context.user_data)
-
-        if success:
-            # Send notification to channel
-            await notifier.send_survey_notification(context.user_data)
-            logger.info(
-                f"Survey completed early (no computer) by: {context.user_data['full_name']}"
-            )
-        else:
-            logger.error(f"Failed to save survey for: {context.user_data['full_name']}")
+        # Queue for saving to database and notifying the channel
+        await outbox.submit(context.user_data)
+        logger.info(
+            f"Survey completed early (no computer) by: {context.user_data['full_name']}"
+        )
 
         # Send thank you message
         await update.message.reply_text(
@@ -327,19 +409,13 @@ async def receive_answer_9(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def receive_answer_10(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Receive answer 10 (text), save to database, send notification, and end survey"""
+    """Receive answer 10 (text), queue the survey for saving, and end survey"""
     answer = update.message.text
     context.user_data["question_10"] = answer
 
-    # Save to database
-    success = db.save_survey_response(context.user_data)
-
-    if success:
-        # Send notification to channel
-        await notifier.send_survey_notification(context.user_data)
-        logger.info(f"Survey completed by: {context.user_data['full_name']}")
-    else:
-        logger.error(f"Failed to save survey for: {context.user_data['full_name']}")
+    # Queue for saving to database and notifying the channel
+    await outbox.submit(context.user_data)
+    logger.info(f"Survey completed by: {context.user_data['full_name']}")
 
     # Send thank you message
     await update.message.reply_text(
@@ -0,0 +1,146 @@
+"""
+Normalisation of Khmer text typed by teachers
+
+Teachers type the same school, class or name in many ways: with zero-width
+spaces from Khmer keyboards, Khmer or Latin digits, subscripts and vowels
+in a different order, or with punctuation such as "វិ.". Everything here is
+a single str.translate() pass plus one regex for cluster order, and
+normalize_key() is memoised because the same raw values repeat across
+thousands of rows.
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+
+# Joins the next consonant to the current cluster as a subscript
+KHMER_COENG = "\u17d2"
+KHMER_RO = "\u179a"
+
+# Distinct raw values kept by normalize_key()'s cache
+KEY_CACHE_SIZE = 100_000
+
+# Zero-width and other invisible characters, plus the deprecated invisible
+# inherent vowels U+17B4 / U+17B5
+INVISIBLE = "\u200b\u200c\u200d\u00ad\ufeff\u2060\u180e\u17b4\u17b5"
+
+# Spaces that are not U+0020
+SPACES = (
+    "\u00a0\u1680\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008"
+    "\u2009\u200a\u202f\u205f\u3000\u2028\u2029\t\r\n"
+)
+
+# Dropped from lookup keys
+PUNCTUATION = (
+    "!\"#$%&'()*+,-./:;<>?@[\\]^_`{|}~"
+    "\u17d4\u17d5\u17d6\u17d8\u17d9\u17da"  # ។ ៕ ៖ ៘ ៙ ៚
+    "\u00ab\u00bb\u2018\u2019\u201c\u201d\u2013\u2014\u2026"
+)
+
+KHMER_DIGITS = "\u17e0\u17e1\u17e2\u17e3\u17e4\u17e5\u17e6\u17e7\u17e8\u17e9"
+
+_CLEAN_TABLE = str.maketrans(
+    {
+        **{char: None for char in INVISIBLE},
+        **{char: " " for char in SPACES},
+        "\u17a3": "\u17a2",  # deprecated ឣ -> អ
+        "\u17a4": "\u17a2\u17b6",  # deprecated ឤ -> អា
+    }
+)
+
+_DIGIT_TABLE = str.maketrans(KHMER_DIGITS, "0123456789")
+
+_KEY_TABLE = str.maketrans(
+    {
+        **{char: None for char in PUNCTUATION},
+        " ": None,
+        **{ord(khmer): str(i) for i, khmer in enumerate(KHMER_DIGITS)},
+    }
+)
+
+# A consonant or independent vowel followed by its marks and subscripts
+_KHMER_CLUSTER = re.compile(
+    "[\u1780-\u17b3](?:[\u17b6-\u17d1\u17d3\u17dd]|\u17d2[\u1780-\u17b3])+"
+)
+_KHMER_UNIT = re.compile("\u17d2[\u1780-\u17b3]|.", re.DOTALL)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _unit_rank(unit):
+    """Position of a cluster part in Unicode's recommended Khmer order"""
+    char = unit[0]
+    if char == KHMER_COENG:
+        return 3 if unit[1] == KHMER_RO else 2
+    if char == "\u17cc":  # robat
+        return 1
+    if char in "\u17c9\u17ca":  # register shifters
+        return 4
+    if "\u17b6" <= char <= "\u17c5":  # dependent vowels
+        return 5
+    return 6  # nikahit, reahmuk and other signs
+
+
+def _order_cluster(match):
+    base, *marks = _KHMER_UNIT.findall(match.group())
+    ordered = []
+    for unit in sorted(marks, key=_unit_rank):
+        # A mark typed twice in a row is a typo, not a different spelling
+        if not ordered or ordered[-1] != unit:
+            ordered.append(unit)
+    return base + "".join(ordered)
+
+
+def order_clusters(text):
+    """
+    Put subscripts, vowels and signs of each Khmer cluster in the order
+    Unicode recommends, so "ក្រើ" typed as ក + ើ + ្ + រ matches, and
+    subscript RO comes after any other subscript ("ស្ត្រ", not "ស្រ្ត").
+    """
+    return _KHMER_CLUSTER.sub(_order_cluster, text)
+
+
+def normalize_text(text):
+    """
+    Clean text for display and storage: NFC, no invisible characters,
+    canonical Khmer cluster order and single spaces. Digits and punctuation
+    are kept as typed.
+    """
+    if not isinstance(text, str):
+        return str(text)
+    text = order_clusters(unicodedata.normalize("NFC", text).translate(_CLEAN_TABLE))
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def fold_digits(text):
+    """Replace Khmer digits with Latin ones"""
+    return text.translate(_DIGIT_TABLE)
+
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def normalize_key(text):
+    """
+    Lookup key: normalize_text() without spaces or punctuation, Latin
+    digits and lower case. Cached per distinct raw value.
+    """
+    if not isinstance(text, str):
+        return str(text)
+    return normalize_text(text).translate(_KEY_TABLE).lower()
+
+
+def clusters(text):
+    """
+    Split text into grapheme-like clusters
+
+    A Khmer consonant keeps its vowel signs, diacritics and subscript
+    consonants (COENG + consonant), so edit distance counts "ព្រ" vs "ព"
+    as one edit rather than two or three code points.
+    """
+    result = []
+    attach_next = False
+    for char in text:
+        if result and (attach_next or unicodedata.category(char) in ("Mn", "Mc")):
+            result[-1] += char
+        else:
+            result.append(char)
+        attach_next = char == KHMER_COENG
+    return result
@@ -1,4 +1,7 @@
+import asyncio
 import logging
+import signal
+import time
 from telegram import Update
 from bot.handlers import error_handler, initialize_services
 from telegram.ext import (
@@ -9,7 +12,10 @@ from telegram.ext import (
     ConversationHandler,
 )
 from bot.config import Config
-from bot.database import Database
+from bot.database import get_database
+from bot.notifications import NotificationSender
+from bot.profiling import HandlerProfiler, TimedRequest
+from bot.ratelimit import PriorityRateLimiter
 from logging.handlers import RotatingFileHandler
 import sys
 
@@ -17,6 +23,7 @@ from bot.handlers import (
     start,
     receive_full_name,
     receive_school_name,
+    receive_school_choice,
     receive_class_name,
     receive_computer_usage,
     receive_answer_1,
@@ -32,6 +39,7 @@ from bot.handlers import (
     cancel,
     FULL_NAME,
     SCHOOL_NAME,
+    SCHOOL_CONFIRM,
     CLASS_NAME,
     COMPUTER_USAGE,
     QUESTION_1,
@@ -44,6 +52,7 @@ from bot.handlers import (
     QUESTION_8,
     QUESTION_9,
     QUESTION_10,
+    STATE_NAMES,
 )
 
 # Force UTF-8 encoding for Windows console
@@ -61,88 +70,198 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def main():
-    """Start the bot"""
+def build_conversation_handler():
+    """Build the survey conversation handler with all states"""
+    return ConversationHandler(
+        entry_points=[CommandHandler("start", start)],
+        states={
+            FULL_NAME: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, receive_full_name)
+            ],
+            SCHOOL_NAME: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, receive_school_name)
+            ],
+            SCHOOL_CONFIRM: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, receive_school_choice)
+            ],
+            CLASS_NAME: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, receive_class_name)
+            ],
+            COMPUTER_USAGE: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, receive_computer_usage)
+            ],
+            QUESTION_1: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, receive_answer_1)
+            ],
+            QUESTION_2: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, receive_answer_2)
+            ],
+            QUESTION_3: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, receive_answer_3)
+            ],
+            QUESTION_4: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, receive_answer_4)
+            ],
+            QUESTION_5: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, receive_answer_5)
+            ],
+            QUESTION_6: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, receive_answer_6)
+            ],
+            QUESTION_7: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, receive_answer_7)
+            ],
+            QUESTION_8: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, receive_answer_8)
+            ],
+            QUESTION_9: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, receive_answer_9)
+            ],
+            QUESTION_10: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, receive_answer_10)
+            ],
+        },
+        fallbacks=[CommandHandler("cancel", cancel)],
+    )
+
+
+def build_application():
+    """Create the Telegram application with all handlers registered"""
+    builder = (
+        Application.builder().token(Config.API_TOKEN).base_url(Config.TELEGRAM_BASE_URL)
+    )
+    if Config.PROFILE_HANDLERS:
+        # Record each Bot API call as a span of the handler that made it
+        builder = builder.request(
+            TimedRequest(connection_pool_size=Config.TELEGRAM_POOL_SIZE)
+        )
+    else:
+        builder = builder.connection_pool_size(Config.TELEGRAM_POOL_SIZE)
+    rate_limiter = None
+    if Config.TELEGRAM_RATE_LIMIT:
+        # Every outbound call, including channel notifications, is scheduled
+        rate_limiter = PriorityRateLimiter()
+        builder = builder.rate_limiter(rate_limiter)
+    application = builder.build()
+
+    # Add handlers
+    application.add_handler(build_conversation_handler())
+    application.add_error_handler(error_handler)
+    if rate_limiter is not None:
+        application.add_handler(
+            CommandHandler("ratelimits", rate_limiter.stats_command)
+        )
+
+    # Opt-in handler timing, sampled profiling and slow-handler dumps
+    if Config.PROFILE_HANDLERS:
+        profiler = HandlerProfiler()
+        application.add_handler(CommandHandler("profile", profiler.profile_command))
+        profiler.instrument(application, state_names=STATE_NAMES)
+        profiler.install_signal_handler()
+
+    return application
+
+
+def validate_config():
+    """Validate configuration"""
+    Config.validate()
+    logger.info("Configuration validated successfully")
+
+
+async def warm_up_database():
+    """
+    Open the shared connection pool, check the database answers and has
+    every column the bot writes
+    """
+    database = await asyncio.to_thread(get_database)
+    if not await asyncio.to_thread(database.test_connection):
+        raise RuntimeError("Database connection failed")
+    # Otherwise every survey would fail with "Unknown column" and be spooled
+    missing = await asyncio.to_thread(database.missing_columns)
+    if missing:
+        raise RuntimeError(
+            f"{database.TABLE} is missing columns {', '.join(missing)}; "
+            "run sql/migrations/001_school_canonical.sql"
+        )
+    logger.info("Database connection successful")
+    return database
+
+
+async def gather_or_cancel(*coros):
+    """asyncio.gather(), but if one coroutine fails the others are cancelled"""
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
     try:
-        # Validate configuration
-        Config.validate()
-        logger.info("Configuration validated successfully")
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def install_stop_signals(stop_event):
+    """Set stop_event on SIGINT/SIGTERM/SIGABRT (docker stop sends SIGTERM)"""
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGABRT):
+        try:
+            loop.add_signal_handler(signum, stop_event.set)
+        except NotImplementedError:
+            # Windows: Ctrl+C still raises KeyboardInterrupt
+            break
 
-        # Initialize services
-        initialize_services()
-        logger.info("Services initialized")
 
-        # Test database connection
-        db = Database()
-        if db.test_connection():
-            logger.info("Database connection successful")
-        else:
-            logger.error("Database connection failed")
-            return
-
-        # Create application
-        application = Application.builder().token(Config.API_TOKEN).build()
-
-        # Define conversation handler
-        conv_handler = ConversationHandler(
-            entry_points=[CommandHandler("start", start)],
-            states={
-                FULL_NAME: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, receive_full_name)
-                ],
-                SCHOOL_NAME: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, receive_school_name)
-                ],
-                CLASS_NAME: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, receive_class_name)
-                ],
-                COMPUTER_USAGE: [
-                    MessageHandler(
-                        filters.TEXT & ~filters.COMMAND, receive_computer_usage
-                    )
-                ],
-                QUESTION_1: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, receive_answer_1)
-                ],
-                QUESTION_2: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, receive_answer_2)
-                ],
-                QUESTION_3: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, receive_answer_3)
-                ],
-                QUESTION_4: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, receive_answer_4)
-                ],
-                QUESTION_5: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, receive_answer_5)
-                ],
-                QUESTION_6: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, receive_answer_6)
-                ],
-                QUESTION_7: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, receive_answer_7)
-                ],
-                QUESTION_8: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, receive_answer_8)
-                ],
-                QUESTION_9: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, receive_answer_9)
-                ],
-                QUESTION_10: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, receive_answer_10)
-                ],
-            },
-            fallbacks=[CommandHandler("cancel", cancel)],
+async def run(started):
+    """Start up, poll until a stop signal arrives, then shut down"""
+    # First, so a missing API_TOKEN is reported as such rather than as an
+    # invalid token from the application builder
+    validate_config()
+    application = build_application()
+    outbox = None
+
+    try:
+        # Independent startup steps run concurrently; application.initialize()
+        # performs the get_me call against the Bot API.
+        await gather_or_cancel(warm_up_database(), application.initialize())
+
+        # Channel notifications reuse the application's bot and HTTP pool
+        outbox = initialize_services(
+            database=get_database(),
+            notification_sender=NotificationSender(bot=application.bot),
         )
+        await outbox.start()
+        logger.info("Services initialized")
 
-        # Add handlers
-        application.add_handler(conv_handler)
-        application.add_error_handler(error_handler)
-        # Start bot
-        logger.info("Bot started successfully!")
+        stop_event = asyncio.Event()
+        install_stop_signals(stop_event)
+
+        await application.start()
+        await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+        logger.info(
+            f"Bot started successfully! Time to first poll: "
+            f"{(time.perf_counter() - started) * 1000:.0f} ms"
+        )
         logger.info("Press Ctrl+C to stop")
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
+        await stop_event.wait()
+    finally:
+        # Stop taking updates first, let in-flight handlers finish, then flush
+        # queued saves and notifications while the bot can still send.
+        if application.updater.running:
+            await application.updater.stop()
+        if application.running:
+            await application.stop()
+        if outbox is not None:
+            await outbox.drain()
+        await application.shutdown()
+
+
+def main():
+    """Start the bot"""
+    started = time.perf_counter()
+    try:
+        asyncio.run(run(started))
+    except KeyboardInterrupt:
+        pass
     except Exception as e:
         logger.error(f"Error starting bot: {e}")
         raise
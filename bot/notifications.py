@@ -8,9 +8,15 @@ logger = logging.getLogger(__name__)
 
 
 class NotificationSender:
-    def __init__(self):
-        """Initialize notification sender with bot instance"""
-        self.bot = Bot(token=Config.API_TOKEN)
+    def __init__(self, bot=None):
+        """
+        Initialize notification sender with bot instance
+
+        Args:
+            bot (telegram.Bot): Bot to send with, e.g. the application's bot.
+                A dedicated Bot is created when omitted.
+        """
+        self.bot = bot or Bot(token=Config.API_TOKEN, base_url=Config.TELEGRAM_BASE_URL)
         self.channel_id = Config.CHANNEL_ID
 
     async def send_survey_notification(self, user_data):
@@ -0,0 +1,315 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+from bot.config import Config
+
+logger = logging.getLogger(__name__)
+
+WRITES_SPOOL = "writes.jsonl"
+NOTIFICATIONS_SPOOL = "notifications.jsonl"
+# Rows the database rejects on their own; kept for inspection, never replayed
+DEAD_LETTER_SPOOL = "dead_letters.jsonl"
+
+
+class SurveyOutbox:
+    def __init__(
+        self,
+        database,
+        notifier,
+        batch_size=None,
+        batch_delay_ms=None,
+        spool_dir=None,
+    ):
+        """
+        Write-behind queue for completed surveys and their channel notifications
+
+        Handlers hand completed surveys over with submit() and reply to the
+        teacher straight away. A writer task saves them in batches and queues
+        a channel notification for each saved row. Anything that cannot be
+        delivered (failed batch, or still queued when drain() runs out of
+        time) is appended to a local spool and replayed on the next start.
+        A batch that fails because of its rows rather than the database is
+        retried row by row, and rows that fail alone go to a dead-letter
+        spool, so one bad row does not hold up the others.
+
+        Args:
+            database: Database (or compatible) with save_survey_responses()
+            notifier: NotificationSender (or compatible)
+            batch_size (int): Maximum rows per INSERT
+            batch_delay_ms (int): How long to wait for a batch to fill up
+            spool_dir (str): Directory for undelivered work
+        """
+        self.database = database
+        self.notifier = notifier
+        self.batch_size = batch_size or Config.WRITE_BATCH_SIZE
+        self.batch_delay = (
+            Config.WRITE_BATCH_DELAY_MS if batch_delay_ms is None else batch_delay_ms
+        ) / 1000
+        self.spool_dir = spool_dir or Config.SPOOL_DIR
+
+        self._writes = asyncio.Queue()
+        self._notifications = asyncio.Queue()
+        self._pending_batch = []
+        self._saving = False
+        self._sending = None
+        self._stop_writing = False
+        self._tasks = []
+        self._closing = False
+        self.stats = {
+            "submitted": 0,
+            "saved": 0,
+            "notified": 0,
+            "notify_failed": 0,
+            "spooled_writes": 0,
+            "spooled_notifications": 0,
+            "dead_letters": 0,
+        }
+
+    async def start(self):
+        """Replay any spooled work, then start the writer and notifier tasks"""
+        await self._replay_spool()
+        self._tasks = [
+            asyncio.create_task(self._write_loop(), name="outbox-writer"),
+            asyncio.create_task(self._notify_loop(), name="outbox-notifier"),
+        ]
+
+    async def submit(self, user_data):
+        """Queue a completed survey for saving and notification"""
+        row = dict(user_data)
+        self.stats["submitted"] += 1
+        if self._closing:
+            # Shutdown has started; go straight to durable storage
+            self._spool(WRITES_SPOOL, [row])
+            self.stats["spooled_writes"] += 1
+            return
+        await self._writes.put(row)
+
+    async def _write_loop(self):
+        while not self._stop_writing:
+            batch = self._pending_batch = [await self._writes.get()]
+            deadline = time.monotonic() + self.batch_delay
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._writes.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            self._saving = True
+            try:
+                await self._save(batch)
+            except Exception as e:
+                # Keep the writer alive; whatever is not saved is spooled
+                logger.error(
+                    f"Unexpected error saving {len(batch)} survey responses: {e}"
+                )
+                left = await self._save_rows(batch)
+                if left:
+                    self._spool(WRITES_SPOOL, left)
+                    self.stats["spooled_writes"] += len(left)
+            finally:
+                self._saving = False
+                self._pending_batch = []
+                for _ in batch:
+                    self._writes.task_done()
+
+    async def _save(self, batch):
+        # The MySQL driver blocks, so keep it off the event loop
+        saved = await asyncio.to_thread(self.database.save_survey_responses, batch)
+        if saved:
+            self._saved(batch)
+        else:
+            logger.error(f"Spooling {len(batch)} survey responses after failed save")
+            self._spool(WRITES_SPOOL, batch)
+            self.stats["spooled_writes"] += len(batch)
+
+    def _saved(self, rows):
+        self.stats["saved"] += len(rows)
+        for row in rows:
+            self._notifications.put_nowait(row)
+
+    async def _save_rows(self, batch):
+        """
+        Save a batch that raised one row at a time, moving rows that raise
+        on their own to DEAD_LETTER_SPOOL
+
+        Returns:
+            list: Rows left unsaved because the database failed on the way
+        """
+        for i, row in enumerate(batch):
+            try:
+                saved = await asyncio.to_thread(
+                    self.database.save_survey_responses, [row]
+                )
+            except Exception as e:
+                logger.error(
+                    f"Moving survey response of {row.get('full_name')!r} "
+                    f"to {DEAD_LETTER_SPOOL}: {e}"
+                )
+                self._spool(DEAD_LETTER_SPOOL, [row])
+                self.stats["dead_letters"] += 1
+                continue
+            if not saved:
+                return batch[i:]
+            self._saved([row])
+        return []
+
+    async def _notify_loop(self):
+        while True:
+            row = self._sending = await self._notifications.get()
+            try:
+                if await self.notifier.send_survey_notification(row):
+                    self.stats["notified"] += 1
+                else:
+                    self.stats["notify_failed"] += 1
+            except Exception as e:
+                logger.error(f"Unexpected error sending notification: {e}")
+                self.stats["notify_failed"] += 1
+            # Left set on cancellation so drain() can spool it
+            self._sending = None
+            self._notifications.task_done()
+
+    async def drain(self, timeout=None):
+        """
+        Flush queued writes and notifications, spooling whatever is left
+
+        Call after polling has stopped so no new surveys arrive.
+
+        The timeout covers the queues. A batch already inside the database
+        driver cannot be cancelled without risking it being both saved and
+        spooled, so drain() always waits for that one save to return, which
+        can take longer than the timeout if MySQL hangs.
+
+        Args:
+            timeout (float): Seconds to wait (SHUTDOWN_DRAIN_TIMEOUT by default)
+
+        Returns:
+            dict: Final outbox statistics
+        """
+        timeout = Config.SHUTDOWN_DRAIN_TIMEOUT if timeout is None else timeout
+        self._closing = True
+        started = time.monotonic()
+
+        async def flush():
+            await self._writes.join()
+            await self._notifications.join()
+
+        try:
+            await asyncio.wait_for(flush(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Outbox drain timed out after {timeout:.1f}s")
+
+        # A batch inside the database driver cannot be cancelled safely; let
+        # it finish so its rows end up either saved or spooled.
+        self._stop_writing = True
+        if self._saving:
+            logger.warning("Waiting for the survey batch being saved")
+        while self._saving:
+            await asyncio.sleep(0.05)
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        leftover_writes = self._pending_batch + self._take_all(self._writes)
+        leftover_notifications = self._take_all(self._notifications)
+        if self._sending is not None:
+            # May have reached Telegram already; a duplicate post beats a lost one
+            leftover_notifications.insert(0, self._sending)
+        if leftover_writes:
+            self._spool(WRITES_SPOOL, leftover_writes)
+            self.stats["spooled_writes"] += len(leftover_writes)
+        if leftover_notifications:
+            self._spool(NOTIFICATIONS_SPOOL, leftover_notifications)
+            self.stats["spooled_notifications"] += len(leftover_notifications)
+
+        elapsed = time.monotonic() - started
+        logger.info(f"Outbox drained in {elapsed:.2f}s: {self.stats}")
+        return dict(self.stats)
+
+    @staticmethod
+    def _take_all(queue):
+        items = []
+        while not queue.empty():
+            items.append(queue.get_nowait())
+            queue.task_done()
+        return items
+
+    def _spool(self, name, rows):
+        """Append rows to a spool file and fsync it"""
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = os.path.join(self.spool_dir, name)
+        with open(path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite_spool(self, name, rows):
+        """Atomically replace a spool file with rows"""
+        path = os.path.join(self.spool_dir, name)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+
+    def _read_spool(self, name):
+        path = os.path.join(self.spool_dir, name)
+        if not os.path.exists(path):
+            return path, []
+        rows = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    logger.error(f"Skipping corrupt line in {path}")
+        return path, rows
+
+    async def _replay_spool(self):
+        """Save spooled writes and queue spooled notifications from a past run"""
+        path, rows = self._read_spool(WRITES_SPOOL)
+        if rows:
+            logger.info(f"Replaying {len(rows)} spooled survey responses")
+            for i in range(0, len(rows), self.batch_size):
+                batch = rows[i : i + self.batch_size]
+                try:
+                    saved = await asyncio.to_thread(
+                        self.database.save_survey_responses, batch
+                    )
+                except Exception as e:
+                    # A bad spooled row must neither stop the bot from
+                    # starting nor hold up the rows spooled after it
+                    logger.error(f"Unexpected error replaying spooled responses: {e}")
+                    left = await self._save_rows(batch)
+                else:
+                    if saved:
+                        self._saved(batch)
+                    left = [] if saved else batch
+                if left:
+                    # Keep what was not saved for the next start
+                    self._rewrite_spool(
+                        WRITES_SPOOL, left + rows[i + self.batch_size :]
+                    )
+                    logger.error("Database still failing; spool kept for next start")
+                    break
+            else:
+                os.remove(path)
+
+        path, rows = self._read_spool(NOTIFICATIONS_SPOOL)
+        if rows:
+            logger.info(f"Replaying {len(rows)} spooled notifications")
+            for row in rows:
+                self._notifications.put_nowait(row)
+            # They are back in the queue; drain() spools them again if unsent
+            os.remove(path)
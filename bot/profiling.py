@@ -0,0 +1,226 @@
+import cProfile
+import hashlib
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import signal
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+
+from telegram import Update
+from telegram.ext import ContextTypes, ConversationHandler
+from telegram.request import HTTPXRequest
+
+from bot.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Timings of the awaited calls made by the handler currently running.
+# Each entry is a (label, elapsed_ms) tuple.
+_current_trace = ContextVar("handler_trace", default=None)
+
+# Number of updates profiled when triggered by signal without a count
+DEFAULT_ARM_COUNT = 20
+
+
+@contextmanager
+def span(label):
+    """
+    Time a block of work and attach it to the running handler's trace
+
+    Outside of an instrumented handler this is a no-op apart from the
+    timing itself, so it is safe to leave in place when profiling is off.
+    """
+    trace = _current_trace.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace.append((label, round((time.perf_counter() - start) * 1000, 2)))
+
+
+class TimedRequest(HTTPXRequest):
+    """HTTPXRequest that records every Bot API call as a span"""
+
+    async def do_request(self, url, method, request_data=None, *args, **kwargs):
+        endpoint = url.rsplit("/", 1)[-1]
+        with span(f"telegram.{endpoint}"):
+            return await super().do_request(url, method, request_data, *args, **kwargs)
+
+
+def hash_user_id(user_id):
+    """Return a short keyed hash of a Telegram user ID for log output"""
+    key = (Config.API_TOKEN or "").encode("utf-8")
+    digest = hmac.new(key, str(user_id).encode("utf-8"), hashlib.sha256)
+    return digest.hexdigest()[:12]
+
+
+class HandlerProfiler:
+    def __init__(self, sample_rate=None, slow_ms=None, output_dir=None):
+        """
+        Wrap bot handlers with timing and sampled cProfile capture
+
+        Args:
+            sample_rate (float): Fraction of updates run under the profiler
+            slow_ms (int): Handlers slower than this are dumped to disk
+            output_dir (str): Directory for profile and context dumps
+        """
+        self.sample_rate = (
+            Config.PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+        )
+        self.slow_ms = Config.SLOW_HANDLER_MS if slow_ms is None else slow_ms
+        self.output_dir = output_dir or Config.PROFILE_DIR
+        self._armed = 0
+        self._profiling = False
+        self.stats = {"updates": 0, "profiled": 0, "slow": 0}
+
+    def arm(self, count=DEFAULT_ARM_COUNT):
+        """Force profiling of the next `count` updates"""
+        self._armed = max(0, int(count))
+        logger.info(f"Handler profiling armed for the next {self._armed} updates")
+
+    def instrument(self, application, state_names=None):
+        """
+        Wrap the callback of every handler registered on the application
+
+        Args:
+            application: telegram.ext.Application with handlers added
+            state_names (dict): Optional mapping of conversation state -> label
+        """
+        state_names = state_names or {}
+        count = 0
+        for handlers in application.handlers.values():
+            for handler in handlers:
+                count += self._instrument_handler(handler, None, state_names)
+        logger.info(f"Handler profiling enabled for {count} handlers")
+        return count
+
+    def _instrument_handler(self, handler, state, state_names):
+        if isinstance(handler, ConversationHandler):
+            count = 0
+            for child in handler.entry_points:
+                count += self._instrument_handler(child, "ENTRY", state_names)
+            for key, children in handler.states.items():
+                label = state_names.get(key, str(key))
+                for child in children:
+                    count += self._instrument_handler(child, label, state_names)
+            for child in handler.fallbacks:
+                count += self._instrument_handler(child, "FALLBACK", state_names)
+            return count
+
+        handler.callback = self._wrap(handler.callback, state)
+        return 1
+
+    def _should_profile(self):
+        if self._profiling:
+            # cProfile cannot nest, so only one update is profiled at a time
+            return False
+        if self._armed > 0:
+            self._armed -= 1
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _wrap(self, callback, state):
+        @wraps(callback)
+        async def timed_callback(update, context):
+            self.stats["updates"] += 1
+            trace = []
+            token = _current_trace.set(trace)
+            profile = None
+            if self._should_profile():
+                # Other coroutines that run while this handler awaits are
+                # captured too; the spans show which awaits they overlapped.
+                profile = cProfile.Profile()
+                self._profiling = True
+                self.stats["profiled"] += 1
+                profile.enable()
+
+            start = time.perf_counter()
+            try:
+                return await callback(update, context)
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                if profile is not None:
+                    profile.disable()
+                    self._profiling = False
+                _current_trace.reset(token)
+
+                if elapsed_ms >= self.slow_ms:
+                    self.stats["slow"] += 1
+                    self._dump(callback, state, update, elapsed_ms, trace, profile)
+
+        return timed_callback
+
+    def _dump(self, callback, state, update, elapsed_ms, trace, profile):
+        """Write the context (and profile, if sampled) of a slow handler"""
+        user = getattr(update, "effective_user", None)
+        name = getattr(callback, "__name__", repr(callback))
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        base = os.path.join(self.output_dir, f"{stamp}_{name}")
+
+        context = {
+            "handler": name,
+            "state": state,
+            "update_id": getattr(update, "update_id", None),
+            "user_hash": hash_user_id(user.id) if user else None,
+            "elapsed_ms": round(elapsed_ms, 2),
+            "awaited_ms": round(sum(ms for _, ms in trace), 2),
+            "spans": [{"call": label, "elapsed_ms": ms} for label, ms in trace],
+            "profiled": profile is not None,
+        }
+
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            if profile is not None:
+                profile.dump_stats(f"{base}.prof")
+                summary = io.StringIO()
+                stats = pstats.Stats(profile, stream=summary)
+                stats.sort_stats("cumulative").print_stats(20)
+                context["top_functions"] = summary.getvalue()
+            with open(f"{base}.json", "w", encoding="utf-8") as f:
+                json.dump(context, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            logger.error(f"Failed to write handler profile: {e}")
+
+        logger.warning(
+            f"Slow handler {name} ({state}): {elapsed_ms:.0f} ms, "
+            f"awaited {context['awaited_ms']:.0f} ms in {len(trace)} calls -> {base}"
+        )
+
+    def install_signal_handler(self, signum=None):
+        """Arm profiling when the process receives SIGUSR1 (Unix only)"""
+        signum = signum or getattr(signal, "SIGUSR1", None)
+        if signum is None:
+            logger.info("Signal-triggered profiling is not available on this platform")
+            return
+        signal.signal(signum, lambda *_: self.arm())
+
+    async def profile_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /profile [count] from an admin"""
+        if update.effective_user.id not in Config.ADMIN_USER_IDS:
+            return
+
+        count = DEFAULT_ARM_COUNT
+        if context.args:
+            try:
+                count = int(context.args[0])
+            except ValueError:
+                count = 0
+            if count < 1:
+                await update.message.reply_text("Usage: /profile [count], count >= 1")
+                return
+
+        self.arm(count)
+        await update.message.reply_text(
+            f"Profiling the next {count} updates.\n"
+            f"Seen {self.stats['updates']}, profiled {self.stats['profiled']}, "
+            f"slow {self.stats['slow']} (>{self.slow_ms} ms)."
+        )
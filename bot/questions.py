@@ -1,5 +1,7 @@
 WELCOME_MESSAGE = "សូមស្វាគមន៍មកកាន់ ការស្ទង់មតិ LMS\nសូមបញ្ចូលឈ្មោះពេញរបស់អ្នក៖\n(ឧទាហរណ៍. សុខ សុភា)\n\nសូមវាយពាក្យ /cancel ដើម្បីបោះបង់ការស្ទង់មតិ។"
 ASK_SCHOOL_MESSAGE = "សូមបញ្ចូលឈ្មោះសាលាដែលអ្នកបង្រៀន៖\n(ឧទាហរណ៍. សាលាបឋមសិក្សា វត្តបូព៌)"
+ASK_SCHOOL_CONFIRM_MESSAGE = "តើសាលារបស់អ្នកជាសាលាមួយណា?\nសូមចុចជ្រើសរើសខាងក្រោម ឬវាយឈ្មោះសាលាម្តងទៀត៖"
+KEEP_TYPED_SCHOOL = "✏️ រក្សាទុកឈ្មោះដូចដែលខ្ញុំបានវាយ"
 ASK_CLASS_MESSAGE = "សូមបញ្ចូលកម្រិតថ្នាក់ដែលអ្នកបង្រៀន៖\n(ឧទាហរណ៍. 6 ខ)"
 
 
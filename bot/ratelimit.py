@@ -0,0 +1,257 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+
+from telegram import Update
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter, ContextTypes
+
+from bot.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Lower value goes first when requests compete for the global budget
+PRIORITY_REPLY = 0
+PRIORITY_CHANNEL = 1
+
+# Seconds each priority step is held back. A channel post still overtakes
+# replies queued this much later, so it cannot be starved by busy periods.
+PRIORITY_STEP_SECONDS = 3.0
+
+# Messages a private chat may burst before being held to TELEGRAM_CHAT_RATE
+PRIVATE_CHAT_BURST = 3
+
+# Idle per-chat buckets are dropped once there are more than this many
+MAX_CHAT_BUCKETS = 10_000
+
+# Recent wait samples kept per priority for the percentiles in snapshot()
+WAIT_SAMPLES = 1000
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=1):
+        """
+        Token bucket refilled continuously at `rate` tokens per second
+
+        Args:
+            rate (float): Tokens added per second
+            burst (int): Bucket capacity
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        """Seconds until a token can be taken (0 if one is available now)"""
+        now = time.monotonic()
+        self._refill(now)
+        wait = self.paused_until - now
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return max(wait, 0.0)
+
+    def consume(self):
+        self.tokens -= 1
+
+    def pause(self, seconds):
+        """Hand out no tokens for `seconds`, then restart from empty"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = min(self.tokens, 0.0)
+
+    def is_idle(self):
+        return self.delay() == 0 and self.tokens >= self.burst
+
+
+def is_private_chat(chat_id):
+    """Private chats have positive IDs; groups and channels are negative or @names"""
+    return isinstance(chat_id, int) and chat_id > 0
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    def __init__(
+        self,
+        global_rate=None,
+        chat_rate=None,
+        group_rate_per_minute=None,
+        max_retries=None,
+    ):
+        """
+        Outbound scheduler for every Bot API call made by the application
+
+        Requests that target a chat take a token from that chat's bucket and
+        then from the global bucket. Waiters for the global bucket are served
+        by priority-adjusted deadline, so replies to teachers overtake channel
+        notifications without starving them.
+        On RetryAfter the affected bucket is paused and the call is retried
+        up to `max_retries` times.
+
+        Args:
+            global_rate (float): Messages per second across all chats
+            chat_rate (float): Messages per second to one private chat
+            group_rate_per_minute (float): Messages per minute to one group
+                or channel
+            max_retries (int): RetryAfter retries before the error is raised
+        """
+        self.global_rate = global_rate or Config.TELEGRAM_GLOBAL_RATE
+        self.chat_rate = chat_rate or Config.TELEGRAM_CHAT_RATE
+        self.group_rate = (
+            group_rate_per_minute or Config.TELEGRAM_GROUP_RATE_PER_MINUTE
+        ) / 60
+        self.max_retries = (
+            Config.TELEGRAM_MAX_RETRIES if max_retries is None else max_retries
+        )
+
+        self._global = TokenBucket(self.global_rate)
+        self._chats = {}
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._dispatcher = None
+        self._waits = {
+            PRIORITY_REPLY: deque(maxlen=WAIT_SAMPLES),
+            PRIORITY_CHANNEL: deque(maxlen=WAIT_SAMPLES),
+        }
+        self.stats = {
+            "requests": 0,
+            "throttled": 0,
+            "retry_after": 0,
+            "retried": 0,
+            "gave_up": 0,
+            "max_wait_ms": 0.0,
+        }
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        logger.info(f"Outbound rate limiter: {self.snapshot()}")
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                self._chats = {
+                    key: value
+                    for key, value in self._chats.items()
+                    if not value.is_idle()
+                }
+            if is_private_chat(chat_id):
+                bucket = TokenBucket(self.chat_rate, PRIVATE_CHAT_BURST)
+            else:
+                bucket = TokenBucket(self.group_rate)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _acquire_chat(self, chat_id):
+        bucket = self._chat_bucket(chat_id)
+        # No await between delay() and consume(), so waiters cannot race
+        while (wait := bucket.delay()) > 0:
+            await asyncio.sleep(wait)
+        bucket.consume()
+
+    async def _acquire_global(self, priority):
+        future = asyncio.get_running_loop().create_future()
+        deadline = time.monotonic() + priority * PRIORITY_STEP_SECONDS
+        heapq.heappush(self._waiters, (deadline, next(self._sequence), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+    async def _dispatch(self):
+        """Hand out global tokens to the waiter with the earliest deadline"""
+        while self._waiters:
+            wait = self._global.delay()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                # Caller was cancelled while queued
+                continue
+            self._global.consume()
+            future.set_result(None)
+
+    def _record_wait(self, priority, wait_ms):
+        self._waits[priority].append(wait_ms)
+        if wait_ms >= 1:
+            self.stats["throttled"] += 1
+        self.stats["max_wait_ms"] = max(self.stats["max_wait_ms"], round(wait_ms, 1))
+
+    async def process_request(
+        self, callback, args, kwargs, endpoint, data, rate_limit_args
+    ):
+        chat_id = data.get("chat_id")
+        if isinstance(rate_limit_args, dict) and "priority" in rate_limit_args:
+            priority = rate_limit_args["priority"]
+        elif is_private_chat(chat_id):
+            priority = PRIORITY_REPLY
+        else:
+            priority = PRIORITY_CHANNEL
+
+        retries = 0
+        while True:
+            if chat_id is not None:
+                self.stats["requests"] += 1
+                start = time.perf_counter()
+                await self._acquire_chat(chat_id)
+                await self._acquire_global(priority)
+                self._record_wait(
+                    PRIORITY_REPLY if priority <= PRIORITY_REPLY else PRIORITY_CHANNEL,
+                    (time.perf_counter() - start) * 1000,
+                )
+
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self.stats["retry_after"] += 1
+                if retries >= self.max_retries:
+                    self.stats["gave_up"] += 1
+                    raise
+                retries += 1
+                self.stats["retried"] += 1
+                seconds = float(e.retry_after)
+                logger.warning(
+                    f"{endpoint} to {chat_id} hit flood control, "
+                    f"retrying in {seconds:.0f}s ({retries}/{self.max_retries})"
+                )
+                if chat_id is None:
+                    await asyncio.sleep(seconds)
+                elif is_private_chat(chat_id):
+                    # Flood control on private chats applies to the whole bot
+                    self._global.pause(seconds)
+                else:
+                    self._chat_bucket(chat_id).pause(seconds)
+
+    def snapshot(self):
+        """Counters plus recent wait percentiles by priority"""
+        result = dict(self.stats)
+        result["queued"] = len(self._waiters)
+        for priority, label in (
+            (PRIORITY_REPLY, "reply"),
+            (PRIORITY_CHANNEL, "channel"),
+        ):
+            samples = sorted(self._waits[priority])
+            if samples:
+                result[f"{label}_wait_ms"] = {
+                    "p50": round(samples[len(samples) // 2], 1),
+                    "p95": round(samples[int(len(samples) * 0.95)], 1),
+                }
+        return result
+
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /ratelimits from an admin"""
+        if update.effective_user.id not in Config.ADMIN_USER_IDS:
+            return
+
+        lines = [f"{key}: {value}" for key, value in self.snapshot().items()]
+        await update.message.reply_text("\n".join(lines))
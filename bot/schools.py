@@ -0,0 +1,460 @@
+"""
+Canonical school names and resolution of the names teachers type
+
+Shared by the bot, which stores the resolved school with every response,
+and the dashboard, which only re-resolves rows that were unresolved at
+ingestion time.
+
+Usage (re-resolve stored rows after the alias table changes):
+    python -m bot.schools backfill
+    python -m bot.schools backfill --all
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Dict  # Python 3.8 compatibility
+
+from bot import khmer
+from bot.config import Config
+from bot.khmer import clusters
+from bot.textindex import NgramIndex, edit_distance
+
+logger = logging.getLogger(__name__)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  SCHOOL NAME NORMALISATION ENGINE
+#  ─────────────────────────────────────────────────────────────────────────
+#  3-layer strategy:
+#   1. Hard alias table  (built from every variant in your real SQL dump)
+#   2. Khmer-aware keys (bot/khmer.py: ZWSP, spacing, digits, cluster order)
+#   3. "🏫 School Mapping" UI tab to add new aliases at runtime
+# ══════════════════════════════════════════════════════════════════════════════
+
+ALIAS_FILE = Config.SCHOOL_ALIAS_FILE
+
+# ─── canonical school names ───────────────────────────────────────────────────
+C = {
+    "chatumuk": "អនុវិទ្យាល័យចតុមុខ",
+    "aranh": "អនុវិទ្យាល័យអរញ្ញរង្សី",
+    "preakleab": "វិទ្យាល័យព្រែកលៀប",
+    "preakdambang": "អនុវិទ្យាល័យព្រែកដំបង",
+    "preahangdong": "វិទ្យាល័យព្រះអង្គឌួង",
+    "ksachsa": "វិទ្យាល័យខ្សាច់ស",
+    "sokhan_khvav": "វិទ្យាល័យសុខអានខ្វាវ",
+    "sokhan_tonlap": "វិទ្យាល័យសុខអានទន្លាប់",
+    "sokhan_tramknar": "វិទ្យាល័យសុខអានត្រាំខ្នារ",
+    "sokhan_preysandaek": "វិទ្យាល័យសុខអានព្រៃសណ្តែក",
+    "sokhan_doungkhpos": "វិទ្យាល័យសុខអានដូងខ្ពស់បូរីជលសារ",
+    "hunsaen_sereipheap": "វិទ្យាល័យហ៊ុនសែនសេរីភាព",
+    "hunsaen_1mithuna": "វិទ្យាល័យហ៊ុនសែន១មិថុនា",
+    "bunrany": "វិទ្យាល័យបុណ្យរ៉ានីហ៊ុនសែនភ្នំជីសូរ",
+    "haspveam": "វិទ្យាល័យហស ពាមជីកង",
+    "lve": "អនុវិទ្យាល័យល្វេ",
+}
+
+# ─── alias table: every raw variant → canonical ───────────────────────────────
+# ALL variants found in your live SQL dump are included.
+SCHOOL_ALIASES_BUILTIN: Dict[str, str] = {
+    # ══ អនុវិទ្យាល័យចតុមុខ ══════════════════════════════════════════════════
+    "ឣនុវិទ្យាល័យចតុមុខ": C["chatumuk"],  # ឣ vs អ
+    "អនុវិទ្យាល័យចតុមុខ": C["chatumuk"],
+    "អនុវិទ្យាល័យ ចតុមុខ": C["chatumuk"],
+    "អនុ. ចតុមុខ": C["chatumuk"],
+    "អនុ.ចតុមុខ": C["chatumuk"],
+    "អនុ ចតុមុខ": C["chatumuk"],
+    "អនុចតុមុខ": C["chatumuk"],
+    "អនុវ.ចតុមុខ": C["chatumuk"],
+    "អនុវិ.ចតុមុខ": C["chatumuk"],
+    "អនុវិទ្យាលយ័ចតុមុខ": C["chatumuk"],  # លយ័ typo
+    "អនុវិឡាល័យចតុមុខ": C["chatumuk"],  # វិឡ typo
+    "សាលា អនុវិទ្យាល័យ ចតុមុខ": C["chatumuk"],
+    "សាលាអនុវិទ្យាល័យ ចតុមុខ": C["chatumuk"],
+    "អនុវិទ្យាល័យ​ចតុមុខ": C["chatumuk"],  # ZWSP after ល័យ
+    "អនុវិទ្យាល័យ​ចតុមុខ​": C["chatumuk"],  # trailing ZWSP too
+    # ══ អនុវិទ្យាល័យអរញ្ញរង្សី ══════════════════════════════════════════════
+    "អនុវិទ្យាល័យអរញ្ញរង្សី": C["aranh"],
+    "អនុវិទ្យាល័យ អរញ្ញរង្សី": C["aranh"],
+    "អនុវិទ្យាល៏យអរញ្ញរង្សី": C["aranh"],  # ល៏ typo
+    "សាលាអនុវិទ្យាល័យអរញ្ញរង្សី": C["aranh"],
+    "សាលាអនុវិទ្យាល័យអរញ្ញរង្ស៊ី": C["aranh"],  # ស៊ី variant
+    "ARS": C["aranh"],  # abbreviation in DB
+    # ══ វិទ្យាល័យព្រះអង្គឌួង ════════════════════════════════════════════════
+    "វិទ្យាល័យព្រះអង្គឌួង": C["preahangdong"],
+    "វិ.ព្រះអង្គឌួង": C["preahangdong"],
+    "វិទ្យាល័យ ព្រះអង្គឌួង": C["preahangdong"],
+    "វិទ្យាល័យព្រះ អង្គ ឌួង": C["preahangdong"],
+    "វិទ្យាល័យព្រះ អង្គឌួង": C["preahangdong"],
+    "វិទ្យាល័យព្រះអង្គឌូង": C["preahangdong"],  # ឌូ typo
+    "វិទ្យាល័យព្រះអង្គឌួង(NGS)": C["preahangdong"],
+    "វិទ្យាល័យព្រះអង្គឌួងកម្មវិធីជំនាន់ថ្មី": C["preahangdong"],
+    "សាលារៀនជំនាន់ថ្មីព្រះអង្គឌួង": C["preahangdong"],
+    "សាលាវិទ្យាល័យព្រះអង្គឌួង": C["preahangdong"],
+    # ══ វិទ្យាល័យព្រែកលៀប ════════════════════════════════════════════════════
+    "វិទ្យាល័យព្រែកលៀប": C["preakleab"],
+    "វិទ្យាល័យ ព្រែកលៀប": C["preakleab"],
+    "កម្មវិធីសាលារៀនជំនាន់ថ្មី វិទ្យាល័យ ព្រែកលៀប": C["preakleab"],
+    "វិទ្យាល័យ​ជំនាន់ថ្មី​ព្រែកលៀប​": C["preakleab"],  # ZWSP chars
+    # ══ អនុវិទ្យាល័យព្រែកដំបង ════════════════════════════════════════════════
+    "អនុវិទ្យាល័យព្រែកដំបង": C["preakdambang"],
+    "អនុវិទ្យាល័យ ព្រែកដំបង": C["preakdambang"],
+    "សាលាអនុវិទ្យាល័យព្រែកដំបង": C["preakdambang"],
+    "សាលាអនុវិទ្យាល័យ ព្រែកដំបង": C["preakdambang"],
+    "អនុ.ព្រែកដំបង": C["preakdambang"],
+    "អនុព្រែកដំបង": C["preakdambang"],
+    "អនុព្រែកថំបង": C["preakdambang"],  # ថំ typo
+    "អនុទ្យាល័យព្រែកដំបង": C["preakdambang"],  # missing វិ
+    "អនុវិទ្យាលយ័ ព្រែកដំបង": C["preakdambang"],  # លយ័ typo
+    "ឣនុវិទ្យាល័យព្រេកដំបង": C["preakdambang"],  # ព្រេ typo + ឣ
+    # ══ វិទ្យាល័យខ្សាច់ស ═════════════════════════════════════════════════════
+    "វិទ្យាល័យខ្សាច់ស": C["ksachsa"],
+    "វិ.ខ្សាច់ស": C["ksachsa"],
+    "វិទ្យាល័យ ខ្សាច់ស": C["ksachsa"],
+    "វិទ្យាល័យ​ខ្សាច់ស": C["ksachsa"],  # ZWSP
+    "វិទ្យាល័យ​ខ្សាច់​ស​": C["ksachsa"],  # multiple ZWSP
+    "វិទ្យាល័យខ្សាច់ស​": C["ksachsa"],  # trailing ZWSP
+    "សាលាវិទ្យាល័យខ្សាច់ស": C["ksachsa"],
+    # ══ វិទ្យាល័យសុខអានខ្វាវ ════════════════════════════════════════════════
+    "វិទ្យាល័យសុខអានខ្វាវ": C["sokhan_khvav"],
+    "វិទ្យាល័យ សុខ អាន ខ្វាវ": C["sokhan_khvav"],
+    "វិទ្យាល័យ សុខអាន ខ្វាវ": C["sokhan_khvav"],
+    "វិទ្យាល័យ សុខអានខ្វាវ": C["sokhan_khvav"],
+    "វិទ្យាល័យសុខអាន ខ្វាវ": C["sokhan_khvav"],
+    "វិទ្យាល័យសុខ អានខ្វាវ": C["sokhan_khvav"],
+    "វិទ្យាល័យ​សុខអានខ្វាវ": C["sokhan_khvav"],  # ZWSP
+    "វិទ្យាល័យសុខអានខ្វា": C["sokhan_khvav"],  # missing វ
+    # ══ វិទ្យាល័យសុខអានទន្លាប់ ══════════════════════════════════════════════
+    "វិទ្យាល័យសុខអានទន្លាប់": C["sokhan_tonlap"],
+    "វិទ្យាល័យ សុខ អាន ទន្លាប់": C["sokhan_tonlap"],
+    "វិទ្យាល័យ សុខអានទន្លាប់": C["sokhan_tonlap"],
+    "វិទ្យាល័យ សុខអាន ទន្លាប់": C["sokhan_tonlap"],
+    # ══ វិទ្យាល័យសុខអានត្រាំខ្នារ ═══════════════════════════════════════════
+    "វិទ្យាល័យសុខអានត្រាំខ្នារ": C["sokhan_tramknar"],
+    "វិទ្យាល័យ សុខអានត្រាំខ្នារ": C["sokhan_tramknar"],
+    "វិទ្យាល័យសុខ អានត្រាំខ្នារ": C["sokhan_tramknar"],
+    "វិទ្យាលយ័សុខអានត្រាំខ្នារ": C["sokhan_tramknar"],  # លយ័ typo
+    # ══ វិទ្យាល័យហ៊ុនសែនសេរីភាព ════════════════════════════════════════════
+    "វិទ្យាល័យហ៊ុនសែនសេរីភាព": C["hunsaen_sereipheap"],
+    "វិទ្យាល័យ ហ៊ុន សែន សេរីភាព": C["hunsaen_sereipheap"],
+    "វិទ្យាល័យ ហ៊ុនសែនសេរីភាព": C["hunsaen_sereipheap"],
+    "វិទ្យាល័យហ៊ុន សែនសេរីភាព": C["hunsaen_sereipheap"],
+    "វិទ្យាលយ័ហ៊ុនសែនសេរីភាព": C["hunsaen_sereipheap"],  # លយ័ typo
+    "វិទ្យាល័យ​ហ៊ុន​សែន​សេរីភាព​": C["hunsaen_sereipheap"],  # ZWSP
+    "សាលាវិទ្យាល័យ​ ហ៊ុនសែន​ សេរីភាព​": C["hunsaen_sereipheap"],
+    # ══ Single-entry schools ══════════════════════════════════════════════════
+    "វិទ្យាល័យហ៊ុនសែន១មិថុនា": C["hunsaen_1mithuna"],
+    "វិទ្យាល័យប៑ុនរ៉ានីហ៑ុនសែនភ្នំជីសូរ": C["bunrany"],
+    "វិទ្យាល័យ​ ហស​ ពាមជីកង": C["haspveam"],
+    "វិទ្យាល័យ សុខ អានព្រៃសណ្តែក": C["sokhan_preysandaek"],
+    "វិទ្យាល័យ សុខ អាន ដូងខ្ពស់បូរីជលសារ": C["sokhan_doungkhpos"],
+    "អនុវិទ្យាល័យល្វេ": C["lve"],
+}
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Normalisation helpers
+# ──────────────────────────────────────────────────────────────────────────────
+# Abbreviated school-type prefixes, expanded before the lookup key is built
+_PREFIX_ABBREVIATIONS = [
+    (re.compile(r"^(?:អនុវិ|អនុវ|អនុ)\.\s*"), "អនុវិទ្យាល័យ"),
+    (re.compile(r"^វិ\.\s*"), "វិទ្យាល័យ"),
+]
+
+
+@lru_cache(maxsize=khmer.KEY_CACHE_SIZE)
+def normalize_key(text: str) -> str:
+    """
+    Lookup key: khmer.normalize_key() after expanding "វិ." / "អនុ." style
+    prefixes, so "វិ.ខ្សាច់ស" and "វិទ្យាល័យ ខ្សាច់ស" share one key.
+    """
+    if not isinstance(text, str):
+        return str(text)
+    text = khmer.normalize_text(text)
+    for pattern, expansion in _PREFIX_ABBREVIATIONS:
+        text = pattern.sub(expansion, text)
+    return khmer.normalize_key(text)
+
+
+def load_custom_aliases() -> dict:
+    if os.path.exists(ALIAS_FILE):
+        try:
+            with open(ALIAS_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+    return {}
+
+
+def save_custom_aliases(aliases: dict):
+    with open(ALIAS_FILE, "w", encoding="utf-8") as f:
+        json.dump(aliases, f, ensure_ascii=False, indent=2)
+
+
+def add_custom_aliases(aliases: dict):
+    """Merge new raw -> canonical aliases into the custom alias file"""
+    merged = load_custom_aliases()
+    merged.update(aliases)
+    save_custom_aliases(merged)
+
+
+def get_all_aliases() -> dict:
+    merged = dict(SCHOOL_ALIASES_BUILTIN)
+    merged.update(load_custom_aliases())
+    return merged
+
+
+def build_fast_lookup(alias_map: dict) -> dict:
+    return {normalize_key(k): v for k, v in alias_map.items()}
+
+
+def resolve_school(raw: str, fast_lookup: dict, alias_map: dict) -> str:
+    if not isinstance(raw, str):
+        return str(raw)
+    # 1. exact match (fastest)
+    if raw in alias_map:
+        return alias_map[raw]
+    # 2. normalised key match (spacing, ZWSP, digits, cluster order...)
+    key = normalize_key(raw)
+    if key in fast_lookup:
+        return fast_lookup[key]
+    # 3. fallback: at least strip invisible chars & tidy whitespace
+    return khmer.normalize_text(raw)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Resolver shared by the bot and the dashboard
+# ──────────────────────────────────────────────────────────────────────────────
+# Stable ID of each canonical school, e.g. "វិទ្យាល័យព្រែកលៀប" -> "preakleab"
+SCHOOL_IDS = {name: school_id for school_id, name in C.items()}
+
+# Lowest NgramIndex score offered to a teacher as "did you mean"
+SUGGESTION_MIN_SCORE = 0.4
+
+# Alias suggestions for the dashboard: index candidates re-ranked by
+# edit distance over Khmer clusters
+ALIAS_CANDIDATES = 5
+ALIAS_MIN_NGRAM_SCORE = 0.3
+
+# Suggestions at or above this score are pre-selected for bulk accept
+ALIAS_ACCEPT_SCORE = 0.75
+
+_shared_resolver = None
+_shared_lock = threading.Lock()
+
+
+class SchoolResolver:
+    def __init__(self, alias_file=None):
+        """
+        Resolve raw school names to (school_id, canonical name)
+
+        The alias table is rebuilt only when the custom alias file changes,
+        so the dashboard's School Mapping tab takes effect without a restart.
+
+        Args:
+            alias_file (str): Custom alias JSON (SCHOOL_ALIAS_FILE by default)
+        """
+        self.alias_file = alias_file or ALIAS_FILE
+        self._mtime = None
+        self._lock = threading.Lock()
+        self.alias_map = {}
+        self.fast_lookup = {}
+        self.known = set()
+        self.index = None
+        self._spellings = {}
+        self._canonical = {}
+
+    def _file_mtime(self):
+        try:
+            return os.path.getmtime(self.alias_file)
+        except OSError:
+            return None
+
+    def _refresh(self):
+        mtime = self._file_mtime()
+        if self.alias_map and mtime == self._mtime:
+            return
+        with self._lock:
+            alias_map = dict(SCHOOL_ALIASES_BUILTIN)
+            if mtime is not None:
+                try:
+                    with open(self.alias_file, "r", encoding="utf-8") as f:
+                        alias_map.update(json.load(f))
+                except (OSError, ValueError) as e:
+                    logger.error(f"Failed to load {self.alias_file}: {e}")
+            # Canonical names resolve to themselves
+            for name in C.values():
+                alias_map.setdefault(name, name)
+            index = NgramIndex(key=normalize_key)
+            for name, canonical in alias_map.items():
+                index.add(name, canonical)
+            self.fast_lookup = build_fast_lookup(alias_map)
+            self.known = set(alias_map.values())
+            self.index = index
+            self._spellings = {
+                name: clusters(normalize_key(name)) for name in alias_map
+            }
+            self._canonical = {}
+            self.alias_map = alias_map
+            self._mtime = mtime
+
+    def canonical(self, raw):
+        """
+        Return the canonical name, or the tidied raw name if unknown.
+        Memoised per raw name until the alias table changes.
+        """
+        self._refresh()
+        canonical = self._canonical.get(raw)
+        if canonical is None:
+            if len(self._canonical) >= khmer.KEY_CACHE_SIZE:
+                self._canonical = {}
+            canonical = resolve_school(raw, self.fast_lookup, self.alias_map)
+            self._canonical[raw] = canonical
+        return canonical
+
+    def resolve(self, raw):
+        """
+        Resolve a raw school name
+
+        Returns:
+            tuple: (school_id, canonical). school_id is None unless the name
+                maps to one of the schools in C.
+        """
+        canonical = self.canonical(raw)
+        return SCHOOL_IDS.get(canonical), canonical
+
+    def suggest(self, raw, limit=3, min_score=SUGGESTION_MIN_SCORE):
+        """
+        Canonical schools whose known spellings look most like `raw`
+
+        Returns:
+            list: (canonical, score) tuples, best first
+        """
+        self._refresh()
+        return self.index.search(raw, limit=limit, min_score=min_score)
+
+    def suggest_alias(self, raw):
+        """
+        Likeliest canonical school for an unresolved raw name
+
+        Candidates from the n-gram index are re-ranked by edit distance to
+        the closest known spelling, counted in Khmer clusters.
+
+        Returns:
+            tuple: (canonical, score, distance), or None if nothing is close
+        """
+        self._refresh()
+        query = clusters(normalize_key(raw))
+        if not query:
+            return None
+        best = None
+        for text, canonical, ngram_score in self.index.search_entries(
+            raw, limit=ALIAS_CANDIDATES, min_score=ALIAS_MIN_NGRAM_SCORE
+        ):
+            if best is not None and (ngram_score + 1) / 2 <= best[1]:
+                # Candidates come best first; even an exact spelling cannot win
+                break
+            spelling = self._spellings[text]
+            longest = max(len(query), len(spelling))
+            # Anything further than a third of the name counts as unrelated
+            distance = edit_distance(query, spelling, max_distance=longest // 3)
+            similarity = max(0.0, 1 - distance / longest)
+            score = round((ngram_score + similarity) / 2, 3)
+            if best is None or score > best[1]:
+                best = (canonical, score, distance)
+        return best
+
+    def is_resolved(self, canonical):
+        """True if `canonical` is a school name from the alias table"""
+        self._refresh()
+        return canonical in self.known
+
+
+def suggest_aliases(raw_names, resolver=None):
+    """
+    Suggest a canonical school for each unresolved raw name
+
+    Names that normalise to the same key share one lookup.
+
+    Args:
+        raw_names (iterable): Distinct raw school names
+        resolver (SchoolResolver): Defaults to the shared resolver
+
+    Returns:
+        dict: raw name -> (canonical, score, distance) for names with a match
+    """
+    resolver = resolver or get_school_resolver()
+    by_key = {}
+    suggestions = {}
+    for raw in raw_names:
+        key = normalize_key(raw)
+        if key not in by_key:
+            by_key[key] = resolver.suggest_alias(raw)
+        if by_key[key] is not None:
+            suggestions[raw] = by_key[key]
+    return suggestions
+
+
+def get_school_resolver():
+    """Return the process-wide SchoolResolver"""
+    global _shared_resolver
+    if _shared_resolver is None:
+        with _shared_lock:
+            if _shared_resolver is None:
+                _shared_resolver = SchoolResolver()
+    return _shared_resolver
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Backfill of stored rows
+# ──────────────────────────────────────────────────────────────────────────────
+def backfill(database, resolver=None, include_resolved=False):
+    """
+    Store school_id/school_canonical for rows saved before they existed
+    or before a matching alias was added
+
+    Args:
+        database: bot.database.Database
+        resolver (SchoolResolver): Defaults to the shared resolver
+        include_resolved (bool): Re-resolve every row, not only unresolved ones
+
+    Returns:
+        int: Number of rows updated
+    """
+    resolver = resolver or get_school_resolver()
+    raw_names = database.get_school_names(unresolved_only=not include_resolved)
+    # Each distinct raw name is resolved once, however many rows share it
+    updates = [(raw,) + resolver.resolve(raw) for raw in raw_names]
+    updated = database.update_school_resolution(updates)
+    logger.info(f"Resolved {len(raw_names)} distinct school names, {updated} rows")
+    return updated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Canonical school resolution")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = commands.add_parser(
+        "backfill", help="store the resolved school on existing rows"
+    )
+    backfill_parser.add_argument(
+        "--all",
+        action="store_true",
+        help="re-resolve every row, e.g. after changing an existing alias",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=logging.INFO,
+    )
+    from bot.database import Database
+
+    backfill(Database(pool_size=1), include_resolved=args.all)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+from collections import Counter
+
+
+class NgramIndex:
+    def __init__(self, n=3, key=None, max_postings_ratio=0.2, probe_grams=6):
+        """
+        Character n-gram index for fuzzy lookup of short names
+
+        Works on code points, so it needs no word segmentation and handles
+        Khmer the same way as Latin text. Grams shared by a large share of
+        the entries (e.g. the ones inside "វិទ្យាល័យ") are skipped when
+        collecting candidates, which keeps a lookup to a handful of short
+        posting lists however many entries there are.
+
+        Args:
+            n (int): Gram length
+            key (callable): Normalises text before it is split into grams
+            max_postings_ratio (float): Grams found in more than this share
+                of entries are not used to collect candidates
+            probe_grams (int): Candidates come from at most this many of the
+                query's rarest grams
+        """
+        self.n = n
+        self.key = key or (lambda text: text)
+        self.max_postings_ratio = max_postings_ratio
+        self.probe_grams = probe_grams
+        self._grams = []
+        self._texts = []
+        self._values = []
+        self._postings = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def grams(self, text):
+        """Set of padded n-grams of the normalised text"""
+        padded = f"^{self.key(text)}$"
+        if len(padded) <= self.n:
+            return {padded}
+        return {padded[i : i + self.n] for i in range(len(padded) - self.n + 1)}
+
+    def add(self, text, value=None):
+        """Index `text`; search() returns `value` (default: text) for it"""
+        doc = len(self._values)
+        grams = frozenset(self.grams(text))
+        self._grams.append(grams)
+        self._texts.append(text)
+        self._values.append(text if value is None else value)
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(doc)
+
+    def _score(self, query, limit, min_score):
+        """(text, value, score) for the likeliest `limit * 20` entries"""
+        query_grams = self.grams(query)
+        if not query_grams or not self._values:
+            return []
+
+        cutoff = max(1, int(len(self._values) * self.max_postings_ratio))
+        postings = sorted(
+            (self._postings[gram] for gram in query_grams if gram in self._postings),
+            key=len,
+        )
+        # The rarest grams are enough to find the entry: a typo only breaks
+        # the n grams around it
+        selective = [
+            docs for docs in postings[: self.probe_grams] if len(docs) <= cutoff
+        ]
+        candidates = Counter()
+        for docs in selective or postings[:1]:
+            candidates.update(docs)
+
+        # The score mixes the Dice coefficient with the share of the query's
+        # grams found in the entry, so a partial name ("ព្រែកលៀប") still
+        # ranks the full school name first
+        scored = []
+        for doc, _ in candidates.most_common(limit * 20):
+            grams = self._grams[doc]
+            overlap = len(query_grams & grams)
+            dice = 2 * overlap / (len(query_grams) + len(grams))
+            score = round((dice + overlap / len(query_grams)) / 2, 3)
+            if score >= min_score:
+                scored.append((self._texts[doc], self._values[doc], score))
+        return scored
+
+    def search_entries(self, query, limit=5, min_score=0.0):
+        """
+        Best matching indexed texts for `query`
+
+        Returns:
+            list: (text, value, score) tuples, best first
+        """
+        scored = self._score(query, limit, min_score)
+        scored.sort(key=lambda entry: entry[2], reverse=True)
+        return scored[:limit]
+
+    def search(self, query, limit=5, min_score=0.0):
+        """
+        Best matching values for `query`, merging entries that share a value
+
+        Returns:
+            list: (value, score) tuples, best first
+        """
+        best = {}
+        for _, value, score in self._score(query, limit, min_score):
+            if score > best.get(value, 0.0):
+                best[value] = score
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:limit]
+
+
+def edit_distance(a, b, max_distance=None):
+    """
+    Levenshtein distance between two sequences
+
+    With max_distance, only the band of cells within max_distance of the
+    diagonal is filled, and max_distance + 1 is returned as soon as the
+    distance is known to exceed it.
+    """
+    # A shared prefix or suffix (e.g. "វិទ្យាល័យ") never adds to the distance
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a = a[start : len(a) - end]
+    b = b[start : len(b) - end]
+
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is None:
+        max_distance = len(a)
+    if len(a) - len(b) > max_distance:
+        return max_distance + 1
+
+    over = max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, item_a in enumerate(a, 1):
+        low = max(1, i - max_distance)
+        high = min(len(b), i + max_distance)
+        current = [over] * (len(b) + 1)
+        if low == 1:
+            current[0] = i
+        for j in range(low, high + 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (item_a != b[j - 1]),
+            )
+        if min(current[low - 1 : high + 1]) > max_distance:
+            return over
+        previous = current
+    return min(previous[-1], over)
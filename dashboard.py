@@ -1,14 +1,41 @@
 import streamlit as st
 import pandas as pd
-from sqlalchemy import create_engine
+import numpy as np
+from sqlalchemy import create_engine, inspect, text
 from dotenv import load_dotenv
 import os
 import plotly.express as px
 from datetime import datetime, timedelta
+import threading
+import io
+import pyarrow.compute as pc
+from collections import OrderedDict
 import time
-import json
-import re
-from typing import Dict  # Python 3.8 compatibility
+from dashboard_queries import (
+    Filters,
+    SurveyQueries,
+    clean_class_name,
+    compact_dtypes,
+    concat_compact,
+    keyset_page,
+    normalize_responses,
+)
+from dashboard_analytics import QUERY_ROW_LIMIT, SnapshotAnalytics
+from dashboard_console import SqlConsole, create_console_engine
+from dashboard_report import write_workbook
+from dashboard_search import SearchIndex
+from dashboard_snapshot import Snapshot
+from bot.schools import (
+    ALIAS_ACCEPT_SCORE,
+    ALIAS_FILE,
+    SCHOOL_ALIASES_BUILTIN,
+    add_custom_aliases,
+    get_all_aliases,
+    get_school_resolver,
+    load_custom_aliases,
+    save_custom_aliases,
+    suggest_aliases,
+)
 
 load_dotenv()
 
@@ -16,206 +43,41 @@ st.set_page_config(page_title="Survey LMS Dashboard", page_icon="📊", layout="
 
 
 # ══════════════════════════════════════════════════════════════════════════════
-#  SCHOOL NAME NORMALISATION ENGINE
+#  SCHOOL NAME NORMALISATION
 #  ─────────────────────────────────────────────────────────────────────────
-#  3-layer strategy:
-#   1. Hard alias table  (built from every variant in your real SQL dump)
-#   2. Zero-width / invisible-char stripping  (handles ZWSP embedded by phones)
-#   3. "🏫 School Mapping" UI tab to add new aliases at runtime
+#  The alias tables and resolver live in bot/schools.py. The bot stores the
+#  resolved school (school_id / school_canonical) with every response, so only
+#  rows that were unresolved at ingestion are resolved again here.
 # ══════════════════════════════════════════════════════════════════════════════
 
-ALIAS_FILE = "school_aliases_custom.json"
-
-# ─── canonical school names ───────────────────────────────────────────────────
-C = {
-    "chatumuk": "អនុវិទ្យាល័យចតុមុខ",
-    "aranh": "អនុវិទ្យាល័យអរញ្ញរង្សី",
-    "preakleab": "វិទ្យាល័យព្រែកលៀប",
-    "preakdambang": "អនុវិទ្យាល័យព្រែកដំបង",
-    "preahangdong": "វិទ្យាល័យព្រះអង្គឌួង",
-    "ksachsa": "វិទ្យាល័យខ្សាច់ស",
-    "sokhan_khvav": "វិទ្យាល័យសុខអានខ្វាវ",
-    "sokhan_tonlap": "វិទ្យាល័យសុខអានទន្លាប់",
-    "sokhan_tramknar": "វិទ្យាល័យសុខអានត្រាំខ្នារ",
-    "sokhan_preysandaek": "វិទ្យាល័យសុខអានព្រៃសណ្តែក",
-    "sokhan_doungkhpos": "វិទ្យាល័យសុខអានដូងខ្ពស់បូរីជលសារ",
-    "hunsaen_sereipheap": "វិទ្យាល័យហ៊ុនសែនសេរីភាព",
-    "hunsaen_1mithuna": "វិទ្យាល័យហ៊ុនសែន១មិថុនា",
-    "bunrany": "វិទ្យាល័យបុណ្យរ៉ានីហ៊ុនសែនភ្នំជីសូរ",
-    "haspveam": "វិទ្យាល័យហស ពាមជីកង",
-    "lve": "អនុវិទ្យាល័យល្វេ",
-}
-
-# ─── alias table: every raw variant → canonical ───────────────────────────────
-# ALL variants found in your live SQL dump are included.
-SCHOOL_ALIASES_BUILTIN: Dict[str, str] = {
-    # ══ អនុវិទ្យាល័យចតុមុខ ══════════════════════════════════════════════════
-    "ឣនុវិទ្យាល័យចតុមុខ": C["chatumuk"],  # ឣ vs អ
-    "អនុវិទ្យាល័យចតុមុខ": C["chatumuk"],
-    "អនុវិទ្យាល័យ ចតុមុខ": C["chatumuk"],
-    "អនុ. ចតុមុខ": C["chatumuk"],
-    "អនុ.ចតុមុខ": C["chatumuk"],
-    "អនុ ចតុមុខ": C["chatumuk"],
-    "អនុចតុមុខ": C["chatumuk"],
-    "អនុវ.ចតុមុខ": C["chatumuk"],
-    "អនុវិ.ចតុមុខ": C["chatumuk"],
-    "អនុវិទ្យាលយ័ចតុមុខ": C["chatumuk"],  # លយ័ typo
-    "អនុវិឡាល័យចតុមុខ": C["chatumuk"],  # វិឡ typo
-    "សាលា អនុវិទ្យាល័យ ចតុមុខ": C["chatumuk"],
-    "សាលាអនុវិទ្យាល័យ ចតុមុខ": C["chatumuk"],
-    "អនុវិទ្យាល័យ​ចតុមុខ": C["chatumuk"],  # ZWSP after ល័យ
-    "អនុវិទ្យាល័យ​ចតុមុខ​": C["chatumuk"],  # trailing ZWSP too
-    # ══ អនុវិទ្យាល័យអរញ្ញរង្សី ══════════════════════════════════════════════
-    "អនុវិទ្យាល័យអរញ្ញរង្សី": C["aranh"],
-    "អនុវិទ្យាល័យ អរញ្ញរង្សី": C["aranh"],
-    "អនុវិទ្យាល៏យអរញ្ញរង្សី": C["aranh"],  # ល៏ typo
-    "សាលាអនុវិទ្យាល័យអរញ្ញរង្សី": C["aranh"],
-    "សាលាអនុវិទ្យាល័យអរញ្ញរង្ស៊ី": C["aranh"],  # ស៊ី variant
-    "ARS": C["aranh"],  # abbreviation in DB
-    # ══ វិទ្យាល័យព្រះអង្គឌួង ════════════════════════════════════════════════
-    "វិទ្យាល័យព្រះអង្គឌួង": C["preahangdong"],
-    "វិ.ព្រះអង្គឌួង": C["preahangdong"],
-    "វិទ្យាល័យ ព្រះអង្គឌួង": C["preahangdong"],
-    "វិទ្យាល័យព្រះ អង្គ ឌួង": C["preahangdong"],
-    "វិទ្យាល័យព្រះ អង្គឌួង": C["preahangdong"],
-    "វិទ្យាល័យព្រះអង្គឌូង": C["preahangdong"],  # ឌូ typo
-    "វិទ្យាល័យព្រះអង្គឌួង(NGS)": C["preahangdong"],
-    "វិទ្យាល័យព្រះអង្គឌួងកម្មវិធីជំនាន់ថ្មី": C["preahangdong"],
-    "សាលារៀនជំនាន់ថ្មីព្រះអង្គឌួង": C["preahangdong"],
-    "សាលាវិទ្យាល័យព្រះអង្គឌួង": C["preahangdong"],
-    # ══ វិទ្យាល័យព្រែកលៀប ════════════════════════════════════════════════════
-    "វិទ្យាល័យព្រែកលៀប": C["preakleab"],
-    "វិទ្យាល័យ ព្រែកលៀប": C["preakleab"],
-    "កម្មវិធីសាលារៀនជំនាន់ថ្មី វិទ្យាល័យ ព្រែកលៀប": C["preakleab"],
-    "វិទ្យាល័យ​ជំនាន់ថ្មី​ព្រែកលៀប​": C["preakleab"],  # ZWSP chars
-    # ══ អនុវិទ្យាល័យព្រែកដំបង ════════════════════════════════════════════════
-    "អនុវិទ្យាល័យព្រែកដំបង": C["preakdambang"],
-    "អនុវិទ្យាល័យ ព្រែកដំបង": C["preakdambang"],
-    "សាលាអនុវិទ្យាល័យព្រែកដំបង": C["preakdambang"],
-    "សាលាអនុវិទ្យាល័យ ព្រែកដំបង": C["preakdambang"],
-    "អនុ.ព្រែកដំបង": C["preakdambang"],
-    "អនុព្រែកដំបង": C["preakdambang"],
-    "អនុព្រែកថំបង": C["preakdambang"],  # ថំ typo
-    "អនុទ្យាល័យព្រែកដំបង": C["preakdambang"],  # missing វិ
-    "អនុវិទ្យាលយ័ ព្រែកដំបង": C["preakdambang"],  # លយ័ typo
-    "ឣនុវិទ្យាល័យព្រេកដំបង": C["preakdambang"],  # ព្រេ typo + ឣ
-    # ══ វិទ្យាល័យខ្សាច់ស ═════════════════════════════════════════════════════
-    "វិទ្យាល័យខ្សាច់ស": C["ksachsa"],
-    "វិ.ខ្សាច់ស": C["ksachsa"],
-    "វិទ្យាល័យ ខ្សាច់ស": C["ksachsa"],
-    "វិទ្យាល័យ​ខ្សាច់ស": C["ksachsa"],  # ZWSP
-    "វិទ្យាល័យ​ខ្សាច់​ស​": C["ksachsa"],  # multiple ZWSP
-    "វិទ្យាល័យខ្សាច់ស​": C["ksachsa"],  # trailing ZWSP
-    "សាលាវិទ្យាល័យខ្សាច់ស": C["ksachsa"],
-    # ══ វិទ្យាល័យសុខអានខ្វាវ ════════════════════════════════════════════════
-    "វិទ្យាល័យសុខអានខ្វាវ": C["sokhan_khvav"],
-    "វិទ្យាល័យ សុខ អាន ខ្វាវ": C["sokhan_khvav"],
-    "វិទ្យាល័យ សុខអាន ខ្វាវ": C["sokhan_khvav"],
-    "វិទ្យាល័យ សុខអានខ្វាវ": C["sokhan_khvav"],
-    "វិទ្យាល័យសុខអាន ខ្វាវ": C["sokhan_khvav"],
-    "វិទ្យាល័យសុខ អានខ្វាវ": C["sokhan_khvav"],
-    "វិទ្យាល័យ​សុខអានខ្វាវ": C["sokhan_khvav"],  # ZWSP
-    "វិទ្យាល័យសុខអានខ្វា": C["sokhan_khvav"],  # missing វ
-    # ══ វិទ្យាល័យសុខអានទន្លាប់ ══════════════════════════════════════════════
-    "វិទ្យាល័យសុខអានទន្លាប់": C["sokhan_tonlap"],
-    "វិទ្យាល័យ សុខ អាន ទន្លាប់": C["sokhan_tonlap"],
-    "វិទ្យាល័យ សុខអានទន្លាប់": C["sokhan_tonlap"],
-    "វិទ្យាល័យ សុខអាន ទន្លាប់": C["sokhan_tonlap"],
-    # ══ វិទ្យាល័យសុខអានត្រាំខ្នារ ═══════════════════════════════════════════
-    "វិទ្យាល័យសុខអានត្រាំខ្នារ": C["sokhan_tramknar"],
-    "វិទ្យាល័យ សុខអានត្រាំខ្នារ": C["sokhan_tramknar"],
-    "វិទ្យាល័យសុខ អានត្រាំខ្នារ": C["sokhan_tramknar"],
-    "វិទ្យាលយ័សុខអានត្រាំខ្នារ": C["sokhan_tramknar"],  # លយ័ typo
-    # ══ វិទ្យាល័យហ៊ុនសែនសេរីភាព ════════════════════════════════════════════
-    "វិទ្យាល័យហ៊ុនសែនសេរីភាព": C["hunsaen_sereipheap"],
-    "វិទ្យាល័យ ហ៊ុន សែន សេរីភាព": C["hunsaen_sereipheap"],
-    "វិទ្យាល័យ ហ៊ុនសែនសេរីភាព": C["hunsaen_sereipheap"],
-    "វិទ្យាល័យហ៊ុន សែនសេរីភាព": C["hunsaen_sereipheap"],
-    "វិទ្យាលយ័ហ៊ុនសែនសេរីភាព": C["hunsaen_sereipheap"],  # លយ័ typo
-    "វិទ្យាល័យ​ហ៊ុន​សែន​សេរីភាព​": C["hunsaen_sereipheap"],  # ZWSP
-    "សាលាវិទ្យាល័យ​ ហ៊ុនសែន​ សេរីភាព​": C["hunsaen_sereipheap"],
-    # ══ Single-entry schools ══════════════════════════════════════════════════
-    "វិទ្យាល័យហ៊ុនសែន១មិថុនា": C["hunsaen_1mithuna"],
-    "វិទ្យាល័យប៑ុនរ៉ានីហ៑ុនសែនភ្នំជីសូរ": C["bunrany"],
-    "វិទ្យាល័យ​ ហស​ ពាមជីកង": C["haspveam"],
-    "វិទ្យាល័យ សុខ អានព្រៃសណ្តែក": C["sokhan_preysandaek"],
-    "វិទ្យាល័យ សុខ អាន ដូងខ្ពស់បូរីជលសារ": C["sokhan_doungkhpos"],
-    "អនុវិទ្យាល័យល្វេ": C["lve"],
-}
-
-
-# ──────────────────────────────────────────────────────────────────────────────
-#  Normalisation helpers
-# ──────────────────────────────────────────────────────────────────────────────
-_INVISIBLE = re.compile(
-    r"[\u200b\u200c\u200d\u00ad\ufeff\u2060\u180e\u2028\u2029]",
-    re.UNICODE,
-)
 
+def apply_normalization(df: pd.DataFrame) -> pd.DataFrame:
+    # The shared resolver reloads the alias table when the alias file changes
+    return normalize_responses(df, get_school_resolver())
 
-def strip_invisible(text: str) -> str:
-    """Remove zero-width and other invisible Unicode characters."""
-    return _INVISIBLE.sub("", text)
+
+def alias_file_version() -> float:
+    """Modification time of the custom alias file (0 if it does not exist)"""
+    try:
+        return os.path.getmtime(ALIAS_FILE)
+    except OSError:
+        return 0.0
 
 
-def normalize_key(text: str) -> str:
+@st.cache_data(show_spinner="Matching unresolved school names…")
+def suggest_school_aliases(raw_names: tuple, alias_version: float) -> pd.DataFrame:
     """
-    Lookup key: strip invisible chars, collapse ALL whitespace to nothing,
-    lower-case. This collapses space variants and ZWSP in one step.
+    Suggested canonical school per unresolved name, best matches first.
+    alias_version only keys the cache, so saved aliases give fresh suggestions.
     """
-    if not isinstance(text, str):
-        return str(text)
-    return re.sub(r"\s+", "", strip_invisible(text)).lower()
-
-
-def load_custom_aliases() -> dict:
-    if os.path.exists(ALIAS_FILE):
-        try:
-            with open(ALIAS_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return {}
-    return {}
-
-
-def save_custom_aliases(aliases: dict):
-    with open(ALIAS_FILE, "w", encoding="utf-8") as f:
-        json.dump(aliases, f, ensure_ascii=False, indent=2)
-
-
-def get_all_aliases() -> dict:
-    merged = dict(SCHOOL_ALIASES_BUILTIN)
-    merged.update(load_custom_aliases())
-    return merged
-
-
-def build_fast_lookup(alias_map: dict) -> dict:
-    return {normalize_key(k): v for k, v in alias_map.items()}
-
-
-def resolve_school(raw: str, fast_lookup: dict, alias_map: dict) -> str:
-    if not isinstance(raw, str):
-        return str(raw)
-    # 1. exact match (fastest)
-    if raw in alias_map:
-        return alias_map[raw]
-    # 2. space / ZWSP stripped match
-    key = normalize_key(raw)
-    if key in fast_lookup:
-        return fast_lookup[key]
-    # 3. fallback: at least strip invisible chars & tidy whitespace
-    return re.sub(r"\s+", " ", strip_invisible(raw).strip())
-
-
-def apply_normalization(df: pd.DataFrame) -> pd.DataFrame:
-    alias_map = get_all_aliases()
-    fast_lookup = build_fast_lookup(alias_map)
-    df = df.copy()
-    df["school_raw"] = df["school_name"]  # keep original for audit
-    df["school_name"] = df["school_name"].apply(
-        lambda x: resolve_school(x, fast_lookup, alias_map)
-    )
-    return df
+    suggestions = suggest_aliases(raw_names, get_school_resolver())
+    rows = [
+        (raw, canonical, score, distance)
+        for raw, (canonical, score, distance) in suggestions.items()
+    ]
+    return pd.DataFrame(
+        rows, columns=["School Name", "Suggested", "Score", "Edits"]
+    ).sort_values("Score", ascending=False)
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -237,32 +99,497 @@ except Exception:
     }
 
 
-def get_connection_string():
+def get_connection_string(user=None, password=None):
     """Return SQLAlchemy connection string for MySQL."""
+    user = user or DB["user"]
+    password = DB["password"] if password is None else password
     return (
-        f"mysql+pymysql://{DB['user']}:{DB['password']}"
+        f"mysql+pymysql://{user}:{password}"
         f"@{DB['host']}:{DB['port']}"
         f"/{DB['database']}?charset=utf8mb4"
     )
 
 
-@st.cache_data(ttl=60)
-def fetch_data():
+# One pool per dashboard process, shared by every session and rerun
+POOL_SIZE = int(os.getenv("DASHBOARD_POOL_SIZE", 5))
+# The "DB Offline" probe result is reused for this long
+HEALTH_CHECK_SECONDS = int(os.getenv("DASHBOARD_HEALTH_CHECK_SECONDS", 30))
+
+# Local Arrow copy of survey_responses (see "Dashboard Snapshot"); set to an
+# empty value to disable it
+SNAPSHOT_DIR = os.getenv("DASHBOARD_SNAPSHOT_DIR", "data/snapshot")
+SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv("DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS", 86400))
+# Serve the snapshot alone, with no MySQL
+OFFLINE = os.getenv("DASHBOARD_OFFLINE", "false").lower() == "true"
+# Custom Queries tab: ad-hoc queries are interrupted after this long
+QUERY_TIMEOUT_SECONDS = float(os.getenv("DASHBOARD_QUERY_TIMEOUT_SECONDS", 10))
+
+
+@st.cache_resource
+def get_snapshot():
+    """Process-wide Snapshot, or None if disabled"""
+    if not SNAPSHOT_DIR:
+        return None
+    return Snapshot(SNAPSHOT_DIR, max_age=SNAPSHOT_MAX_AGE_SECONDS)
+
+
+@st.cache_resource
+def get_engine():
+    """Process-wide SQLAlchemy engine; connections are reused across reruns"""
+    if OFFLINE:
+        snapshot = get_snapshot()
+        if snapshot is None:
+            raise RuntimeError("DASHBOARD_OFFLINE needs DASHBOARD_SNAPSHOT_DIR")
+        return snapshot.to_engine()
+    return create_engine(
+        get_connection_string(),
+        pool_size=POOL_SIZE,
+        max_overflow=POOL_SIZE,
+        pool_timeout=10,
+        pool_pre_ping=True,  # drop connections MySQL closed while idle
+        pool_recycle=3600,
+        connect_args={"connect_timeout": 10},
+    )
+
+
+@st.cache_data(ttl=HEALTH_CHECK_SECONDS, show_spinner=False)
+def check_database():
+    """
+    Cheap MySQL probe. Only success is cached (exceptions never are), so an
+    outage shows up within HEALTH_CHECK_SECONDS and recovery on the next
+    rerun.
+    """
+    with get_engine().connect() as conn:
+        conn.execute(text("SELECT 1"))
+    return True
+
+
+# New rows are polled at most this often; slices are reloaded every
+# DASHBOARD_FULL_RELOAD_SECONDS to pick up edited rows
+REFRESH_SECONDS = int(os.getenv("DASHBOARD_REFRESH_SECONDS", 60))
+FULL_RELOAD_SECONDS = int(os.getenv("DASHBOARD_FULL_RELOAD_SECONDS", 600))
+# Sidebar selections whose rows are kept in memory, least recently used dropped
+MAX_SLICES = int(os.getenv("DASHBOARD_MAX_SLICES", 8))
+
+
+# All Responses table: rows per page offered, and the default
+PAGE_SIZES = [25, 50, 100, 250]
+PAGE_SIZE = int(os.getenv("DASHBOARD_PAGE_SIZE", 50))
+
+# CSV and Excel exports: rows fetched and written per chunk
+EXPORT_CHUNK_ROWS = int(os.getenv("DASHBOARD_EXPORT_CHUNK_ROWS", 20000))
+
+# SQL console: a MySQL user with SELECT only is safest; the session is
+# read-only and bounded either way
+CONSOLE_USER = os.getenv("DASHBOARD_CONSOLE_USER")
+CONSOLE_PASSWORD = os.getenv("DASHBOARD_CONSOLE_PASSWORD")
+CONSOLE_TIMEOUT_MS = int(os.getenv("DASHBOARD_CONSOLE_TIMEOUT_MS", 10000))
+CONSOLE_ROW_LIMIT = int(os.getenv("DASHBOARD_CONSOLE_ROW_LIMIT", 5000))
+
+
+# Loaded for every row of a slice; enough for the row views and the search
+CORE_COLUMNS = [
+    "id",
+    "full_name",
+    "school_name",
+    "school_id",
+    "school_canonical",
+    "class_name",
+    "computer_usage",
+    "created_at",
+]
+# Long Khmer answer strings; the charts aggregate them in SQL and the rows are
+# loaded only for the full table and the export
+ANSWER_COLUMNS = [f"question_{i}" for i in range(1, 10)]
+# Free text and Telegram details, only for the full table and the export
+DETAIL_COLUMNS = ["question_10", "telegram_username", "telegram_user_id"]
+
+
+class ResponseSlice:
+    """Normalised rows matching one sidebar selection, newest first"""
+
+    def __init__(self):
+        self.df = None
+        self.max_id = 0
+        self.lazy = None  # lazily loaded columns, indexed by id
+        self.lazy_max_id = 0
+        self.search = None  # SearchIndex over df, built on the first search
+        self.row_of = None  # pd.Index of df's ids, for mapping search hits
+        self.version = None  # ResponseStore.version() the rows are current for
+        self.alias_version = None
+        self.loaded_at = 0.0
+        # Held while the slice is loaded or updated; ResponseStore.lock only
+        # guards the store's own state, so other selections are not held up
+        self.lock = threading.Lock()
+
+
+class ResponseStore:
+    """
+    Normalised survey responses shared by every dashboard session, one slice
+    per sidebar selection.
+
+    A slice holds only the rows matching its Filters: the selection is
+    compiled into a WHERE clause (SurveyQueries.where), so MySQL uses its
+    indexes and a narrow selection loads a handful of rows. Only CORE_COLUMNS
+    are kept for every row; other columns are fetched by columns() the first
+    time a tab or export asks for them. The MAX_SLICES most recently used
+    slices are kept.
+
+    After the first load a slice only fetches its rows with an id above the
+    highest one it has, and only once version() has seen new rows, so a
+    refresh costs as much as the number of new responses. A slice is reloaded
+    every FULL_RELOAD_SECONDS, when its row count shows deleted rows, and
+    when the alias file changes.
+    """
+
+    def __init__(self, snapshot=None):
+        self.lock = threading.Lock()
+        self.snapshot = snapshot  # serves the unfiltered slice, see _fetch()
+        self.slices = OrderedDict()
+        self.table_columns = []
+        self.core_columns = []
+        self.generation = 0  # bumped by invalidate()
+        self.max_id = 0
+        self.total = 0
+        self.checked_at = None
+
+    def invalidate(self):
+        with self.lock:
+            self.slices.clear()
+            self.table_columns = []
+            self.generation += 1
+
+    def version(self, engine):
+        """
+        Changes whenever results may change: new or deleted rows, the
+        periodic full reload, a Refresh or new aliases. The table is polled
+        at most every REFRESH_SECONDS.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if not self.table_columns:
+                self.table_columns = [
+                    column["name"]
+                    for column in inspect(engine).get_columns("survey_responses")
+                ]
+                self.core_columns = [
+                    column for column in CORE_COLUMNS if column in self.table_columns
+                ]
+                self.checked_at = None
+            if self.checked_at is None or now - self.checked_at >= REFRESH_SECONDS:
+                with engine.connect() as conn:
+                    max_id, total = conn.execute(
+                        text("SELECT MAX(id), COUNT(*) FROM survey_responses")
+                    ).one()
+                self.max_id, self.total = int(max_id or 0), int(total)
+                self.checked_at = now
+            return (
+                self.generation,
+                self.max_id,
+                self.total,
+                int(time.time() // FULL_RELOAD_SECONDS),
+                alias_file_version(),
+            )
+
+    def rows(self, engine, queries: SurveyQueries, filters: Filters) -> pd.DataFrame:
+        """Core columns of the rows matching the filters, newest first"""
+        version = self.version(engine)
+        with self.lock:
+            piece = self._slice(filters)
+        with piece.lock:
+            if (
+                piece.df is None
+                or piece.alias_version != alias_file_version()
+                or time.monotonic() - piece.loaded_at >= FULL_RELOAD_SECONDS
+            ):
+                self._load(engine, queries, filters, piece)
+            elif piece.version != version:
+                self._append_new(engine, queries, filters, piece)
+            piece.version = version
+            if filters.days is not None:
+                # Rows that aged out of a "last N days" window
+                self._set_rows(
+                    piece, piece.df[piece.df["created_at"] >= filters.start()]
+                )
+            return piece.df
+
+    def search(self, engine, queries: SurveyQueries, filters: Filters, text):
+        """
+        Rows of rows(filters) whose name, school or class contains `text`,
+        compared after normalize_key(), in the same order
+        """
+        df = self.rows(engine, queries, filters)
+        with self.lock:
+            piece = self._slice(filters)
+        with piece.lock:
+            if piece.df is not df:
+                # Reloaded by another session in between
+                df = piece.df
+            if piece.search is None:
+                piece.search = SearchIndex()
+                piece.search.add(df)
+            ids = piece.search.search(text)
+            if ids is None:
+                return df
+            if piece.row_of is None:
+                piece.row_of = pd.Index(df["id"])
+            positions = piece.row_of.get_indexer(ids)
+            # Ids no longer in the slice (aged out of the window) are -1
+            return df.iloc[np.sort(positions[positions >= 0])]
+
+    def columns(self, engine, queries: SurveyQueries, filters: Filters, columns):
+        """
+        Non-core columns for every row returned by rows(filters), indexed by
+        id. Columns the table does not have are left out.
+        """
+        self.version(engine)
+        with self.lock:
+            piece = self._slice(filters)
+        with piece.lock:
+            if piece.df is None:
+                self._load(engine, queries, filters, piece)
+            wanted = [c for c in columns if c in self.table_columns]
+            missing = [c for c in wanted if c not in piece.lazy.columns]
+            if missing and piece.lazy_max_id:
+                # New columns for the rows the cached ones already cover
+                fetched = self._fetch_columns(
+                    engine, queries, filters, missing, 0, piece.lazy_max_id
+                )
+                piece.lazy = piece.lazy.join(compact_dtypes(fetched))
+            elif missing:
+                piece.lazy = pd.DataFrame(
+                    columns=[*piece.lazy.columns, *missing],
+                    index=pd.Index([], name="id"),
+                )
+            if piece.lazy_max_id < piece.max_id:
+                newer = compact_dtypes(
+                    self._fetch_columns(
+                        engine,
+                        queries,
+                        filters,
+                        list(piece.lazy.columns),
+                        piece.lazy_max_id,
+                        piece.max_id,
+                    )
+                )
+                piece.lazy = (
+                    concat_compact([newer, piece.lazy]) if len(piece.lazy) else newer
+                )
+                piece.lazy_max_id = piece.max_id
+            return piece.lazy[wanted]
+
+    def _slice(self, filters):
+        piece = self.slices.get(filters)
+        if piece is None:
+            piece = self.slices[filters] = ResponseSlice()
+            while len(self.slices) > MAX_SLICES:
+                self.slices.popitem(last=False)
+        self.slices.move_to_end(filters)
+        return piece
+
+    def _fetch(self, engine, queries, filters):
+        if self.snapshot is None or filters != Filters():
+            return queries.rows(filters, self.core_columns)
+        # Every row: bring the local snapshot up to date (only rows added
+        # since its last update cross the wire) and read it from disk
+        self.snapshot.update(engine)
+        table = self.snapshot.read(self.core_columns).sort_by(
+            [("created_at", "descending"), ("id", "descending")]
+        )
+        return table.to_pandas()
+
+    def _fetch_columns(self, engine, queries, filters, columns, after_id, up_to_id):
+        """`columns` of the slice's rows with after_id < id <= up_to_id, by id"""
+        if self.snapshot is None or filters != Filters():
+            return queries.rows(
+                filters, ["id", *columns], after_id, up_to_id
+            ).set_index("id")
+        self.snapshot.update(engine)
+        table = self.snapshot.read(["id", *columns])
+        ids = table.column("id")
+        table = table.filter(
+            pc.and_(pc.greater(ids, after_id), pc.less_equal(ids, up_to_id))
+        )
+        return table.to_pandas().set_index("id")
+
+    def _set_rows(self, piece, df):
+        if len(df) != len(piece.df):
+            piece.row_of = None
+        piece.df = df
+
+    def _load(self, engine, queries, filters, piece):
+        df = self._fetch(engine, queries, filters)
+        piece.df = apply_normalization(df)
+        piece.search = piece.row_of = None
+        piece.max_id = int(df["id"].max()) if not df.empty else 0
+        piece.lazy = pd.DataFrame(index=pd.Index([], name="id"))
+        piece.lazy_max_id = 0
+        piece.alias_version = alias_file_version()
+        piece.loaded_at = time.monotonic()
+
+    def _append_new(self, engine, queries, filters, piece):
+        new = queries.rows(filters, self.core_columns, after_id=piece.max_id)
+        if not new.empty:
+            # Newest first, like the full load
+            new = apply_normalization(new)
+            piece.df = concat_compact([new, piece.df], ignore_index=True)
+            piece.max_id = int(new["id"].max())
+            piece.row_of = None
+            if piece.search is not None:
+                piece.search.add(new)
+        # One window edge for the trim and the count, or rows crossing it in
+        # between would look like deleted rows
+        pinned = filters.pinned()
+        if filters.days is not None:
+            self._set_rows(piece, piece.df[piece.df["created_at"] >= pinned.start()])
+        if queries.count(pinned) != len(piece.df):
+            # Rows were deleted (or the id sequence was reset)
+            self._load(engine, queries, filters, piece)
+
+
+@st.cache_resource
+def get_response_store() -> ResponseStore:
+    # Offline, the engine is already a copy of the snapshot
+    return ResponseStore(snapshot=None if OFFLINE else get_snapshot())
+
+
+def data_version():
+    """Changes whenever query results may change: new rows, reloads, aliases"""
+    return get_response_store().version(get_engine())
+
+
+@st.cache_resource(max_entries=2)
+def get_queries(version) -> SurveyQueries:
+    migrated = "school_id" in get_response_store().table_columns
+    return SurveyQueries(get_engine(), get_school_resolver(), migrated=migrated)
+
+
+@st.cache_data(ttl=REFRESH_SECONDS, max_entries=500, show_spinner=False)
+def run_query(name, filters: Filters, version, *args):
+    """SurveyQueries.<name>(filters, *args), cached per filter combination"""
+    return getattr(get_queries(version), name)(filters, *args)
+
+
+@st.cache_resource
+def get_analytics():
+    """DuckDB over the snapshot for the Custom Queries tab, or None if disabled"""
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return None
+    return SnapshotAnalytics(
+        snapshot, get_school_resolver(), query_timeout=QUERY_TIMEOUT_SECONDS
+    )
+
+
+@st.cache_data(ttl=REFRESH_SECONDS, max_entries=500, show_spinner=False)
+def run_analytics(name, filters: Filters, version, *args):
+    """
+    SnapshotAnalytics.<name>(filters, *args), cached per query and data
+    version. The snapshot is brought up to date first (not offline).
+    """
+    analytics = get_analytics()
+    analytics.sync(version, None if OFFLINE else get_engine())
+    return getattr(analytics, name)(filters, *args)
+
+
+@st.cache_resource
+def get_console():
+    """SqlConsole on its own read-only pool, separate from the dashboard's"""
+    engine = create_console_engine(
+        get_connection_string(CONSOLE_USER, CONSOLE_PASSWORD),
+        timeout_ms=CONSOLE_TIMEOUT_MS,
+        row_limit=CONSOLE_ROW_LIMIT,
+    )
+    return SqlConsole(engine, CONSOLE_ROW_LIMIT, cache_seconds=REFRESH_SECONDS)
+
+
+def fetch_page(filters: Filters, columns, after, size, ascending):
+    """
+    One normalised page of the All Responses table, read from the database
+    by key (SurveyQueries.page), and whether more rows follow it
+    """
+    version = data_version()
+    available = get_response_store().table_columns
+    wanted = tuple(column for column in columns if column in available)
+    df = run_query("page", filters, version, wanted, after, size + 1, ascending)
+    return apply_normalization(df.head(size)), len(df) > size
+
+
+def export_rows(filters: Filters, ids=None):
+    """
+    Every column of the filters' rows (only `ids`, if given), normalised,
+    streamed from the database EXPORT_CHUNK_ROWS at a time. At least one
+    (possibly empty) chunk is yielded.
+    """
+    queries = get_queries(data_version())
+    store = get_response_store()
+    extra = [
+        column
+        for column in ANSWER_COLUMNS + DETAIL_COLUMNS
+        if column in store.table_columns
+    ]
+    # The raw school name next to the canonical one, as in the table
+    output_columns = [*store.core_columns, "school_raw", *extra]
+    empty = True
+    chunks = queries.iter_rows(
+        filters, store.core_columns + extra, EXPORT_CHUNK_ROWS, ids
+    )
+    for chunk in chunks:
+        empty = False
+        yield apply_normalization(chunk)[output_columns]
+    if empty:
+        yield pd.DataFrame(columns=output_columns)
+
+
+def export_csv(filters: Filters, ids=None):
+    """
+    export_rows() as CSV with a UTF-8 BOM for Excel, written chunk by chunk,
+    so memory holds one chunk plus the file. An in-memory file because
+    st.download_button() only takes bytes, BytesIO or a file opened for
+    reading from a callable, and keeps the bytes in memory anyway.
+    """
+    out = io.BytesIO()
+    writer = io.TextIOWrapper(out, encoding="utf-8-sig", newline="")
+    header = True
+    for chunk in export_rows(filters, ids):
+        chunk.to_csv(writer, index=False, header=header)
+        header = False
+    writer.flush()
+    writer.detach()
+    out.seek(0)
+    return out
+
+
+def export_report(filters: Filters, tables):
+    """
+    Excel workbook: the filters' responses (streamed like export_csv()),
+    then one sheet per table in `tables` (sheet name -> DataFrame), in memory
+    for st.download_button() like export_csv()
+    """
+    out = io.BytesIO()
+    write_workbook(out, {"Responses": export_rows(filters), **tables})
+    out.seek(0)
+    return out
+
+
+def with_columns(df: pd.DataFrame, columns, filters: Filters) -> pd.DataFrame:
+    """df (rows of the filters' slice) plus lazily loaded columns, matched on id"""
+    queries = get_queries(data_version())
+    extra = get_response_store().columns(get_engine(), queries, filters, columns)
+    return df.join(extra, on="id")
+
+
+def fetch_data(filters: Filters, search):
+    """
+    Rows matching the sidebar filters and the search box text; empty frame
+    if MySQL is unreachable. Without a search the table is paged from the
+    database instead (fetch_page()), so the slice is not loaded.
+    """
     max_retries, retry_delay = 3, 2
     for attempt in range(max_retries):
         try:
-            engine = create_engine(
-                get_connection_string(),
-                pool_pre_ping=True,
-                pool_recycle=3600,
-                connect_args={"connect_timeout": 10},
-            )
-            df = pd.read_sql(
-                "SELECT * FROM survey_responses ORDER BY created_at DESC", engine
-            )
-            engine.dispose()
-            df = apply_normalization(df)  # ← normalise immediately after fetch
-            return df
+            queries = get_queries(data_version())
+            return get_response_store().search(get_engine(), queries, filters, search)
         except Exception as e:
             if attempt < max_retries - 1:
                 st.warning(f"Retrying… ({attempt + 1}/{max_retries})")
@@ -270,7 +597,7 @@ def fetch_data():
             else:
                 st.error(f"❌ Failed to connect: {e}")
                 st.info("Check if MySQL is running: `docker ps`")
-                return pd.DataFrame()
+                return pd.DataFrame(columns=CORE_COLUMNS)
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -286,24 +613,21 @@ def main():
     with col1:
         if st.button("🔄 Refresh Data"):
             st.cache_data.clear()
+            get_response_store().invalidate()
+            if OFFLINE:
+                get_engine.clear()  # reload the snapshot files
             st.rerun()
     with col2:
         try:
-            from sqlalchemy import text
-
-            engine = create_engine(
-                get_connection_string(), connect_args={"connect_timeout": 10}
-            )
-            with engine.connect() as conn:
-                conn.execute(text("SELECT 1"))
-            engine.dispose()
+            check_database()
         except Exception as e:
             st.error(f"❌ DB Offline: {e}")
             st.stop()
 
     try:
-        df = fetch_data()
-        if df.empty:
+        version = data_version()
+        comp_no = "ខ. មិនធ្លាប់"
+        if run_query("summary", Filters(), version, comp_no)["total"] == 0:
             st.warning("No survey responses yet.")
             return
 
@@ -311,9 +635,13 @@ def main():
         st.sidebar.header("🔍 Filters")
 
         # School dropdown uses canonical names → no duplicates
-        schools = ["All"] + sorted(df["school_name"].unique().tolist())
+        all_schools = run_query("school_counts", Filters(), version)["school"]
+        schools = ["All"] + sorted(all_schools.dropna().tolist())
         selected_school = st.sidebar.selectbox("School Name", schools)
-        classes = ["All"] + sorted(df["class_name"].unique().tolist())
+        all_classes = run_query("value_counts", Filters(), version, "class_name")
+        classes = ["All"] + sorted(
+            {clean_class_name(raw) for raw in all_classes["value"].dropna()}
+        )
         selected_class = st.sidebar.selectbox("Class", classes)
         computer_options = ["All", "ក. ធ្លាប់", "ខ. មិនធ្លាប់"]
         selected_computer = st.sidebar.selectbox(
@@ -327,68 +655,66 @@ def main():
         )
 
         # ── APPLY FILTERS ─────────────────────────────────────────────────────
-        filtered_df = df.copy()
-        if selected_school != "All":
-            filtered_df = filtered_df[filtered_df["school_name"] == selected_school]
-        if selected_class != "All":
-            filtered_df = filtered_df[filtered_df["class_name"] == selected_class]
-        if selected_computer != "All":
-            filtered_df = filtered_df[
-                filtered_df["computer_usage"] == selected_computer
-            ]
-
+        # Compiled into the WHERE clause of every query; only matching rows
+        # are fetched
+        selection = {
+            "school": None if selected_school == "All" else selected_school,
+            "class_name": None if selected_class == "All" else selected_class,
+            "computer_usage": None if selected_computer == "All" else selected_computer,
+        }
         if date_option == "Last 7 days":
-            filtered_df = filtered_df[
-                filtered_df["created_at"] >= datetime.now() - timedelta(days=7)
-            ]
+            filters = Filters(days=7, **selection)
         elif date_option == "Last 30 days":
-            filtered_df = filtered_df[
-                filtered_df["created_at"] >= datetime.now() - timedelta(days=30)
-            ]
+            filters = Filters(days=30, **selection)
         elif date_option == "Custom range":
             c1, c2 = st.sidebar.columns(2)
             start_date = c1.date_input("From")
             end_date = c2.date_input("To")
-            filtered_df = filtered_df[
-                (filtered_df["created_at"].dt.date >= start_date)
-                & (filtered_df["created_at"].dt.date <= end_date)
-            ]
+            filters = Filters.date_range(start_date, end_date, **selection)
+        else:
+            filters = Filters(**selection)
 
         # ── KEY METRICS ───────────────────────────────────────────────────────
         st.header("📈 Key Metrics")
         m1, m2, m3, m4 = st.columns(4)
+        summary = run_query("summary", filters, version, comp_no)
+        school_counts = run_query("school_counts", filters, version)
         with m1:
-            st.metric("Total Responses", len(filtered_df))
+            st.metric("Total Responses", summary["total"])
         with m2:
-            no_computer = len(filtered_df[filtered_df["computer_usage"] == "ខ. មិនធ្លាប់"])
-            st.metric("No Computer Experience", no_computer)
+            st.metric("No Computer Experience", summary["no_computer"])
         with m3:
-            st.metric("Schools (unique)", filtered_df["school_name"].nunique())
+            st.metric("Schools (unique)", len(school_counts))
         with m4:
-            if not filtered_df.empty:
-                latest = filtered_df["created_at"].max()
+            if summary["latest"] is not None:
+                latest = summary["latest"]
                 hours_ago = int((datetime.now() - latest).total_seconds() / 3600)
                 st.metric("Latest Response", f"{hours_ago}h ago")
 
         st.markdown("---")
 
         # ── TABS ──────────────────────────────────────────────────────────────
-        tab1, tab2, tab3, tab4, tab5 = st.tabs(
+        # Only the open tab runs, so answer columns load when they are needed
+        tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(
             [
                 "📊 Overview",
                 "❓ Questions",
                 "📅 Timeline",
                 "🔍 Custom Queries",
                 "🏫 School Mapping",
-            ]
+                "🧾 SQL Console",
+            ],
+            key="main_tabs",
+            on_change="rerun",
         )
 
         # TAB 1 ───────────────────────────────────────────────────────────────
         with tab1:
             col1, col2 = st.columns(2)
             with col1:
-                sc = filtered_df["school_name"].value_counts().reset_index()
-                sc.columns = ["School", "Responses"]
+                sc = school_counts.rename(
+                    columns={"school": "School", "count": "Responses"}
+                )
                 fig = px.bar(
                     sc,
                     x="School",
@@ -400,7 +726,7 @@ def main():
                 fig.update_layout(xaxis_tickangle=-30)
                 st.plotly_chart(fig, use_container_width=True)
             with col2:
-                cc = filtered_df["computer_usage"].value_counts().reset_index()
+                cc = run_query("value_counts", filters, version, "computer_usage")
                 cc.columns = ["Experience", "Count"]
                 st.plotly_chart(
                     px.pie(
@@ -414,137 +740,141 @@ def main():
 
         # TAB 2 ───────────────────────────────────────────────────────────────
         with tab2:
-            answered = filtered_df[filtered_df["question_1"] != "N/A"].copy()
-            if len(answered) == 0:
-                st.info("No completed responses in current filter.")
-            else:
-                # ── Valid answer choices only (filter out typos/garbage) ──────
-                Q_VALID = {
-                    "question_1": [
-                        "ក. ចុច Start Menu → Microsoft Word",
-                        "ខ. ចុច File -> ជ្រើសរើស New (ថ្មី) -> Blank Document",
-                        "គ. ចុច File -> ជ្រើសរើស Save -> ដាក់ឈ្មោះឯកសារ -> Save",
-                    ],
-                    "question_2": [
-                        "ក. ចុច File -> Save -> ដាក់ឈ្មោះឯកសារ -> Save ឬ Ctrl + S",
-                        "ខ. ចុច Ctrl + S",
-                        "គ. ចុច File → Save As -> ដាក់ឈ្មោះឯកសារ -> Save ឬ Ctrl + S",
-                    ],
-                    "question_3": [
-                        "ក. ចុច File → Print (បោះពុម្ភ)",
-                        "ខ. ចុច File → Open (បើក) -> ជ្រើសរើសឈ្មោះ -> Open",
-                        "គ. Home → Save",
-                    ],
-                    "question_4": [
-                        "ក. វាយអត្ថបទ",
-                        "ខ. គណនា និងវិភាគទិន្នន័យ",
-                        "គ. បង្កើតស្លាយ",
-                    ],
-                    "question_5": [
-                        "ក. = Cell + Cell",
-                        "ខ. = Cell - Cell",
-                        "គ. = Cell + Cell ឬ =Sum(Cell:Cell)",
-                    ],
-                    "question_6": [
-                        "ក. Login user",
-                        "ខ. ចូលមើលវីដេអូមេរៀន",
-                    ],
-                    "question_7": [
-                        "ក. មានតែវីដេអូ",
-                        "ខ. វីដេអូ សង្ខេបមេរៀន និងរង្វាយតម្លៃ",
-                        "គ. វីដេអូ សង្ខេបមេរៀន រង្វាយតម្លៃ និងកិច្ចការផ្ទះ",
-                    ],
-                    "question_8": [
-                        "ក. ចេញពីសៀវភៅពុម្ពរបស់ក្រសួង",
-                        "ខ. សៀវភៅពុម្ព EBC",
-                        "គ. ចេញពីគ្រូល្បីៗ",
-                    ],
-                }
-
-                Q_LABELS = {
-                    "question_1": "Q1: បង្កើតឯកសារថ្មី",
-                    "question_2": "Q2: រក្សាទុកការងារ",
-                    "question_3": "Q3: បើកឯកសារ",
-                    "question_4": "Q4: Excel ប្រើសម្រាប់អ្វី?",
-                    "question_5": "Q5: រូបមន្តបូកលេខ Excel",
-                    "question_6": "Q6: ចូលថ្នាល EBC",
-                    "question_7": "Q7: ប្រភេទខ្លឹមសារ EBC",
-                    "question_8": "Q8: ប្រភព​មេរៀន EBC",
-                }
-
-                CORRECT_LABEL = {
-                    "question_1": "ខ. ចុច File -> ជ្រើសរើស New (ថ្មី) -> Blank Document",
-                    "question_2": "គ. ចុច File → Save As -> ដាក់ឈ្មោះឯកសារ -> Save ឬ Ctrl + S",
-                    "question_3": "ខ. ចុច File → Open (បើក) -> ជ្រើសរើសឈ្មោះ -> Open",
-                    "question_4": "ខ. គណនា និងវិភាគទិន្នន័យ",
-                    "question_5": "គ. = Cell + Cell ឬ =Sum(Cell:Cell)",
-                    "question_6": "ក. Login user",
-                    "question_7": "គ. វីដេអូ សង្ខេបមេរៀន រង្វាយតម្លៃ និងកិច្ចការផ្ទះ",
-                    "question_8": "ក. ចេញពីសៀវភៅពុម្ពរបស់ក្រសួង",
-                }
-
-                # Show 2 questions per row
-                q_keys = list(Q_VALID.keys())
-                for i in range(0, len(q_keys), 2):
-                    cols = st.columns(2)
-                    for j, q in enumerate(q_keys[i : i + 2]):
-                        with cols[j]:
-                            valid_answers = Q_VALID[q]
-                            # Filter to only valid choices
-                            q_data = answered[answered[q].isin(valid_answers)]
-                            counts = (
-                                q_data[q]
-                                .value_counts()
-                                .reindex(valid_answers, fill_value=0)
-                                .reset_index()
-                            )
-                            counts.columns = ["Answer", "Count"]
-                            total_q = counts["Count"].sum()
-                            counts["Percent"] = (
-                                (counts["Count"] / total_q * 100).round(1)
-                                if total_q > 0
-                                else 0
-                            )
-                            counts["Color"] = counts["Answer"].apply(
-                                lambda x: (
-                                    "#4CAF50" if x == CORRECT_LABEL[q] else "#90CAF9"
+            if tab2.open:
+                answer_counts = run_query(
+                    "answer_counts", filters, version, tuple(ANSWER_COLUMNS[:8])
+                )
+                if answer_counts.empty:
+                    st.info("No completed responses in current filter.")
+                else:
+                    # ── Valid answer choices only (filter out typos/garbage) ──────
+                    Q_VALID = {
+                        "question_1": [
+                            "ក. ចុច Start Menu → Microsoft Word",
+                            "ខ. ចុច File -> ជ្រើសរើស New (ថ្មី) -> Blank Document",
+                            "គ. ចុច File -> ជ្រើសរើស Save -> ដាក់ឈ្មោះឯកសារ -> Save",
+                        ],
+                        "question_2": [
+                            "ក. ចុច File -> Save -> ដាក់ឈ្មោះឯកសារ -> Save ឬ Ctrl + S",
+                            "ខ. ចុច Ctrl + S",
+                            "គ. ចុច File → Save As -> ដាក់ឈ្មោះឯកសារ -> Save ឬ Ctrl + S",
+                        ],
+                        "question_3": [
+                            "ក. ចុច File → Print (បោះពុម្ភ)",
+                            "ខ. ចុច File → Open (បើក) -> ជ្រើសរើសឈ្មោះ -> Open",
+                            "គ. Home → Save",
+                        ],
+                        "question_4": [
+                            "ក. វាយអត្ថបទ",
+                            "ខ. គណនា និងវិភាគទិន្នន័យ",
+                            "គ. បង្កើតស្លាយ",
+                        ],
+                        "question_5": [
+                            "ក. = Cell + Cell",
+                            "ខ. = Cell - Cell",
+                            "គ. = Cell + Cell ឬ =Sum(Cell:Cell)",
+                        ],
+                        "question_6": [
+                            "ក. Login user",
+                            "ខ. ចូលមើលវីដេអូមេរៀន",
+                        ],
+                        "question_7": [
+                            "ក. មានតែវីដេអូ",
+                            "ខ. វីដេអូ សង្ខេបមេរៀន និងរង្វាយតម្លៃ",
+                            "គ. វីដេអូ សង្ខេបមេរៀន រង្វាយតម្លៃ និងកិច្ចការផ្ទះ",
+                        ],
+                        "question_8": [
+                            "ក. ចេញពីសៀវភៅពុម្ពរបស់ក្រសួង",
+                            "ខ. សៀវភៅពុម្ព EBC",
+                            "គ. ចេញពីគ្រូល្បីៗ",
+                        ],
+                    }
+
+                    Q_LABELS = {
+                        "question_1": "Q1: បង្កើតឯកសារថ្មី",
+                        "question_2": "Q2: រក្សាទុកការងារ",
+                        "question_3": "Q3: បើកឯកសារ",
+                        "question_4": "Q4: Excel ប្រើសម្រាប់អ្វី?",
+                        "question_5": "Q5: រូបមន្តបូកលេខ Excel",
+                        "question_6": "Q6: ចូលថ្នាល EBC",
+                        "question_7": "Q7: ប្រភេទខ្លឹមសារ EBC",
+                        "question_8": "Q8: ប្រភព​មេរៀន EBC",
+                    }
+
+                    CORRECT_LABEL = {
+                        "question_1": "ខ. ចុច File -> ជ្រើសរើស New (ថ្មី) -> Blank Document",
+                        "question_2": "គ. ចុច File → Save As -> ដាក់ឈ្មោះឯកសារ -> Save ឬ Ctrl + S",
+                        "question_3": "ខ. ចុច File → Open (បើក) -> ជ្រើសរើសឈ្មោះ -> Open",
+                        "question_4": "ខ. គណនា និងវិភាគទិន្នន័យ",
+                        "question_5": "គ. = Cell + Cell ឬ =Sum(Cell:Cell)",
+                        "question_6": "ក. Login user",
+                        "question_7": "គ. វីដេអូ សង្ខេបមេរៀន រង្វាយតម្លៃ និងកិច្ចការផ្ទះ",
+                        "question_8": "ក. ចេញពីសៀវភៅពុម្ពរបស់ក្រសួង",
+                    }
+
+                    # Show 2 questions per row
+                    q_keys = list(Q_VALID.keys())
+                    for i in range(0, len(q_keys), 2):
+                        cols = st.columns(2)
+                        for j, q in enumerate(q_keys[i : i + 2]):
+                            with cols[j]:
+                                valid_answers = Q_VALID[q]
+                                # Filter to only valid choices
+                                q_counts = answer_counts[
+                                    answer_counts["question"] == q
+                                ].set_index("answer")["count"]
+                                counts = q_counts.reindex(
+                                    valid_answers, fill_value=0
+                                ).reset_index()
+                                counts.columns = ["Answer", "Count"]
+                                total_q = counts["Count"].sum()
+                                counts["Percent"] = (
+                                    (counts["Count"] / total_q * 100).round(1)
+                                    if total_q > 0
+                                    else 0
                                 )
-                            )
-                            counts["Label"] = counts["Answer"].str[
-                                :40
-                            ]  # shorten for axis
-
-                            fig = px.bar(
-                                counts,
-                                x="Label",
-                                y="Count",
-                                title=Q_LABELS[q],
-                                text=counts["Percent"].astype(str) + "%",
-                                color="Answer",
-                                color_discrete_map={
-                                    row["Answer"]: (
+                                counts["Color"] = counts["Answer"].apply(
+                                    lambda x: (
                                         "#4CAF50"
-                                        if row["Answer"] == CORRECT_LABEL[q]
+                                        if x == CORRECT_LABEL[q]
                                         else "#90CAF9"
                                     )
-                                    for _, row in counts.iterrows()
-                                },
-                            )
-                            fig.update_traces(textposition="outside", showlegend=False)
-                            fig.update_layout(
-                                xaxis_title="",
-                                yaxis_title="Count",
-                                showlegend=False,
-                                margin=dict(t=50, b=10),
-                            )
-                            st.plotly_chart(fig, use_container_width=True)
-                            st.caption(f"✅ Correct: **{CORRECT_LABEL[q]}**")
+                                )
+                                counts["Label"] = counts["Answer"].str[
+                                    :40
+                                ]  # shorten for axis
+
+                                fig = px.bar(
+                                    counts,
+                                    x="Label",
+                                    y="Count",
+                                    title=Q_LABELS[q],
+                                    text=counts["Percent"].astype(str) + "%",
+                                    color="Answer",
+                                    color_discrete_map={
+                                        row["Answer"]: (
+                                            "#4CAF50"
+                                            if row["Answer"] == CORRECT_LABEL[q]
+                                            else "#90CAF9"
+                                        )
+                                        for _, row in counts.iterrows()
+                                    },
+                                )
+                                fig.update_traces(
+                                    textposition="outside", showlegend=False
+                                )
+                                fig.update_layout(
+                                    xaxis_title="",
+                                    yaxis_title="Count",
+                                    showlegend=False,
+                                    margin=dict(t=50, b=10),
+                                )
+                                st.plotly_chart(fig, use_container_width=True)
+                                st.caption(f"✅ Correct: **{CORRECT_LABEL[q]}**")
 
         # TAB 3 ───────────────────────────────────────────────────────────────
         with tab3:
-            tl = filtered_df.copy()
-            tl["date"] = tl["created_at"].dt.date
-            daily = tl.groupby("date").size().reset_index()
+            daily = run_query("daily_counts", filters, version)
             daily.columns = ["Date", "Responses"]
             st.plotly_chart(
                 px.line(
@@ -559,304 +889,392 @@ def main():
 
         # TAB 4 ───────────────────────────────────────────────────────────────
         with tab4:
-            # ── 1. School vs Computer Usage ───────────────────────────────────
-            st.subheader("🏫 School vs Computer Usage")
-
-            # Build clean cross-tab: only ក. ធ្លាប់ and ខ. មិនធ្លាប់ columns
-            comp_yes = "ក. ធ្លាប់"
-            comp_no = "ខ. មិនធ្លាប់"
-
-            def school_computer_table(df_in):
-                grp = (
-                    df_in.groupby("school_name")["computer_usage"]
-                    .value_counts()
-                    .unstack(fill_value=0)
+            if tab4.open and get_analytics() is None:
+                st.info(
+                    "Custom Queries run on the local snapshot; "
+                    "set DASHBOARD_SNAPSHOT_DIR to enable them."
                 )
-                for col in [comp_yes, comp_no]:
-                    if col not in grp.columns:
-                        grp[col] = 0
-                grp = grp[[comp_yes, comp_no]].copy()
-                grp.index.name = "School Name"
-                grp["Total"] = grp[comp_yes] + grp[comp_no]
-                grp["% ធ្លាប់"] = (grp[comp_yes] / grp["Total"] * 100).round(1).astype(
-                    str
-                ) + "%"
-                grp["% មិនធ្លាប់"] = (grp[comp_no] / grp["Total"] * 100).round(1).astype(
-                    str
-                ) + "%"
-                grp = grp.reset_index()
-                grp.columns = [
-                    "School Name",
-                    "ក. ធ្លាប់",
-                    "ខ. មិនធ្លាប់",
-                    "Total",
-                    "% ធ្លាប់",
-                    "% មិនធ្លាប់",
-                ]
-                return grp.sort_values("Total", ascending=False).reset_index(drop=True)
-
-            comp_table = school_computer_table(filtered_df)
-            st.dataframe(comp_table, use_container_width=True, hide_index=True)
-
-            # Bar chart
-            fig_comp = px.bar(
-                comp_table,
-                x="School Name",
-                y=["ក. ធ្លាប់", "ខ. មិនធ្លាប់"],
-                title="Computer Experience by School",
-                barmode="stack",
-                color_discrete_map={"ក. ធ្លាប់": "#2196F3", "ខ. មិនធ្លាប់": "#FF5722"},
-            )
-            fig_comp.update_layout(xaxis_tickangle=-30, legend_title="Experience")
-            st.plotly_chart(fig_comp, use_container_width=True)
+            elif tab4.open:
+                # ── 1. School vs Computer Usage ───────────────────────────────────
+                st.subheader("🏫 School vs Computer Usage")
+
+                # Build clean cross-tab: only ក. ធ្លាប់ and ខ. មិនធ្លាប់ columns
+                comp_yes = "ក. ធ្លាប់"
+                comp_no = "ខ. មិនធ្លាប់"
+
+                def school_computer_table(breakdown):
+                    grp = breakdown.pivot_table(
+                        index="school",
+                        columns="value",
+                        values="count",
+                        aggfunc="sum",
+                        fill_value=0,
+                    )
+                    for col in [comp_yes, comp_no]:
+                        if col not in grp.columns:
+                            grp[col] = 0
+                    grp = grp[[comp_yes, comp_no]].copy()
+                    grp.index.name = "School Name"
+                    grp["Total"] = grp[comp_yes] + grp[comp_no]
+                    grp["% ធ្លាប់"] = (grp[comp_yes] / grp["Total"] * 100).round(
+                        1
+                    ).astype(str) + "%"
+                    grp["% មិនធ្លាប់"] = (grp[comp_no] / grp["Total"] * 100).round(
+                        1
+                    ).astype(str) + "%"
+                    grp = grp.reset_index()
+                    grp.columns = [
+                        "School Name",
+                        "ក. ធ្លាប់",
+                        "ខ. មិនធ្លាប់",
+                        "Total",
+                        "% ធ្លាប់",
+                        "% មិនធ្លាប់",
+                    ]
+                    return grp.sort_values("Total", ascending=False).reset_index(
+                        drop=True
+                    )
 
-            # ── 2. Teachers Without Computer Experience ───────────────────────
-            st.markdown("---")
-            st.subheader("🙋 Teachers Without Computer Experience")
-            no_comp = filtered_df[filtered_df["computer_usage"] == comp_no]
-            st.metric("Count", len(no_comp))
-            if len(no_comp) > 0:
-                st.dataframe(
-                    no_comp[["full_name", "school_name", "class_name", "created_at"]],
-                    use_container_width=True,
+                comp_table = school_computer_table(
+                    run_analytics(
+                        "school_breakdown", filters, version, "computer_usage"
+                    )
                 )
+                st.dataframe(comp_table, use_container_width=True, hide_index=True)
+                # Sheets of the headquarters report, as shown in this tab
+                report_tables = {"Computer usage by school": comp_table}
 
-            # ── 3. Quiz Score per Teacher ─────────────────────────────────────
-            st.markdown("---")
-            st.subheader("📝 Quiz Score per Teacher (Q1–Q8)")
-            st.caption(
-                "Only teachers who have computer experience and answered questions are scored."
-            )
+                # Bar chart
+                fig_comp = px.bar(
+                    comp_table,
+                    x="School Name",
+                    y=["ក. ធ្លាប់", "ខ. មិនធ្លាប់"],
+                    title="Computer Experience by School",
+                    barmode="stack",
+                    color_discrete_map={
+                        "ក. ធ្លាប់": "#2196F3",
+                        "ខ. មិនធ្លាប់": "#FF5722",
+                    },
+                )
+                fig_comp.update_layout(xaxis_tickangle=-30, legend_title="Experience")
+                st.plotly_chart(fig_comp, use_container_width=True)
 
-            # Correct answers map
-            CORRECT = {
-                "question_1": "ខ. ចុច File -> ជ្រើសរើស New (ថ្មី) -> Blank Document",
-                "question_2": "គ. ចុច File → Save As -> ដាក់ឈ្មោះឯកសារ -> Save ឬ Ctrl + S",
-                "question_3": "ខ. ចុច File → Open (បើក) -> ជ្រើសរើសឈ្មោះ -> Open",
-                "question_4": "ខ. គណនា និងវិភាគទិន្នន័យ",
-                "question_5": "គ. = Cell + Cell ឬ =Sum(Cell:Cell)",
-                "question_6": "ក. Login user",
-                "question_7": "គ. វីដេអូ សង្ខេបមេរៀន រង្វាយតម្លៃ និងកិច្ចការផ្ទះ",
-                "question_8": "ក. ចេញពីសៀវភៅពុម្ពរបស់ក្រសួង",
-            }
-
-            scored_df = filtered_df[filtered_df["question_1"] != "N/A"].copy()
-
-            if scored_df.empty:
-                st.info("No answered responses in current filter.")
-            else:
-                # Score each row
-                for q, correct in CORRECT.items():
-                    scored_df[f"{q}_correct"] = (
-                        scored_df[q].str.strip() == correct.strip()
-                    )
+                # ── 2. Teachers Without Computer Experience ───────────────────────
+                st.markdown("---")
+                st.subheader("🙋 Teachers Without Computer Experience")
+                no_comp = run_analytics("teachers", filters, version, comp_no)
+                st.metric("Count", len(no_comp))
+                if len(no_comp) > 0:
+                    st.dataframe(no_comp, use_container_width=True)
 
-                scored_df["score"] = scored_df[[f"{q}_correct" for q in CORRECT]].sum(
-                    axis=1
+                # ── 3. Quiz Score per Teacher ─────────────────────────────────────
+                st.markdown("---")
+                st.subheader("📝 Quiz Score per Teacher (Q1–Q8)")
+                st.caption(
+                    "Only teachers who have computer experience and answered questions are scored."
                 )
-                scored_df["score_pct"] = (
-                    scored_df["score"] / len(CORRECT) * 100
-                ).round(1)
 
-                # ── Per-teacher score table ───────────────────────────────────
-                score_cols = ["full_name", "school_name", "score", "score_pct"] + [
-                    f"{q}_correct" for q in CORRECT
-                ]
-                score_display = scored_df[score_cols].copy()
-                score_display.columns = ["ឈ្មោះ", "សាលា", "ពិន្ទុ (/ 8)", "ភាគរយ (%)"] + [
-                    f"Q{i + 1}" for i in range(len(CORRECT))
-                ]
+                # Correct answers map
+                CORRECT = {
+                    "question_1": "ខ. ចុច File -> ជ្រើសរើស New (ថ្មី) -> Blank Document",
+                    "question_2": "គ. ចុច File → Save As -> ដាក់ឈ្មោះឯកសារ -> Save ឬ Ctrl + S",
+                    "question_3": "ខ. ចុច File → Open (បើក) -> ជ្រើសរើសឈ្មោះ -> Open",
+                    "question_4": "ខ. គណនា និងវិភាគទិន្នន័យ",
+                    "question_5": "គ. = Cell + Cell ឬ =Sum(Cell:Cell)",
+                    "question_6": "ក. Login user",
+                    "question_7": "គ. វីដេអូ សង្ខេបមេរៀន រង្វាយតម្លៃ និងកិច្ចការផ្ទះ",
+                    "question_8": "ក. ចេញពីសៀវភៅពុម្ពរបស់ក្រសួង",
+                }
 
-                # Colour True/False
-                def colour_bool(val):
-                    if val is True:
-                        return "background-color: #c8e6c9; color: #1b5e20"
-                    elif val is False:
-                        return "background-color: #ffcdd2; color: #b71c1c"
-                    return ""
-
-                bool_cols = [f"Q{i + 1}" for i in range(len(CORRECT))]
-                st.dataframe(
-                    score_display.style.applymap(colour_bool, subset=bool_cols),
-                    use_container_width=True,
-                    height=400,
+                # Scored in DuckDB, one row per answered response
+                scored_df = run_analytics(
+                    "quiz_scores", filters, version, tuple(CORRECT.items())
                 )
 
-                # ── Score summary by school ───────────────────────────────────
-                st.markdown("---")
-                st.subheader("📊 Average Score by School")
-                school_score = (
-                    scored_df.groupby("school_name")
-                    .agg(
-                        Teachers=("score", "count"),
-                        Avg_Score=("score", "mean"),
-                        Avg_Pct=("score_pct", "mean"),
+                if scored_df.empty:
+                    st.info("No answered responses in current filter.")
+                else:
+                    # ── Per-teacher score table ───────────────────────────────────
+                    score_cols = ["full_name", "school_name", "score", "score_pct"] + [
+                        f"{q}_correct" for q in CORRECT
+                    ]
+                    score_display = scored_df[score_cols].copy()
+                    score_display.columns = [
+                        "ឈ្មោះ",
+                        "សាលា",
+                        "ពិន្ទុ (/ 8)",
+                        "ភាគរយ (%)",
+                    ] + [f"Q{i + 1}" for i in range(len(CORRECT))]
+                    report_tables["Quiz scores per teacher"] = score_display
+
+                    # Colour True/False
+                    def colour_bool(val):
+                        if val is True:
+                            return "background-color: #c8e6c9; color: #1b5e20"
+                        elif val is False:
+                            return "background-color: #ffcdd2; color: #b71c1c"
+                        return ""
+
+                    bool_cols = [f"Q{i + 1}" for i in range(len(CORRECT))]
+                    st.dataframe(
+                        score_display.style.applymap(colour_bool, subset=bool_cols),
+                        use_container_width=True,
+                        height=400,
                     )
-                    .round(1)
-                    .reset_index()
-                    .rename(
-                        columns={
-                            "school_name": "School Name",
-                            "Avg_Score": "Avg Score (/ 8)",
-                            "Avg_Pct": "Avg %",
-                        }
+
+                    # ── Score summary by school ───────────────────────────────────
+                    st.markdown("---")
+                    st.subheader("📊 Average Score by School")
+                    school_score = (
+                        scored_df.groupby("school_name", observed=True)
+                        .agg(
+                            Teachers=("score", "count"),
+                            Avg_Score=("score", "mean"),
+                            Avg_Pct=("score_pct", "mean"),
+                        )
+                        .round(1)
+                        .reset_index()
+                        .rename(
+                            columns={
+                                "school_name": "School Name",
+                                "Avg_Score": "Avg Score (/ 8)",
+                                "Avg_Pct": "Avg %",
+                            }
+                        )
+                        .sort_values("Avg %", ascending=False)
+                    )
+                    st.dataframe(
+                        school_score, use_container_width=True, hide_index=True
                     )
-                    .sort_values("Avg %", ascending=False)
-                )
-                st.dataframe(school_score, use_container_width=True, hide_index=True)
 
-                fig_score = px.bar(
-                    school_score,
-                    x="School Name",
-                    y="Avg %",
-                    title="Average Quiz Score % by School",
-                    color="Avg %",
-                    color_continuous_scale="RdYlGn",
-                    range_color=[0, 100],
-                    text="Avg %",
-                )
-                fig_score.update_traces(texttemplate="%{text}%", textposition="outside")
-                fig_score.update_layout(xaxis_tickangle=-30)
-                st.plotly_chart(fig_score, use_container_width=True)
+                    fig_score = px.bar(
+                        school_score,
+                        x="School Name",
+                        y="Avg %",
+                        title="Average Quiz Score % by School",
+                        color="Avg %",
+                        color_continuous_scale="RdYlGn",
+                        range_color=[0, 100],
+                        text="Avg %",
+                    )
+                    fig_score.update_traces(
+                        texttemplate="%{text}%", textposition="outside"
+                    )
+                    fig_score.update_layout(xaxis_tickangle=-30)
+                    st.plotly_chart(fig_score, use_container_width=True)
 
-            # ── 4. Q9 — How much has EBC helped? ─────────────────────────────
-            st.markdown("---")
-            st.subheader("📊 Q9: EBC ជួយការបង្រៀនប៉ុន្មានភាគរយ?")
-
-            Q9_VALID = [
-                "ក. ១០% ទៅ ៣០%",
-                "ខ. ៤០% ទៅ ៦០%",
-                "គ. ៧០% ទៅ ១០០%",
-            ]
-            Q9_COLORS = {
-                "ក. ១០% ទៅ ៣០%": "#FF7043",
-                "ខ. ៤០% ទៅ ៦០%": "#42A5F5",
-                "គ. ៧០% ទៅ ១០០%": "#66BB6A",
-            }
-
-            # Filter: only rows with valid Q9 answer
-            q9_df = filtered_df[filtered_df["question_9"].isin(Q9_VALID)].copy()
-
-            if q9_df.empty:
-                st.info("No valid Q9 responses in current filter.")
-            else:
-                q9_total = len(q9_df)
-                q9_counts = (
-                    q9_df["question_9"]
-                    .value_counts()
-                    .reindex(Q9_VALID, fill_value=0)
-                    .reset_index()
+                # ── 4. Q9 — How much has EBC helped? ─────────────────────────────
+                st.markdown("---")
+                st.subheader("📊 Q9: EBC ជួយការបង្រៀនប៉ុន្មានភាគរយ?")
+
+                Q9_VALID = [
+                    "ក. ១០% ទៅ ៣០%",
+                    "ខ. ៤០% ទៅ ៦០%",
+                    "គ. ៧០% ទៅ ១០០%",
+                ]
+                Q9_COLORS = {
+                    "ក. ១០% ទៅ ៣០%": "#FF7043",
+                    "ខ. ៤០% ទៅ ៦០%": "#42A5F5",
+                    "គ. ៧០% ទៅ ១០០%": "#66BB6A",
+                }
+
+                # Filter: only rows with valid Q9 answer
+                q9_breakdown = run_analytics(
+                    "school_breakdown", filters, version, "question_9", tuple(Q9_VALID)
                 )
-                q9_counts.columns = ["Answer", "Count"]
-                q9_counts["Percent"] = (q9_counts["Count"] / q9_total * 100).round(1)
-
-                # Metrics + pie side by side
-                col_a, col_b = st.columns(2)
-                with col_a:
-                    st.markdown("**Overall Distribution**")
-                    for _, row in q9_counts.iterrows():
-                        st.metric(
-                            label=row["Answer"],
-                            value=f"{row['Count']} teachers",
-                            delta=f"{row['Percent']}%",
+
+                if q9_breakdown.empty:
+                    st.info("No valid Q9 responses in current filter.")
+                else:
+                    q9_total = int(q9_breakdown["count"].sum())
+                    q9_counts = (
+                        q9_breakdown.groupby("value")["count"]
+                        .sum()
+                        .reindex(Q9_VALID, fill_value=0)
+                        .reset_index()
+                    )
+                    q9_counts.columns = ["Answer", "Count"]
+                    q9_counts["Percent"] = (q9_counts["Count"] / q9_total * 100).round(
+                        1
+                    )
+
+                    # Metrics + pie side by side
+                    col_a, col_b = st.columns(2)
+                    with col_a:
+                        st.markdown("**Overall Distribution**")
+                        for _, row in q9_counts.iterrows():
+                            st.metric(
+                                label=row["Answer"],
+                                value=f"{row['Count']} teachers",
+                                delta=f"{row['Percent']}%",
+                            )
+
+                    with col_b:
+                        fig_q9 = px.pie(
+                            q9_counts,
+                            names="Answer",
+                            values="Count",
+                            title="Q9 Distribution",
+                            color="Answer",
+                            color_discrete_map=Q9_COLORS,
                         )
+                        fig_q9.update_traces(textinfo="percent+value")
+                        st.plotly_chart(fig_q9, use_container_width=True)
 
-                with col_b:
-                    fig_q9 = px.pie(
+                    # Bar chart overall
+                    fig_q9_bar = px.bar(
                         q9_counts,
-                        names="Answer",
-                        values="Count",
-                        title="Q9 Distribution",
+                        x="Answer",
+                        y="Count",
+                        title="Q9 — Overall Count",
+                        text=q9_counts["Percent"].astype(str) + "%",
                         color="Answer",
                         color_discrete_map=Q9_COLORS,
                     )
-                    fig_q9.update_traces(textinfo="percent+value")
-                    st.plotly_chart(fig_q9, use_container_width=True)
-
-                # Bar chart overall
-                fig_q9_bar = px.bar(
-                    q9_counts,
-                    x="Answer",
-                    y="Count",
-                    title="Q9 — Overall Count",
-                    text=q9_counts["Percent"].astype(str) + "%",
-                    color="Answer",
-                    color_discrete_map=Q9_COLORS,
-                )
-                fig_q9_bar.update_traces(textposition="outside", showlegend=False)
-                fig_q9_bar.update_layout(xaxis_title="", showlegend=False)
-                st.plotly_chart(fig_q9_bar, use_container_width=True)
-
-                # Q9 breakdown by school
-                st.markdown("**Q9 Breakdown by School**")
-                q9_school = (
-                    q9_df.groupby(["school_name", "question_9"])
-                    .size()
-                    .unstack(fill_value=0)
-                    .reset_index()
-                )
-                q9_school.columns.name = None
-                for opt in Q9_VALID:
-                    if opt not in q9_school.columns:
-                        q9_school[opt] = 0
-                q9_school = q9_school[["school_name"] + Q9_VALID].copy()
-                q9_school["Total"] = q9_school[Q9_VALID].sum(axis=1)
-                for opt in Q9_VALID:
-                    q9_school[f"% {opt}"] = (
-                        q9_school[opt] / q9_school["Total"] * 100
-                    ).round(1).astype(str) + "%"
-                q9_school = q9_school.rename(columns={"school_name": "School Name"})
-                st.dataframe(q9_school, use_container_width=True, hide_index=True)
-
-                fig_q9s = px.bar(
-                    q9_school,
-                    x="School Name",
-                    y=Q9_VALID,
-                    title="Q9 by School",
-                    barmode="stack",
-                    color_discrete_map=Q9_COLORS,
-                )
-                fig_q9s.update_layout(xaxis_tickangle=-30, legend_title="Q9 Answer")
-                st.plotly_chart(fig_q9s, use_container_width=True)
-
-            # ── 5. Unresolved school names (diagnostic) ───────────────────────
-            st.markdown("---")
-            with st.expander("🔀 Name Variants Merged / Unresolved (diagnostic)"):
-                if "school_raw" in filtered_df.columns:
-                    vdf = (
-                        filtered_df[
-                            filtered_df["school_raw"] != filtered_df["school_name"]
-                        ][["school_raw", "school_name"]]
-                        .drop_duplicates()
-                        .rename(
-                            columns={
-                                "school_raw": "As Written",
-                                "school_name": "Canonical",
-                            }
+                    fig_q9_bar.update_traces(textposition="outside", showlegend=False)
+                    fig_q9_bar.update_layout(xaxis_title="", showlegend=False)
+                    st.plotly_chart(fig_q9_bar, use_container_width=True)
+
+                    # Q9 breakdown by school
+                    st.markdown("**Q9 Breakdown by School**")
+                    q9_school = (
+                        q9_breakdown.pivot_table(
+                            index="school",
+                            columns="value",
+                            values="count",
+                            aggfunc="sum",
+                            fill_value=0,
                         )
-                        .sort_values("Canonical")
+                        .reset_index()
+                        .rename(columns={"school": "school_name"})
+                    )
+                    q9_school.columns.name = None
+                    for opt in Q9_VALID:
+                        if opt not in q9_school.columns:
+                            q9_school[opt] = 0
+                    q9_school = q9_school[["school_name"] + Q9_VALID].copy()
+                    q9_school["Total"] = q9_school[Q9_VALID].sum(axis=1)
+                    for opt in Q9_VALID:
+                        q9_school[f"% {opt}"] = (
+                            q9_school[opt] / q9_school["Total"] * 100
+                        ).round(1).astype(str) + "%"
+                    q9_school = q9_school.rename(columns={"school_name": "School Name"})
+                    report_tables["Q9 by school"] = q9_school
+                    st.dataframe(q9_school, use_container_width=True, hide_index=True)
+
+                    fig_q9s = px.bar(
+                        q9_school,
+                        x="School Name",
+                        y=Q9_VALID,
+                        title="Q9 by School",
+                        barmode="stack",
+                        color_discrete_map=Q9_COLORS,
+                    )
+                    fig_q9s.update_layout(xaxis_tickangle=-30, legend_title="Q9 Answer")
+                    st.plotly_chart(fig_q9s, use_container_width=True)
+
+                # ── 5. Unresolved school names (diagnostic) ───────────────────────
+                st.markdown("---")
+                with st.expander("🔀 Name Variants Merged / Unresolved (diagnostic)"):
+                    vdf = run_analytics("name_variants", filters, version).rename(
+                        columns={"school_raw": "As Written", "school_name": "Canonical"}
                     )
                     if vdf.empty:
                         st.success("✅ No variants in current filter.")
                     else:
                         st.dataframe(vdf, use_container_width=True)
 
-                all_canonical = set(get_all_aliases().values())
-                unresolved = (
-                    filtered_df[~filtered_df["school_name"].isin(all_canonical)][
-                        "school_name"
-                    ]
-                    .value_counts()
-                    .reset_index()
+                    all_canonical = set(get_all_aliases().values())
+                    unresolved = run_analytics("school_counts", filters, version)
+                    unresolved = unresolved[
+                        ~unresolved["school_name"].isin(all_canonical)
+                    ].reset_index(drop=True)
+                    unresolved.columns = ["School Name", "Count"]
+                    if unresolved.empty:
+                        st.success("✅ All school names resolved.")
+                    else:
+                        st.warning(
+                            f"{len(unresolved)} unresolved — add in 🏫 School Mapping tab."
+                        )
+                        suggested = suggest_school_aliases(
+                            tuple(sorted(unresolved["School Name"])),
+                            alias_file_version(),
+                        )
+                        review = unresolved.merge(
+                            suggested, on="School Name", how="left"
+                        )
+                        review.insert(
+                            0, "Accept", review["Score"].fillna(0) >= ALIAS_ACCEPT_SCORE
+                        )
+                        edited = st.data_editor(
+                            review,
+                            use_container_width=True,
+                            hide_index=True,
+                            disabled=["School Name", "Count", "Score", "Edits"],
+                            column_config={
+                                "Accept": st.column_config.CheckboxColumn("Accept"),
+                                "Score": st.column_config.NumberColumn(format="%.2f"),
+                            },
+                            key="alias_suggestions",
+                        )
+                        accepted = edited[
+                            edited["Accept"] & edited["Suggested"].notna()
+                        ]
+                        if st.button(
+                            f"✅ Accept {len(accepted)} selected suggestions",
+                            disabled=accepted.empty,
+                        ):
+                            add_custom_aliases(
+                                dict(
+                                    zip(accepted["School Name"], accepted["Suggested"])
+                                )
+                            )
+                            st.cache_data.clear()
+                            st.success(f"Saved {len(accepted)} aliases")
+                            st.rerun()
+
+                # ── 6. Headquarters report ───────────────────────────────────────
+                st.markdown("---")
+                st.subheader("📗 Excel Report")
+                st.caption(
+                    "One workbook for the current filters with a sheet each for "
+                    f"the responses, {', '.join(report_tables)}."
+                )
+                st.download_button(
+                    label="📗 Download Excel report",
+                    # Built only when clicked; responses are streamed into it
+                    data=lambda: export_report(filters, report_tables),
+                    file_name=f"survey_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 )
-                unresolved.columns = ["School Name", "Count"]
-                if unresolved.empty:
-                    st.success("✅ All school names resolved.")
-                else:
-                    st.warning(
-                        f"{len(unresolved)} unresolved — add in 🏫 School Mapping tab."
-                    )
-                    st.dataframe(unresolved, use_container_width=True)
+
+                # ── 7. Ad-hoc query ──────────────────────────────────────────────
+                st.markdown("---")
+                st.subheader("🧮 Ad-hoc Query")
+                st.caption(
+                    "One DuckDB `SELECT` over the `responses` view of the local "
+                    "snapshot (canonical `school_name`, `school_raw` as typed, "
+                    "cleaned `class_name`). Sidebar filters do not apply; at most "
+                    f"{QUERY_ROW_LIMIT:,} rows are shown, and a query is stopped "
+                    f"after {QUERY_TIMEOUT_SECONDS:g} seconds."
+                )
+                adhoc_sql = st.text_area(
+                    "SQL",
+                    "SELECT school_name, computer_usage, COUNT(*) AS responses\n"
+                    "FROM responses\nGROUP BY ALL\nORDER BY responses DESC",
+                    height=150,
+                    key="adhoc_sql",
+                )
+                if adhoc_sql.strip():
+                    try:
+                        result = run_analytics(
+                            "query", Filters(), version, adhoc_sql.strip()
+                        )
+                    except ValueError as e:
+                        st.error(f"❌ {e}")
+                    else:
+                        st.caption(f"{len(result):,} rows")
+                        st.dataframe(result, use_container_width=True)
 
         # TAB 5 ───────────────────────────────────────────────────────────────
         with tab5:
@@ -916,39 +1334,142 @@ def main():
             )
             st.dataframe(builtin_df, use_container_width=True)
 
+        # TAB 6 ───────────────────────────────────────────────────────────────
+        with tab6:
+            if tab6.open and OFFLINE:
+                st.info("The SQL console needs MySQL; it is off in offline mode.")
+            elif tab6.open:
+                st.subheader("🧾 SQL Console")
+                st.caption(
+                    "Read-only queries against MySQL: `SELECT`, `WITH`, `SHOW`, "
+                    f"`DESCRIBE` and `EXPLAIN`, stopped after "
+                    f"{CONSOLE_TIMEOUT_MS / 1000:g} s and cut at "
+                    f"{CONSOLE_ROW_LIMIT:,} rows. Identical queries within "
+                    f"{REFRESH_SECONDS} s are served from cache."
+                )
+                console = get_console()
+                with st.form("sql_console"):
+                    console_sql = st.text_area(
+                        "SQL",
+                        "SELECT school_canonical, COUNT(*) AS responses\n"
+                        "FROM survey_responses\nGROUP BY school_canonical\n"
+                        "ORDER BY responses DESC",
+                        height=150,
+                    )
+                    c1, c2, _ = st.columns([1, 1, 6])
+                    run_clicked = c1.form_submit_button("▶️ Run")
+                    explain_clicked = c2.form_submit_button("🧭 Explain")
+
+                if run_clicked:
+                    placeholder = st.empty()
+                    try:
+                        st.session_state["console_result"] = console.run(
+                            console_sql,
+                            on_chunk=lambda rows: placeholder.dataframe(
+                                rows, use_container_width=True
+                            ),
+                        )
+                        st.session_state.pop("console_plan", None)
+                    except ValueError as e:
+                        st.error(f"❌ {e}")
+                    placeholder.empty()
+                elif explain_clicked:
+                    try:
+                        st.session_state["console_plan"] = console.explain(console_sql)
+                    except ValueError as e:
+                        st.error(f"❌ {e}")
+
+                plan = st.session_state.get("console_plan")
+                if plan is not None:
+                    st.markdown("**Query plan**")
+                    st.dataframe(plan, use_container_width=True)
+                outcome = st.session_state.get("console_result")
+                if outcome is not None:
+                    notes = [f"{len(outcome.df):,} rows", f"{outcome.seconds:.2f} s"]
+                    if outcome.cached:
+                        notes.append("from cache")
+                    st.caption(" · ".join(notes))
+                    if outcome.truncated:
+                        st.warning(
+                            f"Only the first {CONSOLE_ROW_LIMIT:,} rows are shown; "
+                            "add a LIMIT or narrow the WHERE clause."
+                        )
+                    st.dataframe(outcome.df, use_container_width=True)
+
         # ── DATA TABLE ────────────────────────────────────────────────────────
         st.markdown("---")
         st.header("📋 All Responses")
 
         search = st.text_input("🔎 Search by name, school, or class")
+        c1, c2, c3 = st.columns([2, 1, 1])
+        show_details = c1.toggle("Show answers and Telegram details")
+        ascending = (
+            c2.selectbox("Sort", ["Newest first", "Oldest first"]) == "Oldest first"
+        )
+        page_size = c3.selectbox(
+            "Rows per page",
+            PAGE_SIZES,
+            index=PAGE_SIZES.index(PAGE_SIZE) if PAGE_SIZE in PAGE_SIZES else 1,
+        )
+        # Only a search loads the selection's rows; otherwise pages and the
+        # export are read straight from the database
+        display_df = fetch_data(filters, search) if search else None
+
+        # Keys of the rows before each page seen so far; the last is the
+        # current page. Any change to what is listed starts again at page 1.
+        listing = (filters, search, page_size, ascending)
+        if st.session_state.get("table_listing") != listing:
+            st.session_state["table_listing"] = listing
+            st.session_state["table_pages"] = [None]
+        pages = st.session_state["table_pages"]
+
+        extra_columns = ANSWER_COLUMNS + DETAIL_COLUMNS if show_details else []
         if search:
-            display_df = filtered_df[
-                filtered_df["full_name"]
-                .astype(str)
-                .str.contains(search, case=False, na=False)
-                | filtered_df["school_name"]
-                .astype(str)
-                .str.contains(search, case=False, na=False)
-                | filtered_df["school_raw"]
-                .astype(str)
-                .str.contains(search, case=False, na=False)
-                | filtered_df["class_name"]
-                .astype(str)
-                .str.contains(search, case=False, na=False)
-            ]
+            total = len(display_df)
+            page_df = keyset_page(display_df, pages[-1], page_size + 1, ascending)
+            has_more = len(page_df) > page_size
+            page_df = page_df.head(page_size)
+            if extra_columns:
+                page_df = with_columns(page_df, extra_columns, filters)
         else:
-            display_df = filtered_df
+            total = run_query("count", filters, version)
+            page_df, has_more = fetch_page(
+                filters,
+                get_response_store().core_columns + extra_columns,
+                pages[-1],
+                page_size,
+                ascending,
+            )
 
-        st.dataframe(display_df, use_container_width=True, height=400)
+        def first_page():
+            del pages[1:]
+
+        def next_page():
+            last = page_df.iloc[-1]
+            pages.append((last["created_at"], int(last["id"])))
+
+        first_row = (len(pages) - 1) * page_size
+        nav1, nav2, nav3, nav_info = st.columns([1, 1, 1, 5])
+        nav1.button("⏮ First", disabled=len(pages) == 1, on_click=first_page)
+        nav2.button("◀ Previous", disabled=len(pages) == 1, on_click=pages.pop)
+        nav3.button("Next ▶", disabled=not has_more, on_click=next_page)
+        nav_info.caption(
+            f"Rows {first_row + 1:,}–{first_row + len(page_df):,} of {total:,}"
+            if len(page_df)
+            else f"No rows ({total:,} in total)"
+        )
+        st.dataframe(page_df, use_container_width=True, hide_index=True)
 
         # ── EXPORT ────────────────────────────────────────────────────────────
         st.markdown("---")
         col_dl, _ = st.columns([1, 3])
         with col_dl:
-            csv = display_df.to_csv(index=False).encode("utf-8-sig")
+
+            export_ids = display_df["id"].to_numpy() if search else None
             st.download_button(
                 label="📥 Download CSV",
-                data=csv,
+                # Called only when the button is clicked
+                data=lambda: export_csv(filters, export_ids),
                 file_name=f"survey_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
                 mime="text/csv",
             )
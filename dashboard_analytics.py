@@ -0,0 +1,260 @@
+"""
+In-process DuckDB over the dashboard snapshot
+
+The Custom Queries tab runs its analyses and the ad-hoc query box on the
+Arrow snapshot (dashboard_snapshot.py) with DuckDB, a columnar SQL engine
+inside the dashboard process, so slicing millions of responses loads
+neither MySQL nor a pandas copy of the table.
+
+Queries see a `responses` view of the snapshot with school names resolved
+(school_name is canonical, school_raw as typed) and class names cleaned the
+way the bot stores them.
+"""
+
+import threading
+
+import duckdb
+import pandas as pd
+
+from dashboard_queries import TABLE, Filters, clean_class_name
+
+# Ad-hoc queries return at most this many rows
+QUERY_ROW_LIMIT = 10_000
+# Ad-hoc queries are interrupted after this many seconds by default
+QUERY_TIMEOUT_SECONDS = 10
+
+
+class SnapshotAnalytics:
+    def __init__(self, snapshot, resolver, query_timeout=QUERY_TIMEOUT_SECONDS):
+        """
+        DuckDB queries over a Snapshot
+
+        Args:
+            snapshot (Snapshot): Local copy of survey_responses
+            resolver (SchoolResolver): Maps raw school names the bot could
+                not resolve
+            query_timeout (float): Seconds after which an ad-hoc query is
+                interrupted
+        """
+        self.snapshot = snapshot
+        self.resolver = resolver
+        self.query_timeout = query_timeout
+        self.lock = threading.Lock()
+        self.con = None
+        self.registered = {}  # objects registered on con, by name
+        self.running = {}  # connection -> ad-hoc queries running on it
+        self.version = None
+
+    def sync(self, version, engine=None):
+        """
+        Point DuckDB at the current snapshot if `version` changed. With an
+        engine, the snapshot is first brought up to date from MySQL.
+        """
+        with self.lock:
+            if self.con is not None and version == self.version:
+                return
+            if engine is not None:
+                self.snapshot.update(engine)
+            # No file access: ad-hoc queries only see the registered tables
+            con = duckdb.connect(config={"enable_external_access": False})
+            table = self.snapshot.read()
+            con.register(TABLE, table)
+            registered = {TABLE: table, **self._create_views(con, table.column_names)}
+            if self.con is not None and self.con not in self.running:
+                # Otherwise closed by the last ad-hoc query still running on it
+                self.con.close()
+            self.con, self.registered, self.version = con, registered, version
+
+    def _create_views(self, con, columns):
+        """Create the `responses` view; returns the lookup tables it registered"""
+        migrated = "school_id" in columns
+        unresolved = "school_id IS NULL" if migrated else "TRUE"
+        raw_names = [
+            raw
+            for (raw,) in con.execute(
+                f"SELECT DISTINCT school_name FROM {TABLE} WHERE {unresolved}"
+            ).fetchall()
+        ]
+        school_map = pd.DataFrame(
+            {
+                "raw": raw_names,
+                "canonical": [self.resolver.canonical(raw) for raw in raw_names],
+            }
+        )
+        classes = [
+            raw
+            for (raw,) in con.execute(
+                f"SELECT DISTINCT class_name FROM {TABLE}"
+            ).fetchall()
+        ]
+        class_map = pd.DataFrame(
+            {"raw": classes, "clean": [clean_class_name(raw) for raw in classes]}
+        )
+        con.register("school_map", school_map)
+        con.register("class_map", class_map)
+
+        if migrated:
+            canonical = (
+                "CASE WHEN r.school_id IS NULL THEN s.canonical "
+                "ELSE r.school_canonical END"
+            )
+            join = "s.raw = r.school_name AND r.school_id IS NULL"
+        else:
+            canonical, join = "s.canonical", "s.raw = r.school_name"
+        con.execute(f"""
+            CREATE VIEW responses AS
+            SELECT r.* EXCLUDE (school_name, class_name, created_at),
+                   COALESCE({canonical}, r.school_name) AS school_name,
+                   r.school_name AS school_raw,
+                   COALESCE(c.clean, r.class_name) AS class_name,
+                   CAST(r.created_at AS TIMESTAMP) AS created_at
+            FROM {TABLE} r
+            LEFT JOIN school_map s ON {join}
+            LEFT JOIN class_map c ON c.raw = r.class_name
+            """)
+        return {"school_map": school_map, "class_map": class_map}
+
+    # ── queries ──────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def where(filters: Filters):
+        """WHERE clause and parameters for the filters, on `responses`"""
+        clauses, params = [], {}
+        if filters.school is not None:
+            clauses.append("school_name = $school")
+            params["school"] = filters.school
+        if filters.class_name is not None:
+            clauses.append("class_name = $class_name")
+            params["class_name"] = filters.class_name
+        if filters.computer_usage is not None:
+            clauses.append("computer_usage = $computer_usage")
+            params["computer_usage"] = filters.computer_usage
+        since = filters.start()
+        if since is not None:
+            clauses.append("created_at >= $since")
+            params["since"] = since
+        if filters.until is not None:
+            clauses.append("created_at < $until")
+            params["until"] = filters.until
+        return " AND ".join(clauses) or "TRUE", params
+
+    def _read(self, sql, params=None):
+        with self.lock:
+            return self.con.execute(sql, params or {}).df()
+
+    def school_breakdown(self, filters: Filters, column, values=None):
+        """Responses per (canonical school, value of `column`)"""
+        where, params = self.where(filters)
+        if values is not None:
+            where = f"{where} AND {column} IN $values"
+            params["values"] = list(values)
+        return self._read(
+            f"SELECT school_name AS school, {column} AS value, COUNT(*) AS count "
+            f"FROM responses WHERE {where} GROUP BY ALL",
+            params,
+        )
+
+    def school_counts(self, filters: Filters):
+        """Responses per canonical school, largest first"""
+        where, params = self.where(filters)
+        return self._read(
+            "SELECT school_name, COUNT(*) AS count FROM responses "
+            f"WHERE {where} GROUP BY ALL ORDER BY count DESC",
+            params,
+        )
+
+    def teachers(self, filters: Filters, computer_usage):
+        """Name, school, class and time of responses with `computer_usage`"""
+        where, params = self.where(filters)
+        return self._read(
+            "SELECT full_name, school_name, class_name, created_at FROM responses "
+            f"WHERE {where} AND computer_usage = $usage ORDER BY created_at DESC",
+            {**params, "usage": computer_usage},
+        )
+
+    def quiz_scores(self, filters: Filters, correct):
+        """
+        Score per answered response
+
+        Args:
+            correct (tuple): (question column, correct answer) pairs
+
+        Returns:
+            DataFrame: full_name, school_name, score, score_pct and one
+                <question>_correct column per question
+        """
+        where, params = self.where(filters)
+        checks = []
+        for i, (question, answer) in enumerate(correct):
+            checks.append(f"COALESCE(trim({question}) = $answer_{i}, FALSE)")
+            params[f"answer_{i}"] = answer.strip()
+        columns = ", ".join(
+            f"{check} AS {question}_correct"
+            for check, (question, _) in zip(checks, correct)
+        )
+        score = " + ".join(f"{check}::INTEGER" for check in checks)
+        return self._read(
+            f"SELECT full_name, school_name, {score} AS score, "
+            f"round(({score}) * 100.0 / {len(checks)}, 1) AS score_pct, {columns} "
+            f"FROM responses WHERE {where} AND question_1 <> 'N/A' "
+            "ORDER BY created_at DESC",
+            params,
+        )
+
+    def name_variants(self, filters: Filters):
+        """Raw school names that were merged into a different canonical name"""
+        where, params = self.where(filters)
+        return self._read(
+            "SELECT DISTINCT school_raw, school_name FROM responses "
+            f"WHERE {where} AND school_raw <> school_name ORDER BY school_name",
+            params,
+        )
+
+    def query(self, filters: Filters, sql):
+        """
+        Run one ad-hoc SELECT (filters are not applied; the SQL has the
+        whole snapshot), returning at most QUERY_ROW_LIMIT rows
+
+        The query runs on its own cursor, outside the lock the other
+        analyses and sync() share, and is interrupted after query_timeout
+        seconds, so a slow query holds up no other session.
+
+        Raises:
+            ValueError: If `sql` is not exactly one SELECT statement, fails or
+                runs out of time
+        """
+        try:
+            statements = duckdb.extract_statements(sql)
+        except duckdb.Error as e:
+            raise ValueError(str(e)) from e
+        if len(statements) != 1:
+            raise ValueError("Enter exactly one statement")
+        if statements[0].type != duckdb.StatementType.SELECT:
+            raise ValueError("Only SELECT queries are allowed")
+        with self.lock:
+            con, registered = self.con, self.registered
+            cursor = con.cursor()
+            self.running[con] = self.running.get(con, 0) + 1
+        watchdog = threading.Timer(self.query_timeout, cursor.interrupt)
+        try:
+            # A cursor does not see what was registered on its connection
+            for name, value in registered.items():
+                cursor.register(name, value)
+            watchdog.start()
+            return cursor.sql(sql).limit(QUERY_ROW_LIMIT).df()
+        except duckdb.InterruptException as e:
+            raise ValueError(
+                f"Query stopped after {self.query_timeout:g} seconds"
+            ) from e
+        except duckdb.Error as e:
+            raise ValueError(str(e)) from e
+        finally:
+            watchdog.cancel()
+            cursor.close()
+            with self.lock:
+                self.running[con] -= 1
+                if not self.running[con]:
+                    del self.running[con]
+                    if con is not self.con:
+                        # Replaced by sync() while this query ran
+                        con.close()
@@ -0,0 +1,213 @@
+"""
+Read-only SQL console for the dashboard
+
+Lets operators run their own queries against MySQL without phpMyAdmin's
+unbounded access. The console has its own small connection pool whose
+sessions are read-only, stop statements after a timeout and return a
+limited number of rows, so a query typed here cannot write or hog the
+primary. Results are fetched in chunks with a server-side cursor and cached
+by the query text with comments and extra whitespace removed.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+
+import pandas as pd
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import DBAPIError
+
+# Statements the console accepts, by first keyword
+ALLOWED_STATEMENTS = {"SELECT", "WITH", "SHOW", "DESCRIBE", "DESC", "EXPLAIN"}
+# Read-only sessions already refuse writes; these are refused up front too
+FORBIDDEN = re.compile(
+    r"\bINTO\s+(?:OUTFILE|DUMPFILE)\b|\bFOR\s+(?:UPDATE|SHARE)\b"
+    r"|\bLOCK\s+IN\s+SHARE\s+MODE\b",
+    re.IGNORECASE,
+)
+# Rows fetched from the server-side cursor at a time
+CHUNK_ROWS = 500
+
+# Quoted strings and identifiers are kept as typed; comments and whitespace
+# runs become one space
+_TOKEN = re.compile(
+    r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`[^`]*`)"""
+    r"|(--[^\n]*|\#[^\n]*|/\*.*?\*/|\s+)",
+    re.DOTALL,
+)
+
+
+def normalize_sql(sql):
+    """Query text without comments, extra whitespace or a trailing ";" """
+    text = _TOKEN.sub(lambda m: m.group(1) or " ", sql)
+    return text.strip().rstrip(";").strip()
+
+
+def create_console_engine(url, timeout_ms, row_limit, pool_size=2):
+    """
+    Engine whose MySQL sessions are read-only, stop SELECTs after
+    timeout_ms and return at most row_limit + 1 rows per SELECT (one more
+    than shown, to tell that the result was cut)
+    """
+    engine = create_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=0,
+        pool_timeout=10,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        connect_args={"connect_timeout": 10},
+    )
+
+    @event.listens_for(engine, "connect")
+    def configure_session(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("SET SESSION TRANSACTION READ ONLY")
+        cursor.execute(f"SET SESSION MAX_EXECUTION_TIME = {int(timeout_ms)}")
+        cursor.execute(f"SET SESSION sql_select_limit = {int(row_limit) + 1}")
+        cursor.close()
+
+    return engine
+
+
+@dataclass(frozen=True)
+class ConsoleResult:
+    query: str  # as run, normalised
+    df: pd.DataFrame
+    truncated: bool  # more rows than the row limit
+    seconds: float
+    cached: bool = False
+
+
+class SqlConsole:
+    def __init__(self, engine, row_limit, cache_seconds=60, cache_size=50):
+        """
+        Args:
+            engine: Engine from create_console_engine()
+            row_limit (int): Rows returned per query at most
+            cache_seconds (float): How long a result is reused
+            cache_size (int): Results kept at most
+        """
+        self.engine = engine
+        self.row_limit = row_limit
+        self.cache_seconds = cache_seconds
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        self._results = OrderedDict()  # query -> (stored at, ConsoleResult)
+
+    def check(self, sql):
+        """
+        Normalised query text, if the console may run it
+
+        Raises:
+            ValueError: If the text is empty, holds more than one statement
+                or is not a read-only statement
+        """
+        query = normalize_sql(sql)
+        if not query:
+            raise ValueError("Enter a query")
+        # Strings masked, so ";" or keywords inside them do not count
+        masked = _TOKEN.sub(lambda m: "''" if m.group(1) else " ", query)
+        if ";" in masked:
+            raise ValueError("Enter one statement at a time")
+        keyword = masked.split(None, 1)[0].upper()
+        if keyword not in ALLOWED_STATEMENTS:
+            raise ValueError(
+                f"Only {', '.join(sorted(ALLOWED_STATEMENTS))} statements are allowed"
+            )
+        if FORBIDDEN.search(masked):
+            raise ValueError("Locking reads and file exports are not allowed")
+        return query
+
+    def run(self, sql, on_chunk=None):
+        """
+        Run a read-only query, streaming its rows in chunks
+
+        Args:
+            on_chunk (callable): Called with the rows fetched so far after
+                each chunk (not for cached results)
+
+        Returns:
+            ConsoleResult
+
+        Raises:
+            ValueError: If the query is refused or fails
+        """
+        query = self.check(sql)
+        cached = self._cached(query)
+        if cached is not None:
+            return cached
+
+        started = time.perf_counter()
+        chunks, rows = [], 0
+        try:
+            with self.engine.connect() as conn:
+                result = conn.execution_options(
+                    stream_results=True, no_parameters=True
+                ).exec_driver_sql(query)
+                columns = list(result.keys())
+                for partition in result.partitions(CHUNK_ROWS):
+                    chunks.append(pd.DataFrame(partition, columns=columns))
+                    rows += len(partition)
+                    if on_chunk is not None:
+                        on_chunk(pd.concat(chunks, ignore_index=True))
+                    if rows > self.row_limit:
+                        break
+                result.close()
+        except DBAPIError as e:
+            raise ValueError(str(e.orig)) from e
+
+        df = (
+            pd.concat(chunks, ignore_index=True)
+            if chunks
+            else pd.DataFrame(columns=columns)
+        )
+        truncated = len(df) > self.row_limit
+        outcome = ConsoleResult(
+            query,
+            df.head(self.row_limit),
+            truncated,
+            time.perf_counter() - started,
+        )
+        self._store(query, outcome)
+        return outcome
+
+    def explain(self, sql):
+        """
+        MySQL's plan for a SELECT
+
+        Raises:
+            ValueError: If the query is refused, is not a SELECT or fails
+        """
+        query = self.check(sql)
+        if query.split(None, 1)[0].upper() not in ("SELECT", "WITH"):
+            raise ValueError("EXPLAIN works on SELECT queries")
+        try:
+            with self.engine.connect() as conn:
+                result = conn.execution_options(no_parameters=True).exec_driver_sql(
+                    f"EXPLAIN {query}"
+                )
+                return pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+        except DBAPIError as e:
+            raise ValueError(str(e.orig)) from e
+
+    def _cached(self, query):
+        with self.lock:
+            entry = self._results.get(query)
+            if entry is None:
+                return None
+            stored_at, outcome = entry
+            if time.monotonic() - stored_at >= self.cache_seconds:
+                del self._results[query]
+                return None
+            self._results.move_to_end(query)
+            return replace(outcome, cached=True)
+
+    def _store(self, query, outcome):
+        with self.lock:
+            self._results[query] = (time.monotonic(), outcome)
+            self._results.move_to_end(query)
+            while len(self._results) > self.cache_size:
+                self._results.popitem(last=False)
@@ -0,0 +1,470 @@
+"""
+SQL behind the dashboard's filters and charts
+
+Sidebar filters compile to a parameterised WHERE clause, so MySQL uses its
+indexes: row views fetch only the matching rows and every chart is a GROUP
+BY query, so only small aggregates cross the wire. Rows the bot resolved are grouped by their stored
+school_canonical; the few raw names it could not resolve are grouped as
+typed and mapped to canonical names here, with the current alias table.
+
+Fetched rows are normalised per distinct value, not per row: a column is
+factorised, each unique value cleaned once and the codes mapped back. They
+are then held compactly: columns with few distinct values as categoricals,
+free text as Arrow-backed strings.
+
+Row tables are paged by key, not by offset: a page is the rows after the
+last (created_at, id) shown, so MySQL reads one index range per page however
+deep the reader has paged.
+"""
+
+from dataclasses import dataclass, replace
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from sqlalchemy import bindparam, text
+
+from bot.khmer import fold_digits, normalize_text
+
+TABLE = "survey_responses"
+
+# A few hundred distinct values at most, however many rows
+CATEGORICAL_COLUMNS = [
+    "school_name",
+    "school_raw",
+    "school_id",
+    "school_canonical",
+    "class_name",
+    "computer_usage",
+    *(f"question_{i}" for i in range(1, 10)),
+]
+# Mostly distinct free text; pyarrow comes with streamlit
+TEXT_COLUMNS = ["full_name", "question_10", "telegram_username"]
+TEXT_DTYPE = pd.StringDtype("pyarrow")
+
+
+def clean_class_name(raw) -> str:
+    """Class name as the bot stores it ("១២ ខ" -> "12 ខ")"""
+    return fold_digits(normalize_text(raw))
+
+
+def map_distinct(values: pd.Series, func) -> pd.Series:
+    """
+    func(value) for every value, calling func once per distinct value.
+    Missing values stay missing.
+    """
+    codes, uniques = pd.factorize(values)
+    # Code -1 (missing) picks the trailing None
+    lookup = np.array([*map(func, uniques), None], dtype=object)
+    return pd.Series(lookup[codes], index=values.index, name=values.name)
+
+
+def normalize_responses(df: pd.DataFrame, resolver) -> pd.DataFrame:
+    """
+    Responses with canonical school names and tidied names and classes
+
+    Rows resolved by the bot keep their stored canonical name; the rest are
+    resolved with `resolver` (SchoolResolver). Where the raw school name
+    differs from the canonical one it is kept in school_raw for the audit
+    views (missing otherwise).
+    """
+    df = df.copy()
+    raw = df["school_name"].astype(object)
+    if "school_canonical" not in df.columns:
+        # Database not migrated yet (sql/migrations/001_school_canonical.sql)
+        df["school_id"] = None
+        df["school_canonical"] = None
+
+    pending = df["school_id"].isna()
+    resolved = map_distinct(df.loc[pending, "school_name"], resolver.canonical)
+    df["school_name"] = df["school_canonical"].astype(object)
+    df.loc[pending, "school_name"] = resolved
+    df["school_raw"] = raw.where(raw != df["school_name"])
+
+    # Older rows were stored as typed; tidy names and classes the way the bot
+    # now does at ingestion
+    for column, clean in (
+        ("full_name", normalize_text),
+        ("class_name", clean_class_name),
+    ):
+        if column in df.columns:
+            df[column] = map_distinct(df[column], clean)
+    return compact_dtypes(df)
+
+
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Categoricals for CATEGORICAL_COLUMNS, Arrow strings for TEXT_COLUMNS"""
+    dtypes = {}
+    for column in df.columns:
+        if column in CATEGORICAL_COLUMNS:
+            dtypes[column] = "category"
+        elif column in TEXT_COLUMNS:
+            dtypes[column] = TEXT_DTYPE
+    return df.astype(dtypes)
+
+
+def concat_compact(frames, **kwargs) -> pd.DataFrame:
+    """
+    pd.concat() that keeps categorical columns categorical (plain concat
+    falls back to object when the categories differ)
+    """
+    frames = [frame for frame in frames if len(frame.columns)]
+    for column in frames[0].columns:
+        if isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+            # An all-NULL column has no categories, typed object rather than
+            # str, which union_categoricals() refuses to mix
+            filled = [
+                frame[column]
+                for frame in frames
+                if column in frame and len(frame[column].cat.categories)
+            ]
+            if not filled:
+                continue
+            categories = union_categoricals(filled).categories
+            frames = [
+                frame.assign(**{column: frame[column].cat.set_categories(categories)})
+                for frame in frames
+            ]
+    return pd.concat(frames, **kwargs)
+
+
+def keyset_page(df: pd.DataFrame, after=None, limit=50, ascending=False):
+    """
+    In-memory counterpart of SurveyQueries.page(): up to `limit` rows of df
+    that come after the (created_at, id) key `after`, in the same order
+    """
+    if after is not None:
+        at, row_id = after
+        if ascending:
+            later = (df["created_at"] > at) | (
+                (df["created_at"] == at) & (df["id"] > row_id)
+            )
+        else:
+            later = (df["created_at"] < at) | (
+                (df["created_at"] == at) & (df["id"] < row_id)
+            )
+        df = df[later]
+    pick = df.nsmallest if ascending else df.nlargest
+    return pick(limit, ["created_at", "id"])
+
+
+@dataclass(frozen=True)
+class Filters:
+    """Sidebar selection; None means no restriction"""
+
+    school: Optional[str] = None  # canonical name
+    class_name: Optional[str] = None  # as shown by clean_class_name()
+    computer_usage: Optional[str] = None
+    days: Optional[int] = None  # created in the last `days` days
+    since: Optional[datetime] = None  # created_at >= since
+    until: Optional[datetime] = None  # created_at < until
+
+    @classmethod
+    def date_range(cls, start: date, end: date, **kwargs):
+        """From the start of `start` to the end of `end`"""
+        return cls(
+            since=datetime.combine(start, datetime.min.time()),
+            until=datetime.combine(end + timedelta(days=1), datetime.min.time()),
+            **kwargs,
+        )
+
+    def start(self) -> Optional[datetime]:
+        """
+        Earliest created_at that matches. A `days` window is relative, so the
+        same Filters keeps matching the latest days as time passes.
+        """
+        starts = [self.since] if self.since is not None else []
+        if self.days is not None:
+            starts.append(datetime.now() - timedelta(days=self.days))
+        return max(starts) if starts else None
+
+    def pinned(self) -> "Filters":
+        """
+        The same selection with a `days` window fixed to start now, so
+        several queries (and the in-memory rows) agree on its edge
+        """
+        if self.days is None:
+            return self
+        return replace(self, days=None, since=self.start())
+
+
+class SurveyQueries:
+    def __init__(self, engine, resolver, migrated=True):
+        """
+        Aggregate queries over survey_responses
+
+        Args:
+            engine: SQLAlchemy engine
+            resolver (SchoolResolver): Maps unresolved raw school names
+            migrated (bool): False if school_id / school_canonical do not
+                exist yet; every row is then treated as unresolved
+        """
+        self.engine = engine
+        self.resolver = resolver
+        self.migrated = migrated
+        self._unresolved_schools = None
+        self._class_names = None
+
+    # ── filters ──────────────────────────────────────────────────────────────
+
+    @property
+    def _unresolved(self):
+        return "school_id IS NULL" if self.migrated else "TRUE"
+
+    @property
+    def _school_key(self):
+        if not self.migrated:
+            return "school_name"
+        return "CASE WHEN school_id IS NULL THEN school_name ELSE school_canonical END"
+
+    def unresolved_school_names(self):
+        """Distinct raw school names the bot could not resolve"""
+        if self._unresolved_schools is None:
+            self._unresolved_schools = self._read(
+                f"SELECT DISTINCT school_name FROM {TABLE} WHERE {self._unresolved}"
+            )["school_name"].tolist()
+        return self._unresolved_schools
+
+    def class_names(self):
+        """Distinct class names as stored (older rows are not cleaned)"""
+        if self._class_names is None:
+            self._class_names = self._read(f"SELECT DISTINCT class_name FROM {TABLE}")[
+                "class_name"
+            ].tolist()
+        return self._class_names
+
+    def where(self, filters: Filters):
+        """WHERE clause and parameters for the filters"""
+        clauses, params = [], {}
+        if filters.school is not None:
+            raw_names = [
+                raw
+                for raw in self.unresolved_school_names()
+                if self.resolver.canonical(raw) == filters.school
+            ]
+            options = []
+            if self.migrated:
+                options.append("(school_id IS NOT NULL AND school_canonical = :school)")
+                params["school"] = filters.school
+            if raw_names:
+                options.append(f"({self._unresolved} AND school_name IN :school_raw)")
+                params["school_raw"] = raw_names
+            clauses.append(f"({' OR '.join(options)})" if options else "FALSE")
+        if filters.class_name is not None:
+            # Every stored spelling that cleans to the selected class
+            params["class_raw"] = [
+                raw
+                for raw in self.class_names()
+                if clean_class_name(raw) == filters.class_name
+            ] or [filters.class_name]
+            clauses.append("class_name IN :class_raw")
+        if filters.computer_usage is not None:
+            clauses.append("computer_usage = :computer_usage")
+            params["computer_usage"] = filters.computer_usage
+        since = filters.start()
+        if since is not None:
+            clauses.append("created_at >= :since")
+            params["since"] = since
+        if filters.until is not None:
+            clauses.append("created_at < :until")
+            params["until"] = filters.until
+        return " AND ".join(clauses) or "TRUE", params
+
+    @staticmethod
+    def _statement(sql, params):
+        statement = text(sql)
+        expanding = [
+            bindparam(name, expanding=True)
+            for name, value in params.items()
+            if isinstance(value, (list, tuple))
+        ]
+        if expanding:
+            statement = statement.bindparams(*expanding)
+        return statement
+
+    def _read(self, sql, params=None):
+        params = params or {}
+        with self.engine.connect() as conn:
+            return pd.read_sql(self._statement(sql, params), conn, params=params)
+
+    def _aggregate(self, select, filters, group_by, extra_where=None, params=None):
+        where, where_params = self.where(filters)
+        if extra_where:
+            where = f"{where} AND {extra_where}"
+        return self._read(
+            f"SELECT {select} FROM {TABLE} WHERE {where} GROUP BY {group_by}",
+            {**where_params, **(params or {})},
+        )
+
+    def _canonical_schools(self, df, columns):
+        """Map unresolved raw names to canonical schools and re-aggregate"""
+        unresolved = df["unresolved"].astype(bool)
+        names = df.loc[unresolved, "school"].unique()
+        canonical = {raw: self.resolver.canonical(raw) for raw in names}
+        df.loc[unresolved, "school"] = df.loc[unresolved, "school"].map(canonical)
+        return (
+            df.drop(columns="unresolved")
+            .groupby(["school", *columns], as_index=False)["count"]
+            .sum()
+        )
+
+    # ── rows ─────────────────────────────────────────────────────────────────
+
+    def rows(self, filters: Filters, columns, after_id=0, up_to_id=None):
+        """
+        `columns` of the rows matching the filters, newest first, optionally
+        only those with after_id < id <= up_to_id
+        """
+        where, params = self.where(filters)
+        if after_id:
+            where = f"{where} AND id > :after_id"
+            params["after_id"] = after_id
+        if up_to_id is not None:
+            where = f"{where} AND id <= :up_to_id"
+            params["up_to_id"] = up_to_id
+        return self._read_rows(
+            f"SELECT {', '.join(columns)} FROM {TABLE} WHERE {where} "
+            "ORDER BY created_at DESC, id DESC",
+            params,
+        )
+
+    def page(self, filters: Filters, columns, after=None, limit=50, ascending=False):
+        """
+        Up to `limit` rows matching the filters, ordered by (created_at, id),
+        that come after the row keyed `after` = (created_at, id); the first
+        page if None. idx_created_at also holds the id, so each page is one
+        index range scan, unlike LIMIT ... OFFSET.
+        """
+        where, params = self.where(filters)
+        op, order = (">", "ASC") if ascending else ("<", "DESC")
+        if after is not None:
+            where = (
+                f"{where} AND (created_at {op} :after_at "
+                f"OR (created_at = :after_at AND id {op} :after_id))"
+            )
+            params["after_at"] = pd.Timestamp(after[0]).to_pydatetime()
+            params["after_id"] = int(after[1])
+        return self._read_rows(
+            f"SELECT {', '.join(columns)} FROM {TABLE} WHERE {where} "
+            f"ORDER BY created_at {order}, id {order} LIMIT {int(limit)}",
+            params,
+        )
+
+    def iter_rows(self, filters: Filters, columns, chunksize, ids=None):
+        """
+        rows() in chunks of `chunksize`, read with a server-side cursor so
+        the whole result is never held at once. With `ids` (newest first),
+        only those rows, looked up `chunksize` ids at a time.
+        """
+        where, params = self.where(filters)
+        select = f"SELECT {', '.join(columns)} FROM {TABLE} WHERE {where}"
+        order = "ORDER BY created_at DESC, id DESC"
+        if ids is not None:
+            for start in range(0, len(ids), chunksize):
+                batch = [int(row_id) for row_id in ids[start : start + chunksize]]
+                yield self._read_rows(
+                    f"{select} AND id IN :ids {order}", {**params, "ids": batch}
+                )
+            return
+        with self.engine.connect() as conn:
+            chunks = pd.read_sql(
+                self._statement(f"{select} {order}", params),
+                conn.execution_options(stream_results=True),
+                params=params,
+                chunksize=chunksize,
+            )
+            for df in chunks:
+                if "created_at" in df.columns:
+                    df["created_at"] = pd.to_datetime(df["created_at"])
+                yield df
+
+    def _read_rows(self, sql, params):
+        df = self._read(sql, params)
+        if "created_at" in df.columns:
+            # SQLite (offline mode) returns timestamps as text
+            df["created_at"] = pd.to_datetime(df["created_at"])
+        return df
+
+    def count(self, filters: Filters) -> int:
+        """Number of rows matching the filters"""
+        where, params = self.where(filters)
+        return int(
+            self._read(f"SELECT COUNT(*) AS total FROM {TABLE} WHERE {where}", params)[
+                "total"
+            ].iloc[0]
+        )
+
+    # ── charts ───────────────────────────────────────────────────────────────
+
+    def summary(self, filters: Filters, no_computer):
+        """Total responses, responses with `no_computer` usage, latest time"""
+        where, params = self.where(filters)
+        row = self._read(
+            "SELECT COUNT(*) AS total, "
+            "COALESCE(SUM(computer_usage = :no_computer), 0) AS no_computer, "
+            f"MAX(created_at) AS latest FROM {TABLE} WHERE {where}",
+            {**params, "no_computer": no_computer},
+        ).iloc[0]
+        return {
+            "total": int(row["total"]),
+            "no_computer": int(row["no_computer"]),
+            "latest": pd.to_datetime(row["latest"]) if row["total"] else None,
+        }
+
+    def school_counts(self, filters: Filters):
+        """Responses per canonical school, largest first"""
+        df = self._aggregate(
+            f"{self._unresolved} AS unresolved, {self._school_key} AS school, "
+            "COUNT(*) AS count",
+            filters,
+            "unresolved, school",
+        )
+        return self._canonical_schools(df, []).sort_values("count", ascending=False)
+
+    def value_counts(self, filters: Filters, column):
+        """Responses per value of `column`, largest first"""
+        return self._aggregate(
+            f"{column} AS value, COUNT(*) AS count", filters, "value"
+        ).sort_values("count", ascending=False)
+
+    def daily_counts(self, filters: Filters):
+        """Responses per calendar day of created_at"""
+        df = self._aggregate(
+            "DATE(created_at) AS date, COUNT(*) AS count", filters, "date"
+        )
+        df["date"] = pd.to_datetime(df["date"]).dt.date
+        return df.sort_values("date")
+
+    def answer_counts(self, filters: Filters, questions, answered_column="question_1"):
+        """
+        Responses per (question, answer) for several question columns in one
+        round trip, counting only rows where `answered_column` is not "N/A"
+        """
+        where, params = self.where(filters)
+        parts = [
+            f"SELECT '{question}' AS question, {question} AS answer, COUNT(*) AS count "
+            f"FROM {TABLE} WHERE {where} AND {answered_column} <> 'N/A' "
+            f"GROUP BY {question}"
+            for question in questions
+        ]
+        return self._read(" UNION ALL ".join(parts), params)
+
+    def school_breakdown(self, filters: Filters, column, values=None):
+        """
+        Responses per (canonical school, value of `column`), optionally only
+        for the given values
+        """
+        extra_where, params = None, {}
+        if values is not None:
+            extra_where, params = f"{column} IN :values", {"values": list(values)}
+        df = self._aggregate(
+            f"{self._unresolved} AS unresolved, {self._school_key} AS school, "
+            f"{column} AS value, COUNT(*) AS count",
+            filters,
+            "unresolved, school, value",
+            extra_where,
+            params,
+        )
+        return self._canonical_schools(df, ["value"])
@@ -0,0 +1,62 @@
+"""
+Excel report for headquarters
+
+One workbook with the responses and the tables of the Custom Queries tab,
+each on its own sheet. openpyxl's write-only mode streams every appended row
+to disk instead of building the sheets in memory, and the responses arrive
+in chunks, so a workbook of several hundred thousand rows is written with
+flat memory.
+"""
+
+import pandas as pd
+from openpyxl import Workbook
+
+# Rows Excel allows on one sheet (header included); longer tables continue
+# on "<name> (2)", "<name> (3)", ...
+EXCEL_MAX_ROWS = 1_048_576
+# Excel's limit on sheet names
+SHEET_NAME_CHARS = 31
+
+
+def excel_rows(df: pd.DataFrame):
+    """df's rows as tuples of values openpyxl can write (None when missing)"""
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+
+def write_workbook(out, sheets):
+    """
+    Write an .xlsx workbook with one sheet per table
+
+    Args:
+        out: File name or binary file object
+        sheets (dict): Sheet name -> DataFrame, or an iterable of DataFrames
+            with the same columns (written one chunk at a time), in sheet
+            order
+    """
+    wb = Workbook(write_only=True)
+    for name, frames in sheets.items():
+        if isinstance(frames, pd.DataFrame):
+            frames = [frames]
+        sheet, part, rows = None, 0, 0
+        for df in frames:
+            if sheet is None:
+                part, sheet = 1, _add_sheet(wb, name, df.columns)
+                rows = 1
+            for values in excel_rows(df):
+                if rows == EXCEL_MAX_ROWS:
+                    part += 1
+                    sheet = _add_sheet(wb, f"{name} ({part})", df.columns)
+                    rows = 1
+                sheet.append(values)
+                rows += 1
+        if sheet is None:
+            # No chunks at all: keep the sheet so the layout is predictable
+            _add_sheet(wb, name, [])
+    wb.save(out)
+
+
+def _add_sheet(wb, name, columns):
+    sheet = wb.create_sheet(str(name)[:SHEET_NAME_CHARS])
+    sheet.freeze_panes = "A2"
+    sheet.append([str(column) for column in columns])
+    return sheet
@@ -0,0 +1,119 @@
+"""
+In-memory search index for the All Responses table
+
+The search box matches names, schools and classes by substring after
+bot.khmer.normalize_key(), so "ខ្សាច់ ស" finds "វិទ្យាល័យខ្សាច់ស" and "៧ ក"
+finds "7ក", however the spaces, digits or vowel order were typed. Rather than scanning
+every row per search, each distinct value is normalised once and its
+character n-grams go into an inverted index; a search looks up the rarest
+n-gram of the query, checks those few values and maps them to row ids
+through arrays sorted by value.
+
+New rows are added as another sorted chunk, so a refresh indexes only the
+new responses; chunks are merged once there are more than MAX_CHUNKS.
+"""
+
+import numpy as np
+import pandas as pd
+
+from bot.khmer import normalize_key
+
+# Columns a search looks in
+SEARCH_COLUMNS = ["full_name", "school_name", "school_raw", "class_name"]
+# N-gram lengths indexed; queries shorter than the longest use shorter ones,
+# and one-character queries check every distinct value
+GRAM_SIZES = (2, 3)
+# Sorted chunks kept before they are merged into one
+MAX_CHUNKS = 16
+
+
+class SearchIndex:
+    def __init__(self):
+        self.keys = []  # normalize_key() of each distinct value, by code
+        self.codes = {}  # raw value -> code
+        self.grams = {}  # n-gram -> codes of the keys containing it
+        self.chunks = []  # (codes sorted, row ids in the same order)
+        self.max_id = 0
+
+    def add(self, df: pd.DataFrame):
+        """Index the rows of df (rows already indexed must not be added again)"""
+        ids = df["id"].to_numpy(dtype=np.int64)
+        all_codes, all_ids = [], []
+        for column in SEARCH_COLUMNS:
+            if column not in df.columns:
+                continue
+            # One lookup per distinct value, as in map_distinct()
+            positions, uniques = pd.factorize(df[column])
+            lookup = np.array(
+                [self._code(value) for value in uniques] + [-1], dtype=np.int64
+            )
+            codes = lookup[positions]  # missing values (-1) pick the trailing -1
+            present = codes >= 0
+            all_codes.append(codes[present])
+            all_ids.append(ids[present])
+        if not all_codes:
+            return
+        codes, row_ids = np.concatenate(all_codes), np.concatenate(all_ids)
+        if len(row_ids):
+            self.max_id = max(self.max_id, int(row_ids.max()))
+        order = np.argsort(codes, kind="stable")
+        self.chunks.append((codes[order], row_ids[order]))
+        if len(self.chunks) > MAX_CHUNKS:
+            codes = np.concatenate([codes for codes, _ in self.chunks])
+            row_ids = np.concatenate([ids for _, ids in self.chunks])
+            order = np.argsort(codes, kind="stable")
+            self.chunks = [(codes[order], row_ids[order])]
+
+    def _code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            key = normalize_key(value)
+            code = self.codes[value] = len(self.keys)
+            self.keys.append(key)
+            grams = {
+                key[i : i + n] for n in GRAM_SIZES for i in range(len(key) - n + 1)
+            }
+            for gram in grams:
+                self.grams.setdefault(gram, []).append(code)
+        return code
+
+    def search(self, text):
+        """
+        Sorted ids of the rows with a name, school or class containing
+        `text` once both are normalised; None if `text` normalises to
+        nothing (every row matches)
+        """
+        query = normalize_key(text)
+        if not query:
+            return None
+        n = min(len(query), max(GRAM_SIZES))
+        if n < min(GRAM_SIZES):
+            candidates = range(len(self.keys))
+        else:
+            candidates = min(
+                (
+                    self.grams.get(query[i : i + n], [])
+                    for i in range(len(query) - n + 1)
+                ),
+                key=len,
+            )
+        if len(query) > n or n < min(GRAM_SIZES):
+            candidates = [code for code in candidates if query in self.keys[code]]
+        matched = np.array(candidates, dtype=np.int64)
+
+        found = []
+        for codes, row_ids in self.chunks:
+            # Each matched code is a run of the sorted codes
+            start = np.searchsorted(codes, matched, side="left")
+            lengths = np.searchsorted(codes, matched, side="right") - start
+            offsets = np.repeat(start - np.cumsum(lengths) + lengths, lengths)
+            found.append(row_ids[offsets + np.arange(lengths.sum())])
+        found = np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+        if len(found) * 16 < self.max_id:
+            # Sort and drop repeats (rows matching in several columns)
+            found.sort()
+            return found[np.diff(found, prepend=-1) != 0]
+        # Many hits: mark them in a bitmap rather than sorting them
+        hit = np.zeros(self.max_id + 1, dtype=bool)
+        hit[found] = True
+        return np.flatnonzero(hit)
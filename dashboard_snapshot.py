@@ -0,0 +1,254 @@
+"""
+Local columnar snapshot of survey_responses
+
+The table is kept on disk as Arrow IPC files, one per incremental update,
+so a restarted dashboard memory-maps the responses it already has instead of
+pulling the whole table from MySQL again. A rebuild or a merge of the files
+writes a new generation of them next to the current one and then switches
+the "current" marker to it, so readers never see files disappear; the old
+generation is deleted afterwards (or on a later update, where Windows
+refuses to delete a file that is still memory-mapped). The same files can be copied to a
+laptop and served with no MySQL at all (offline mode), through an in-memory
+SQLite copy that the dashboard's SQL runs on unchanged.
+"""
+
+import os
+import re
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.pool import StaticPool
+
+from dashboard_queries import TABLE
+
+# Rows fetched from MySQL (and written to one file) at a time
+FETCH_CHUNK_ROWS = 50_000
+# Incremental files are merged into one once there are more than this many
+MAX_PARTS = 32
+# Columns indexed in the offline SQLite copy, as in sql/init.sql
+OFFLINE_INDEXES = ["school_name", "school_canonical", "class_name", "created_at"]
+
+# part-<generation>-<first id>-<last id>.arrow
+_PART = re.compile(r"part-(\d+)-(\d+)-(\d+)\.arrow$")
+
+
+class Snapshot:
+    def __init__(self, directory, max_age=86400):
+        """
+        Arrow snapshot of survey_responses
+
+        Args:
+            directory (str): Where the snapshot files live (created on the
+                first update)
+            max_age (float): Seconds after which update() rebuilds the
+                snapshot from scratch, so edited rows are picked up
+        """
+        self.directory = directory
+        self.max_age = max_age
+        self.lock = threading.Lock()  # one update at a time
+        # Held while files are listed and opened, and while the generation
+        # is switched and old files deleted
+        self._files_lock = threading.Lock()
+
+    # ── reading ──────────────────────────────────────────────────────────────
+
+    def generation(self):
+        """Number of the current set of files (0 before the first update)"""
+        try:
+            with open(self._current_marker, encoding="utf-8") as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return 0
+
+    def parts(self, generation=None):
+        """Files of a generation (the current one by default), oldest rows first"""
+        if generation is None:
+            generation = self.generation()
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted(
+            os.path.join(self.directory, name)
+            for name in names
+            if (match := _PART.match(name)) and int(match.group(1)) == generation
+        )
+
+    @property
+    def max_id(self):
+        """Highest id in the snapshot (0 if empty)"""
+        with self._files_lock:
+            parts = self.parts()
+        return int(_PART.search(parts[-1]).group(3)) if parts else 0
+
+    def read(self, columns=None) -> pa.Table:
+        """
+        The snapshot as one Arrow table, memory-mapped rather than copied.
+        Columns the snapshot does not have are left out.
+        """
+        tables = []
+        for table in self._open():
+            if columns is not None:
+                table = table.select([c for c in columns if c in table.column_names])
+            tables.append(table)
+        if not tables:
+            return pa.table({})
+        # Early files may have typed a column as null (all NULL at the time)
+        return pa.concat_tables(tables, promote_options="permissive")
+
+    def num_rows(self):
+        return sum(table.num_rows for table in self._open())
+
+    def column_names(self):
+        tables = self._open()
+        return tables[0].schema.names if tables else []
+
+    def _open(self):
+        """The current files as memory-mapped tables"""
+        with self._files_lock:
+            return [
+                pa.ipc.open_file(pa.memory_map(path)).read_all()
+                for path in self.parts()
+            ]
+
+    # ── writing ──────────────────────────────────────────────────────────────
+
+    def update(self, engine) -> int:
+        """
+        Append rows added to MySQL since the last update. The snapshot is
+        rebuilt instead when rows were deleted, the table's columns changed
+        or it is older than max_age.
+
+        Returns:
+            int: Rows written
+        """
+        with self.lock:
+            # Files a reader kept mapped last time, or a failed rebuild left
+            self._remove_old()
+            last = self.max_id
+            if last and not self._stale(engine, last):
+                written = self._fetch(engine, last, self.generation())
+                if len(self.parts()) > MAX_PARTS:
+                    self._compact()
+                return written
+            # Readers keep using the current files until the switch
+            generation = self.generation() + 1
+            os.makedirs(self.directory, exist_ok=True)
+            written = self._fetch(engine, 0, generation)
+            with open(self._built_marker, "w"):
+                pass
+            self._switch(generation)
+            return written
+
+    def _stale(self, engine, last):
+        try:
+            built_at = os.path.getmtime(self._built_marker)
+        except OSError:
+            return True
+        if time.time() - built_at >= self.max_age:
+            return True
+        columns = [column["name"] for column in inspect(engine).get_columns(TABLE)]
+        if columns != self.column_names():
+            return True
+        with engine.connect() as conn:
+            kept = conn.execute(
+                text(f"SELECT COUNT(*) FROM {TABLE} WHERE id <= :last"),
+                {"last": last},
+            ).scalar()
+        return kept != self.num_rows()
+
+    @property
+    def _built_marker(self):
+        return os.path.join(self.directory, "built")
+
+    @property
+    def _current_marker(self):
+        return os.path.join(self.directory, "current")
+
+    def _switch(self, generation):
+        """Make `generation` the current files, then delete the others"""
+        tmp = f"{self._current_marker}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(str(generation))
+        with self._files_lock:
+            os.replace(tmp, self._current_marker)
+        self._remove_old()
+
+    def _remove_old(self):
+        """Delete the files of other generations that can be deleted"""
+        with self._files_lock:
+            current = set(self.parts())
+            try:
+                names = os.listdir(self.directory)
+            except OSError:
+                return
+            for name in names:
+                path = os.path.join(self.directory, name)
+                if name.startswith("part-") and path not in current:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        # Still memory-mapped on Windows; next update
+                        pass
+
+    def _fetch(self, engine, after_id, generation):
+        written = 0
+        with engine.connect() as conn:
+            chunks = pd.read_sql(
+                text(f"SELECT * FROM {TABLE} WHERE id > :after ORDER BY id"),
+                conn,
+                params={"after": after_id},
+                chunksize=FETCH_CHUNK_ROWS,
+            )
+            for chunk in chunks:
+                if not chunk.empty:
+                    self._write(
+                        pa.Table.from_pandas(chunk, preserve_index=False), generation
+                    )
+                    written += len(chunk)
+        return written
+
+    def _write(self, table, generation):
+        first, last = pc.min_max(table.column("id")).values()
+        name = f"part-{generation:06d}-{first.as_py():010d}-{last.as_py():010d}.arrow"
+        path = os.path.join(self.directory, name)
+        # Readers never see a half-written file
+        tmp = f"{path}.tmp"
+        with pa.OSFile(tmp, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, path)
+        return path
+
+    def _compact(self):
+        generation = self.generation() + 1
+        self._write(self.read(), generation)
+        self._switch(generation)
+
+    # ── offline mode ─────────────────────────────────────────────────────────
+
+    def to_engine(self):
+        """
+        In-memory SQLite database holding the snapshot, for running the
+        dashboard without MySQL
+        """
+        if not self.parts():
+            raise FileNotFoundError(f"No snapshot in {self.directory}")
+        engine = create_engine(
+            "sqlite://",
+            poolclass=StaticPool,
+            connect_args={"check_same_thread": False},
+        )
+        df = self.read().to_pandas()
+        df.to_sql(TABLE, engine, index=False, chunksize=FETCH_CHUNK_ROWS)
+        with engine.begin() as conn:
+            for column in OFFLINE_INDEXES:
+                if column in df.columns:
+                    conn.execute(
+                        text(f"CREATE INDEX idx_{column} ON {TABLE} ({column})")
+                    )
+        return engine
@@ -7,6 +7,8 @@ CREATE TABLE IF NOT EXISTS survey_responses (
     id INT AUTO_INCREMENT PRIMARY KEY,
     full_name VARCHAR(255) NOT NULL,
     school_name VARCHAR(255) NOT NULL,
+    school_id VARCHAR(64) NULL,
+    school_canonical VARCHAR(255) NULL,
     class_name VARCHAR(100) NOT NULL,
     computer_usage VARCHAR(50) NOT NULL,
     telegram_username VARCHAR(255),
@@ -23,5 +25,10 @@ CREATE TABLE IF NOT EXISTS survey_responses (
     question_10 TEXT NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     INDEX idx_telegram_user_id (telegram_user_id),
-    INDEX idx_created_at (created_at)
+    INDEX idx_created_at (created_at),
+    INDEX idx_school_id (school_id),
+    INDEX idx_school_canonical (school_canonical),
+    INDEX idx_school_name (school_name),
+    INDEX idx_class_name (class_name),
+    INDEX idx_computer_usage_created (computer_usage, created_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
\ No newline at end of file
@@ -0,0 +1,11 @@
+-- Store the canonical school alongside the name as typed by the teacher.
+-- Run once on databases created before these columns were added to
+-- init.sql, then fill existing rows with: python -m bot.schools backfill
+
+USE survey_testing;
+
+ALTER TABLE survey_responses
+    ADD COLUMN school_id VARCHAR(64) NULL AFTER school_name,
+    ADD COLUMN school_canonical VARCHAR(255) NULL AFTER school_id,
+    ADD INDEX idx_school_id (school_id),
+    ADD INDEX idx_school_canonical (school_canonical);
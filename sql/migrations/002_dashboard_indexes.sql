@@ -0,0 +1,9 @@
+-- Indexes for the dashboard's sidebar filters and GROUP BY queries
+-- (dashboard_queries.py). Date ranges use the existing idx_created_at.
+
+USE survey_testing;
+
+ALTER TABLE survey_responses
+    ADD INDEX idx_school_name (school_name),
+    ADD INDEX idx_class_name (class_name),
+    ADD INDEX idx_computer_usage_created (computer_usage, created_at);
@@ -0,0 +1,66 @@
+"""
+Dashboard downloads, passed through the conversion st.download_button()
+applies to what its data callable returns
+"""
+
+import codecs
+import io
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+
+import dashboard
+
+ROWS = pd.DataFrame(
+    {
+        "id": [3, 2, 1],
+        "full_name": ["គ្រូ ក", "គ្រូ ខ", None],
+        "school_name": ["វិទ្យាល័យខ្សាច់ស", "សាលាថ្មី", "សាលាថ្មី"],
+        "created_at": pd.to_datetime(
+            ["2026-10-03 08:00", "2026-10-02 09:30", "2026-10-01 10:00"]
+        ),
+    }
+)
+
+
+@pytest.fixture
+def export_rows(monkeypatch):
+    """export_rows() yielding ROWS in two chunks instead of querying MySQL"""
+
+    def rows(filters, ids=None):
+        yield ROWS.iloc[:2]
+        yield ROWS.iloc[2:]
+
+    monkeypatch.setattr(dashboard, "export_rows", rows)
+
+
+def served(data):
+    """The bytes Streamlit would send for a download_button's data"""
+    return convert_data_to_bytes_and_infer_mime(
+        data, ValueError("unsupported download data")
+    )[0]
+
+
+def test_csv_download(export_rows):
+    data = served(dashboard.export_csv(dashboard.Filters()))
+    assert data.startswith(codecs.BOM_UTF8)
+    df = pd.read_csv(io.BytesIO(data), encoding="utf-8-sig")
+    assert df["id"].tolist() == [3, 2, 1]
+    assert df["full_name"].tolist()[:2] == ["គ្រូ ក", "គ្រូ ខ"]
+
+
+def test_excel_report_download(export_rows):
+    tables = {"Q9 by school": pd.DataFrame({"School Name": ["សាលាថ្មី"], "Total": [2]})}
+    data = served(dashboard.export_report(dashboard.Filters(), tables))
+    workbook = load_workbook(io.BytesIO(data), read_only=True)
+    assert workbook.sheetnames == ["Responses", "Q9 by school"]
+    responses = list(workbook["Responses"].values)
+    assert responses[0] == tuple(ROWS.columns)
+    assert [row[0] for row in responses[1:]] == [3, 2, 1]
+    assert responses[3][1] is None
+    assert list(workbook["Q9 by school"].values) == [
+        ("School Name", "Total"),
+        ("សាលាថ្មី", 2),
+    ]